@@ -0,0 +1,296 @@
+"""Benchmark suite for the chatbot against the local mock LLM server.
+
+Measures, without network access:
+- micro: prompt lookup, per-node message building, graph compilation and
+  spec parsing (microseconds per operation)
+- end_to_end: chatbot.process latency for a design turn and a follow-up,
+  with per-stage wall time, LLM wait, overhead and prompt size in tokens
+- concurrency: turns per second and latency at N concurrent sessions
+
+Usage:
+    python benchmarks/bench.py --output report.json
+    python benchmarks/bench.py --baseline report.json --tolerance 0.25
+
+With --baseline, exits with status 1 if a metric regressed by more than the
+tolerance (latencies and micro timings higher, throughput lower).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_server import MockLLMServer  # noqa: E402
+
+FOLLOW_UP = "Add tagging of chats so users can group related conversations."
+
+
+def _configure_environment(base_url: str) -> None:
+    """Point the chatbot at the mock server; must run before importing sublang."""
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ["LANGFUSE_TRACING"] = "false"
+    os.environ["LITELLM_LOCAL_MODEL_COST_MAP"] = "True"
+    # Defaults that keep runs comparable; override them in the environment
+    os.environ.setdefault("MODEL", "gpt-4o-mini")
+    os.environ.setdefault("TEMPERATURE", "0")
+    os.environ.setdefault("LLM_CACHE", "false")
+    os.environ.setdefault("LOCAL_INTENT", "false")
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "mean": round(statistics.fmean(ordered), 4),
+        "p50": round(pick(0.5), 4),
+        "p95": round(pick(0.95), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def _time_op(func: Callable[[], Any], min_time: float = 0.2) -> float:
+    """Time an operation, returning microseconds per call."""
+    func()
+    count = 0
+    started = time.perf_counter()
+    while True:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return round(elapsed / count * 1e6, 2)
+
+
+def bench_micro() -> Dict[str, float]:
+    """Time the local, LLM-free parts of a turn."""
+    import importlib
+    import sublang.chatbot as chatbot
+    import sublang.design_specs as design_specs
+    from sublang.design_specs.spec_model import parse_spec, serialize_spec
+    from sublang.utils import get_prompt_loader
+
+    description = (ROOT / "demo" / "tig" / "description.md").read_text(encoding="utf-8")
+    specs = (ROOT / "demo" / "tig" / "specs.md").read_text(encoding="utf-8")
+    history = [{"role": "user", "content": description}, {"role": "assistant", "content": specs}]
+    state = {"message": description, "history": history, "specs": specs, "previous_specs": specs}
+    loader = get_prompt_loader(str(ROOT / "src" / "sublang" / "design_specs" / "prompts"))
+    modules = {
+        name: importlib.import_module(f"sublang.{package}.nodes.{name}")
+        for package, name in (
+            ("design_specs", "extend_scenarios"),
+            ("design_specs", "extract_terms"),
+            ("design_specs", "add_features"),
+            ("design_specs", "add_constraints"),
+            ("chatbot", "generate_response"),
+        )
+    }
+
+    results = {"prompt_lookup_us": _time_op(lambda: loader.get_prompt("OVERALL"))}
+    for name, module in modules.items():
+        if name in ("extend_scenarios", "extract_terms", "generate_response"):
+            build = lambda m=module: m._build_messages(state, history)
+        else:
+            build = lambda m=module: m._build_messages(state)
+        results[f"build_messages_{name}_us"] = _time_op(build)
+    results["design_specs_create_us"] = _time_op(design_specs.create, min_time=0.5)
+    results["chatbot_create_us"] = _time_op(chatbot.create, min_time=0.5)
+    results["parse_spec_us"] = _time_op(lambda: parse_spec(specs))
+    parsed = parse_spec(specs)
+    results["serialize_spec_us"] = _time_op(lambda: serialize_spec(parsed))
+    return results
+
+
+def _stage_report(turn_metrics) -> Dict[str, Dict[str, float]]:
+    stages = {}
+    for stage, values in turn_metrics.to_json().items():
+        stages[stage] = {
+            "wall_time": values["wall_time"],
+            "llm_time": values["llm_time"],
+            "overhead": round(max(0.0, values["wall_time"] - values["llm_time"]), 4),
+            "prompt_tokens": values["prompt_tokens"],
+            "completion_tokens": values["completion_tokens"],
+            "calls": values["calls"],
+        }
+    return stages
+
+
+def bench_end_to_end(turns: int) -> Dict[str, Any]:
+    """Run design turns and follow-ups sequentially."""
+    import sublang.chatbot as chatbot
+    from sublang.utils import metrics
+
+    description = (ROOT / "demo" / "tig" / "description.md").read_text(encoding="utf-8")
+    bot = chatbot.create()
+    report: Dict[str, Any] = {}
+    for label, follow_up in (("design_turn", False), ("follow_up_turn", True)):
+        latencies = []
+        stages = {}
+        for _ in range(turns):
+            turn_args: tuple = (description,)
+            if follow_up:
+                # A design turn first, so the follow-up refines its specs
+                first = chatbot.process(bot, description)
+                turn_args = (FOLLOW_UP, first["history"], first.get("specs"))
+            with metrics.turn() as turn_metrics:
+                started = time.perf_counter()
+                chatbot.process(bot, *turn_args)
+                latencies.append(time.perf_counter() - started)
+            stages = _stage_report(turn_metrics)
+        report[label] = {"latency": _percentiles(latencies), "stages": stages}
+    return report
+
+
+async def _session(bot, description: str, turns: int, latencies: List[float]) -> None:
+    import sublang.chatbot as chatbot
+
+    history: List[Dict[str, str]] = []
+    specs = None
+    for i in range(turns):
+        message = description if i == 0 else FOLLOW_UP
+        started = time.perf_counter()
+        result = await chatbot.aprocess(bot, message, history, specs)
+        latencies.append(time.perf_counter() - started)
+        history, specs = result["history"], result.get("specs")
+
+
+def bench_concurrency(sessions: List[int], turns: int) -> Dict[str, Any]:
+    """Measure throughput with N concurrent sessions of `turns` turns each."""
+    import sublang.chatbot as chatbot
+
+    description = (ROOT / "demo" / "tig" / "description.md").read_text(encoding="utf-8")
+    bot = chatbot.create()
+    report = {}
+    for count in sessions:
+        latencies: List[float] = []
+
+        async def run() -> None:
+            await asyncio.gather(*(_session(bot, description, turns, latencies) for _ in range(count)))
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        report[f"sessions_{count}"] = {
+            "turns_per_second": round(len(latencies) / elapsed, 3),
+            "latency": _percentiles(latencies),
+        }
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """List the metrics that regressed beyond the tolerance.
+
+    Args:
+        report: Current report
+        baseline: Earlier report
+        tolerance: Allowed relative change (0.25 = 25%)
+
+    Returns:
+        Human-readable regression descriptions
+    """
+    regressions = []
+
+    def check(path: str, current: float, previous: float, higher_is_better: bool) -> None:
+        if not previous:
+            return
+        change = (current - previous) / previous
+        if (not higher_is_better and change > tolerance) or (higher_is_better and -change > tolerance):
+            regressions.append(f"{path}: {previous} -> {current} ({change:+.0%})")
+
+    for key, value in report.get("micro", {}).items():
+        check(f"micro.{key}", value, baseline.get("micro", {}).get(key, 0), False)
+    for label, values in report.get("end_to_end", {}).items():
+        previous = baseline.get("end_to_end", {}).get(label, {}).get("latency", {})
+        for stat in ("p50", "p95"):
+            check(f"end_to_end.{label}.{stat}", values["latency"].get(stat, 0), previous.get(stat, 0), False)
+    for label, values in report.get("concurrency", {}).items():
+        previous = baseline.get("concurrency", {}).get(label, {})
+        check(f"concurrency.{label}.turns_per_second",
+              values["turns_per_second"], previous.get("turns_per_second", 0), True)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark sublang against a local mock LLM")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock time to first token (s)")
+    parser.add_argument("--tps", type=float, default=500.0, help="mock tokens per second")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock requests failing with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of mock requests with tail latency")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="extra seconds of slow mock requests")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="mock requests in flight before 429s")
+    parser.add_argument("--turns", type=int, default=3, help="turns per measurement")
+    parser.add_argument("--sessions", default="1,4,16", help="concurrent session counts")
+    parser.add_argument("--skip", default="", help="comma-separated sections to skip (micro,end_to_end,concurrency)")
+    parser.add_argument("--output", default="-", help="report file (default: stdout)")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        latency=args.latency,
+        tokens_per_second=args.tps,
+        error_rate=args.error_rate,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        max_concurrency=args.max_concurrency,
+    ).start()
+    _configure_environment(server.base_url)
+    skip = {s.strip() for s in args.skip.split(",") if s.strip()}
+    try:
+        report: Dict[str, Any] = {
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "model": os.environ["MODEL"],
+                "mock_latency": args.latency,
+                "mock_tokens_per_second": args.tps,
+                "mock_error_rate": args.error_rate,
+                "mock_slow_rate": args.slow_rate,
+                "mock_max_concurrency": args.max_concurrency,
+                "turns": args.turns,
+            }
+        }
+        if "micro" not in skip:
+            report["micro"] = bench_micro()
+        if "end_to_end" not in skip:
+            report["end_to_end"] = bench_end_to_end(args.turns)
+        if "concurrency" not in skip:
+            sessions = [int(n) for n in args.sessions.split(",") if n.strip()]
+            report["concurrency"] = bench_concurrency(sessions, args.turns)
+        report["mock_requests"] = server.requests
+    finally:
+        server.stop()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Local OpenAI-compatible stand-in server for benchmarks.
+
+Serves ``POST /v1/chat/completions`` (plain and SSE-streamed) with a
+configurable time to first token and tokens per second, and answers each
+design stage with canned output based on demo/tig so the whole pipeline runs
+without network access.
+
+Run standalone:
+    python benchmarks/mock_server.py --port 8765 --latency 0.2 --tps 100
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+DEMO_DIR = Path(__file__).resolve().parent.parent / "demo" / "tig"
+
+
+def _load(name: str) -> str:
+    try:
+        return (DEMO_DIR / name).read_text(encoding="utf-8").strip()
+    except OSError:
+        return ""
+
+
+class CannedResponses:
+    """Stage-specific canned answers derived from the demo project."""
+
+    def __init__(self) -> None:
+        specs = _load("specs.md")
+        sections = re.split(r"(?m)^(?=## )", specs)
+        by_title = {s.split("\n", 1)[0][3:].strip().lower(): s.strip() for s in sections if s.startswith("## ")}
+        self.description = _load("description.md") or "A tool for managing design specifications."
+        self.terms = by_title.get("terms", "## Terms")
+        self.features = by_title.get("features", "## Features")
+        self.constraints = by_title.get("constraints", "## Constraints")
+
+    def answer(self, messages: List[Dict[str, Any]]) -> str:
+        """Pick the canned answer for the stage that produced the messages."""
+        last = _text(messages[-1]) if messages else ""
+        system = _text(messages[0]) if messages else ""
+        if "software design" in last and "user message" in last.lower():
+            return "DESIGN_SPECS"
+        if system.startswith("Summarize the conversation"):
+            return "The user is designing a version control tool for chats and specs."
+        # Stages asked for changes only (SPEC_DELTAS) return just their new section
+        changes_only = "Output Changes Only" in last
+        if "Terms and Features from previous steps" in last:
+            if changes_only:
+                return f"```\n{self.constraints}\n```"
+            return f"```\n{self.terms}\n\n{self.features}\n\n{self.constraints}\n```"
+        if "Previously extracted terms" in last:
+            if changes_only:
+                return f"```\n{self.features}\n```"
+            return f"```\n{self.terms}\n\n{self.features}\n```"
+        if "Current specifications:" in last:
+            return f"```\n{self.features}\n```"
+        if re.search(r"extract.*terms", last[:2000], re.IGNORECASE):
+            return f"```\n{self.terms}\n```"
+        if re.search(r"scenario", last[:2000], re.IGNORECASE):
+            return f"```\n{self.description}\n\nScenarios: users store, browse and link chats.\n```"
+        return "Here is a general answer from the mock server."
+
+    def answer_json(self, messages: List[Dict[str, Any]]) -> str:
+        """Pick the structured (response_format) answer of a design stage."""
+        # Imported here so the server also runs without sublang installed
+        from sublang.design_specs.spec_model import parse_spec
+        from sublang.design_specs.structured import spec_to_json
+
+        last = _text(messages[-1]) if messages else ""
+        changes_only = "Output Changes Only" in last
+        if "Terms and Features from previous steps" in last:
+            sections = [self.terms, self.features, self.constraints]
+            removed = ["terms", "features"]
+        elif "Previously extracted terms" in last:
+            sections = [self.terms, self.features]
+            removed = ["terms"]
+        else:
+            sections, removed = [self.terms], []
+        answer = spec_to_json(parse_spec("\n\n".join(sections)))
+        if changes_only:
+            for name in removed:
+                answer[name] = []
+                answer[f"removed_{name}"] = []
+        return json.dumps(answer, ensure_ascii=False)
+
+
+def _text(message: Dict[str, Any]) -> str:
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "\n".join(str(block.get("text", "")) for block in content if isinstance(block, dict))
+    return str(content)
+
+
+def _tokens(text: str) -> List[str]:
+    """Split text into pseudo-tokens (words with their trailing whitespace)."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+class MockLLMServer:
+    """Threaded HTTP server emulating an OpenAI chat completions endpoint."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.05,
+        tokens_per_second: float = 500.0,
+        responses: Optional[CannedResponses] = None,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 2.0,
+        max_concurrency: int = 0,
+    ) -> None:
+        """Initialize the server.
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            latency: Seconds before the first token
+            tokens_per_second: Generation speed after the first token
+            responses: Canned answers (defaults to the demo project)
+            error_rate: Fraction of requests answered with 503
+            slow_rate: Fraction of requests delayed by slow_latency (tail latency)
+            slow_latency: Extra seconds before the first token of slow requests
+            max_concurrency: Requests in flight beyond this are answered with
+                429 and Retry-After, like a provider's rate limit (0 = no limit)
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.responses = responses or CannedResponses()
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.max_concurrency = max_concurrency
+        self.requests = 0
+        self.throttled = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                server._handle(self, body)
+
+            def do_GET(self) -> None:
+                payload = json.dumps({"data": [{"id": "mock", "object": "model"}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _timing(self, count: int) -> Tuple[float, float]:
+        per_token = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        latency = self.latency
+        if self.slow_rate and random.random() < self.slow_rate:
+            latency += self.slow_latency
+        return latency, per_token * count
+
+    def _handle(self, handler: BaseHTTPRequestHandler, body: Dict[str, Any]) -> None:
+        with self._lock:
+            self.requests += 1
+            throttled = bool(self.max_concurrency) and self.active >= self.max_concurrency
+            if throttled:
+                self.throttled += 1
+            else:
+                self.active += 1
+        if throttled:
+            self._error(handler, 429, "mock rate limit", "rate_limit_error", {"Retry-After": "1"})
+            return
+        try:
+            self._respond(handler, body)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    @staticmethod
+    def _error(handler: BaseHTTPRequestHandler, status: int, message: str, kind: str,
+               headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps({"error": {"message": message, "type": kind}}).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _respond(self, handler: BaseHTTPRequestHandler, body: Dict[str, Any]) -> None:
+        if self.error_rate and random.random() < self.error_rate:
+            self._error(handler, 503, "mock overload", "server_error")
+            return
+        if body.get("response_format"):
+            text = self.responses.answer_json(body.get("messages", []))
+        else:
+            text = self.responses.answer(body.get("messages", []))
+        tokens = _tokens(text)
+        first_delay, generation = self._timing(len(tokens))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "mock")
+        created = int(time.time())
+
+        if not body.get("stream"):
+            time.sleep(first_delay + generation)
+            payload = json.dumps({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+            }).encode()
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(payload)))
+            handler.end_headers()
+            handler.wfile.write(payload)
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        time.sleep(first_delay)
+        per_token = generation / len(tokens) if tokens else 0.0
+        for i, token in enumerate(tokens):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": token} if i == 0 else {"content": token},
+                    "finish_reason": None,
+                }],
+            }
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            handler.wfile.flush()
+            if per_token:
+                time.sleep(per_token)
+        done = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        handler.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+        handler.wfile.flush()
+        handler.close_connection = True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds to first token")
+    parser.add_argument("--tps", type=float, default=500.0, help="tokens per second")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of slow requests")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="extra seconds of slow requests")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="requests in flight before 429s")
+    args = parser.parse_args()
+    server = MockLLMServer(
+        args.host, args.port, args.latency, args.tps,
+        error_rate=args.error_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+        max_concurrency=args.max_concurrency
+    )
+    print(f"Mock LLM server on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Batch spec generation over a directory of description files."""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List
+
+MANIFEST_NAME = ".sublang-batch.json"
+DEFAULT_PATTERN = "**/description.md"
+
+
+def find_inputs(root: Path, pattern: str = DEFAULT_PATTERN) -> List[Path]:
+    """Find description files under a directory.
+
+    Args:
+        root: Directory to search
+        pattern: Glob pattern relative to root
+
+    Returns:
+        Sorted list of matching files, excluding specs generated from other matches
+    """
+    candidates = sorted(path for path in root.glob(pattern) if path.is_file())
+    outputs = {output_path(path) for path in candidates}
+    return [path for path in candidates if path not in outputs]
+
+
+def output_path(input_path: Path) -> Path:
+    """Get the specs file written next to a description file.
+
+    ``description.md`` becomes ``specs.md`` and ``foo.description.md`` becomes
+    ``foo.specs.md``; any other ``name.md`` becomes ``name.specs.md``.
+
+    Args:
+        input_path: Description file
+
+    Returns:
+        Path of the generated specs file
+    """
+    if "description" in input_path.stem:
+        return input_path.with_name(
+            input_path.stem.replace("description", "specs") + input_path.suffix
+        )
+    return input_path.with_name(f"{input_path.stem}.specs{input_path.suffix}")
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """Record of finished items, saved after every update so runs can resume."""
+
+    def __init__(self, path: Path) -> None:
+        """Load the manifest if it exists.
+
+        Args:
+            path: Manifest file
+        """
+        self.path = path
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.items = json.load(f).get("items", {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring unreadable manifest {path}: {e}")
+
+    def is_done(self, key: str, digest: str, output: Path) -> bool:
+        """Check whether an item was already generated from the same input."""
+        entry = self.items.get(key)
+        return bool(
+            entry
+            and entry.get("status") == "done"
+            and entry.get("input_sha256") == digest
+            and output.exists()
+        )
+
+    def update(self, key: str, entry: Dict[str, Any]) -> None:
+        """Record an item and write the manifest atomically."""
+        with self._lock:
+            self.items[key] = entry
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": 1, "items": self.items}, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+def run_batch(
+    root: str,
+    pattern: str = DEFAULT_PATTERN,
+    jobs: int = 4,
+    force: bool = False
+) -> Dict[str, int]:
+    """Generate specs for every description file under a directory.
+
+    Intent classification is skipped: each file goes straight through the
+    design_specs subgraph. Items already recorded as done in the manifest
+    with an unchanged input are skipped unless force is set. A run whose
+    stages failed, or whose specs have no terms, is recorded as failed and
+    nothing is written, so the next run retries it.
+
+    Args:
+        root: Directory to search
+        pattern: Glob pattern for description files
+        jobs: Number of concurrent workers
+        force: Regenerate every item regardless of the manifest
+
+    Returns:
+        Counts of done, skipped and failed items
+    """
+    # Deferred so that argument errors don't pay for building the graph
+    import sublang.design_specs as design_specs
+    from sublang.design_specs import parse_spec
+    from sublang.utils.llm_scheduler import prioritized
+
+    root_path = Path(root)
+    manifest = Manifest(root_path / MANIFEST_NAME)
+    inputs = find_inputs(root_path, pattern)
+    counts = {"done": 0, "skipped": 0, "failed": 0}
+
+    pending = []
+    for input_path in inputs:
+        key = input_path.relative_to(root_path).as_posix()
+        text = input_path.read_text(encoding='utf-8')
+        digest = _sha256(text)
+        if not force and manifest.is_done(key, digest, output_path(input_path)):
+            counts["skipped"] += 1
+            continue
+        pending.append((key, input_path, text, digest))
+
+    print(f"Found {len(inputs)} description(s): {len(pending)} to generate, "
+          f"{counts['skipped']} already done")
+    if not pending:
+        return counts
+
+    design_graph = design_specs.create()
+
+    def generate(key: str, input_path: Path, text: str, digest: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        # Interactive turns sharing the rate limits go first
+        with prioritized("batch"):
+            result = design_specs.process(design_graph, text)
+        specs = result.get("specs", "")
+        if result.get("error"):
+            raise RuntimeError(result["error"])
+        if not specs or result.get("response") != specs:
+            raise RuntimeError("no specs in the response")
+        if not parse_spec(specs).terms:
+            raise RuntimeError("specs have no terms")
+        target = output_path(input_path)
+        target.write_text(specs + "\n", encoding='utf-8')
+        return {
+            "status": "done",
+            "input_sha256": digest,
+            "output": target.relative_to(root_path).as_posix(),
+            "elapsed": round(time.perf_counter() - started, 3),
+            "finished_at": time.time(),
+        }
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {
+            executor.submit(generate, key, input_path, text, digest): key
+            for key, input_path, text, digest in pending
+        }
+        for finished, future in enumerate(as_completed(futures), start=1):
+            key = futures[future]
+            try:
+                entry = future.result()
+                counts["done"] += 1
+                print(f"[{finished}/{len(pending)}] {key} -> {entry['output']} "
+                      f"({entry['elapsed']:.1f}s)")
+            except Exception as e:
+                entry = {"status": "failed", "error": str(e), "finished_at": time.time()}
+                counts["failed"] += 1
+                print(f"[{finished}/{len(pending)}] {key} failed: {e}")
+            manifest.update(key, entry)
+
+    print(f"Batch finished: {counts['done']} done, {counts['skipped']} skipped, "
+          f"{counts['failed']} failed")
+    return counts
@@ -1,5 +1,7 @@
 """Chatbot subgraph."""
 
-from .chatbot import create, process, ChatbotState
+from .chatbot import create, process, aprocess, process_stream, aprocess_stream, ChatbotState
 
-__all__ = ["create", "process", "ChatbotState"]
+__all__ = [
+    "create", "process", "aprocess", "process_stream", "aprocess_stream", "ChatbotState"
+]
@@ -1,17 +1,27 @@
 """Main chatbot controller with intent classification and subgraph routing."""
 
-from typing import Dict, List, Optional, Any
-import litellm
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Any
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from typing_extensions import TypedDict
 from pathlib import Path
-from sublang.utils import config, PromptLoader
+from sublang.utils import config, llm, metrics, get_prompt_loader
 from sublang.utils.model_config import get_langfuse_config
+from sublang.utils.context import history_budget, truncate_text
+from sublang.utils.session_store import astored_values, stored_values, thread_config
+from sublang.utils.streaming import emit_stage, STREAM_TOKENS_KEY
+from sublang.utils.profiling import profiled, traced
 import sublang.design_specs as design_specs
-from sublang.chatbot.nodes.generate_response import generate_response
+from sublang.design_specs.design_specs import route_request
+from sublang.chatbot.intent import DESIGN, create_classifier, log_decision
+from sublang.chatbot.nodes.generate_response import generate_response, agenerate_response
+from sublang.design_specs.nodes.extend_scenarios import aspeculate, discard_speculation, speculate
 
-# Initialize prompt loader for chatbot subgraph
-prompt_loader = PromptLoader(str(Path(__file__).parent / "prompts"))
+# Shared prompt loader for chatbot subgraph
+prompt_loader = get_prompt_loader(str(Path(__file__).parent / "prompts"))
+
+# Local classifier answering confident cases without an LLM round-trip
+local_classifier = create_classifier(config.intent_log)
 
 # Chatbot controller state
 class ChatbotState(TypedDict):
@@ -21,16 +31,18 @@ class ChatbotState(TypedDict):
     intent: str
     response: str
     context: Dict[str, str]
+    specs: str  # Finished specs of the latest design turn, refined by follow-ups
 
 
-def classify_and_route(state: ChatbotState) -> str:
-    """Classify intent and route to appropriate handler using LLM.
-    
+@traced("build_messages")
+def _classification_messages(state: ChatbotState) -> List[Dict[str, str]]:
+    """Build the LLM messages for intent classification.
+
     Args:
         state: Current chatbot state
-        
+
     Returns:
-        Handler name to route to ("general" or "design_specs")
+        Messages to send to the LLM
     """
     message = state["message"]
     history = state.get("history", [])
@@ -38,81 +50,231 @@ def classify_and_route(state: ChatbotState) -> str:
     # Get the classification prompt
     system_prompt = prompt_loader.get_prompt("CLASSIFY_INTENT")
     
-    try:
-        # Prepare context for classification
-        if history:
-            # Get the last assistant response for context
-            last_assistant_response = None
-            for entry in reversed(history):
-                if entry.get("role") == "assistant":
-                    last_assistant_response = entry.get("content", "")
-                    break
-            
-            if last_assistant_response:
-                user_prompt = f"""Previous assistant response: {last_assistant_response}
+    # Prepare context for classification
+    if history:
+        # Get the last assistant response for context
+        last_assistant_response = None
+        for entry in reversed(history):
+            if entry.get("role") == "assistant":
+                last_assistant_response = entry.get("content", "")
+                break
+        
+        if last_assistant_response:
+            # A pasted or generated spec can be long; its gist is enough here
+            last_assistant_response = truncate_text(last_assistant_response, history_budget() // 2)
+            user_prompt = f"""Previous assistant response: {last_assistant_response}
 
 Current user message: {message}
 
 Based on the previous response and the new user message, is this conversation still about software design?"""
-            else:
-                user_prompt = f"""Current user message: {message}
-
-This is the first message in the conversation. Is this about software design?"""
         else:
             user_prompt = f"""Current user message: {message}
 
 This is the first message in the conversation. Is this about software design?"""
+    else:
+        user_prompt = f"""Current user message: {message}
+
+This is the first message in the conversation. Is this about software design?"""
+    
+    # Create messages for the LLM
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def _route(classification_result: str) -> str:
+    """Map the LLM classification to a route name."""
+    # Parse the classification result and return route
+    if "DESIGN_SPECS" in classification_result.strip().upper():
+        return "design_specs"
+    else:
+        return "general"
+
+
+@traced("local_intent")
+def _local_classification(state: ChatbotState) -> Optional[Tuple[str, float]]:
+    """Classify the message locally, once per turn, for routing and speculation.
+
+    Args:
+        state: Current chatbot state
+
+    Returns:
+        Tuple of (intent, confidence), or None if neither uses the local classifier
+    """
+    if not (config.local_intent or config.speculate):
+        return None
+    return local_classifier.classify(state["message"], state.get("history", []))
+
+
+def _local_route(classification: Optional[Tuple[str, float]]) -> Optional[str]:
+    """Route with the local classification when it is confident enough.
+
+    Args:
+        classification: Result of _local_classification
+
+    Returns:
+        Route name, or None if the LLM classifier should decide
+    """
+    if not config.local_intent or classification is None:
+        return None
+    intent, confidence = classification
+    if confidence >= config.local_intent_threshold:
+        return _route(intent)
+    return None
+
+
+def _should_speculate(state: ChatbotState, classification: Optional[Tuple[str, float]]) -> bool:
+    """Check whether to start extend_scenarios before the LLM classification returns.
+
+    Only worth it when the local classifier rates the message a design
+    request with at least config.speculate_threshold confidence and the
+    design pipeline would begin with extend_scenarios (not a refinement).
+
+    Args:
+        state: Current chatbot state
+        classification: Result of _local_classification
+
+    Returns:
+        True if the speculative run should start
+    """
+    if not config.speculate or classification is None:
+        return False
+    intent, confidence = classification
+    if intent != DESIGN or confidence < config.speculate_threshold:
+        return False
+    design_state = {"message": state["message"], "previous_specs": state.get("specs", "")}
+    return route_request(design_state) == "extend_scenarios"
+
+
+def _record_route(state: ChatbotState, route: str) -> str:
+    """Log an LLM routing decision for training the local classifier."""
+    if config.intent_log:
+        log_decision(config.intent_log, state["message"], DESIGN if route == "design_specs" else "GENERAL")
+    return route
+
+
+def classify_and_route(state: ChatbotState) -> str:
+    """Classify intent and route to appropriate handler.
+    
+    The local classifier answers confident cases; the LLM decides the rest.
+    
+    Args:
+        state: Current chatbot state
         
-        # Create messages for the LLM
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
-        # Generate classification using LiteLLM
-        response = litellm.completion(
-            messages=messages,
-            **config.get_model_params()
+    Returns:
+        Handler name to route to ("general" or "design_specs")
+    """
+    emit_stage("classify_and_route")
+    classification = _local_classification(state)
+    route = _local_route(classification)
+    if route:
+        return route
+    
+    speculating = _should_speculate(state, classification)
+    if speculating:
+        speculate(state)
+    try:
+        # Generate classification through the shared (cached) LLM layer
+        classification_result = llm.completion(
+            _classification_messages(state), **config.get_model_params("classify_intent")
         )
+        route = _record_route(state, _route(classification_result))
+    
+    except Exception as e:
+        print(f"Error in LLM classification: {e}")
+        # Fallback to general on error
+        route = "general"
+    if speculating and route != "design_specs":
+        discard_speculation(state)
+    return route
+
+
+async def aclassify_and_route(state: ChatbotState) -> str:
+    """Async variant of classify_and_route.
+    
+    Args:
+        state: Current chatbot state
         
-        classification_result = response.choices[0].message.content.strip()
-        
-        # Parse the classification result and return route
-        if "DESIGN_SPECS" in classification_result.upper():
-            return "design_specs"
-        else:
-            return "general"
+    Returns:
+        Handler name to route to ("general" or "design_specs")
+    """
+    emit_stage("classify_and_route")
+    classification = _local_classification(state)
+    route = _local_route(classification)
+    if route:
+        return route
+    
+    speculating = _should_speculate(state, classification)
+    if speculating:
+        aspeculate(state)
+    try:
+        classification_result = await llm.acompletion(
+            _classification_messages(state), **config.get_model_params("classify_intent")
+        )
+        route = _record_route(state, _route(classification_result))
     
     except Exception as e:
         print(f"Error in LLM classification: {e}")
         # Fallback to general on error
-        return "general"
+        route = "general"
+    if speculating and route != "design_specs":
+        discard_speculation(state)
+    return route
 
 
-def create():
+def _node(name: str, func, afunc) -> RunnableLambda:
+    """Build a graph node with sync and async implementations, timed as a stage."""
+    return RunnableLambda(
+        metrics.measured(name, func), afunc=metrics.measured(name, afunc), name=name
+    )
+
+
+def create(checkpointer=None):
     """Create and compile the main chatbot with subgraph routing.
     
+    Args:
+        checkpointer: Optional LangGraph checkpointer (e.g. SessionStore);
+            runs given a thread_id then resume that session
+        
     Returns:
         Compiled LangGraph chatbot
     """
-    # Create design specs subgraph
-    design_specs_subgraph = design_specs.create()
+    # Create design specs subgraph; it runs inside this graph's checkpoints,
+    # so it keeps none of its own
+    design_specs_subgraph = design_specs.create(checkpointer=False)
     
     # Create routing function for design specs
+    # A speculative run the subgraph did not use (e.g. it failed early) is dropped
     def route_to_design_specs(state: ChatbotState) -> Dict[str, Any]:
-        return design_specs.process(design_specs_subgraph, state["message"], state.get("history", []))
+        try:
+            return design_specs.process(
+                design_specs_subgraph, state["message"], state.get("history", []), state.get("specs")
+            )
+        finally:
+            discard_speculation(state)
+    
+    async def aroute_to_design_specs(state: ChatbotState) -> Dict[str, Any]:
+        try:
+            return await design_specs.aprocess(
+                design_specs_subgraph, state["message"], state.get("history", []), state.get("specs")
+            )
+        finally:
+            discard_speculation(state)
     
     # Create the main graph
     graph = StateGraph(ChatbotState)
     
-    # Add nodes
-    graph.add_node("generate_response", generate_response)
-    graph.add_node("design_specs", route_to_design_specs)
+    # Add nodes (sync and async implementations for invoke and ainvoke)
+    graph.add_node("generate_response", _node(
+        "generate_response", generate_response, agenerate_response))
+    graph.add_node("design_specs", _node(
+        "design_specs", route_to_design_specs, aroute_to_design_specs))
     
     # Add conditional routing from START
     graph.add_conditional_edges(
         START,
-        classify_and_route,
+        _node("classify_and_route", classify_and_route, aclassify_and_route),
         {
             "general": "generate_response",
             "design_specs": "design_specs"
@@ -122,13 +284,35 @@ def create():
     graph.add_edge("design_specs", END)
     
     # Compile the graph
-    return graph.compile()
+    return graph.compile(checkpointer=checkpointer)
+
+
+def _initial_state(
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    specs: Optional[str] = None
+) -> ChatbotState:
+    """Build the initial chatbot state for a request."""
+    if history is None:
+        history = []
+    
+    return {
+        "message": message,
+        "history": history,
+        "intent": "",
+        "response": "",
+        "context": {},
+        "specs": specs or ""
+    }
 
 
 def process(
     chatbot, 
     message: str, 
-    history: Optional[List[Dict[str, str]]] = None
+    history: Optional[List[Dict[str, str]]] = None,
+    specs: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    profile: Optional[str] = None
 ) -> Dict[str, Any]:
     """Process request with the main chatbot.
     
@@ -136,22 +320,169 @@ def process(
         chatbot: Compiled chatbot
         message: User message
         history: Optional conversation history
+        specs: Optional finished specs from the previous design turn
+        thread_id: Optional session to resume and update (the chatbot must be
+            created with a checkpointer); history and specs default to the
+            session's stored ones
+        profile: Optional file to write a Chrome trace-event timeline of
+            this call to (see utils.profiling)
         
     Returns:
         Dictionary with bot response and updated history
     """
-    if history is None:
-        history = []
+    with profiled(profile):
+        stored = stored_values(chatbot, thread_id)
+        initial_state = _initial_state(
+            message,
+            history if history is not None else stored.get("history"),
+            specs if specs is not None else stored.get("specs")
+        )
     
-    initial_state = {
-        "message": message,
-        "history": history,
-        "intent": "",
-        "response": "",
-        "context": {}
-    }
+        # Get LangFuse config for tracing
+        langfuse_config = thread_config(get_langfuse_config(), thread_id)
+        result = chatbot.invoke(initial_state, config=langfuse_config)
+    return result
+
+
+async def aprocess(
+    chatbot,
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    specs: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    profile: Optional[str] = None
+) -> Dict[str, Any]:
+    """Async variant of process, built on ainvoke.
     
-    # Get LangFuse config for tracing
-    langfuse_config = get_langfuse_config()
-    result = chatbot.invoke(initial_state, config=langfuse_config)
+    Args:
+        chatbot: Compiled chatbot
+        message: User message
+        history: Optional conversation history
+        specs: Optional finished specs from the previous design turn
+        thread_id: Optional session to resume and update (the chatbot must be
+            created with a checkpointer); history and specs default to the
+            session's stored ones
+        profile: Optional file to write a Chrome trace-event timeline of
+            this call to (see utils.profiling)
+        
+    Returns:
+        Dictionary with bot response and updated history
+    """
+    with profiled(profile):
+        stored = await astored_values(chatbot, thread_id)
+        initial_state = _initial_state(
+            message,
+            history if history is not None else stored.get("history"),
+            specs if specs is not None else stored.get("specs")
+        )
+    
+        # Get LangFuse config for tracing
+        langfuse_config = thread_config(get_langfuse_config(), thread_id)
+        result = await chatbot.ainvoke(initial_state, config=langfuse_config)
     return result
+
+
+def _stream_config() -> Dict[str, Any]:
+    """Build the run config that turns on stage and token events."""
+    run_config = dict(get_langfuse_config())
+    run_config["configurable"] = {STREAM_TOKENS_KEY: True}
+    return run_config
+
+
+def process_stream(
+    chatbot,
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    specs: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    profile: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """Process request with the main chatbot, streaming progress events.
+
+    Yields ``{"type": "stage", "stage", "label"}`` when a stage starts and
+    ``{"type": "token", "stage", "text"}`` for each token of the final answer,
+    followed by a single ``{"type": "result", "result"}`` with the same
+    dictionary process() would return.
+
+    Args:
+        chatbot: Compiled chatbot
+        message: User message
+        history: Optional conversation history
+        specs: Optional finished specs from the previous design turn
+        thread_id: Optional session to resume and update (the chatbot must be
+            created with a checkpointer); history and specs default to the
+            session's stored ones
+        profile: Optional file to write a Chrome trace-event timeline of
+            this call to (see utils.profiling)
+
+    Yields:
+        Event dictionaries
+    """
+    with profiled(profile):
+        stored = stored_values(chatbot, thread_id)
+        initial_state = _initial_state(
+            message,
+            history if history is not None else stored.get("history"),
+            specs if specs is not None else stored.get("specs")
+        )
+        result: Dict[str, Any] = dict(initial_state)
+    
+        for namespace, mode, chunk in chatbot.stream(
+            initial_state,
+            config=thread_config(_stream_config(), thread_id),
+            stream_mode=["custom", "values"],
+            subgraphs=True
+        ):
+            if mode == "custom":
+                yield chunk
+            elif not namespace:
+                result = chunk
+    
+    yield {"type": "result", "result": result}
+
+
+async def aprocess_stream(
+    chatbot,
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    specs: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    profile: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Async variant of process_stream, built on astream.
+
+    Args:
+        chatbot: Compiled chatbot
+        message: User message
+        history: Optional conversation history
+        specs: Optional finished specs from the previous design turn
+        thread_id: Optional session to resume and update (the chatbot must be
+            created with a checkpointer); history and specs default to the
+            session's stored ones
+        profile: Optional file to write a Chrome trace-event timeline of
+            this call to (see utils.profiling)
+
+    Yields:
+        Event dictionaries (see process_stream)
+    """
+    with profiled(profile):
+        stored = await astored_values(chatbot, thread_id)
+        initial_state = _initial_state(
+            message,
+            history if history is not None else stored.get("history"),
+            specs if specs is not None else stored.get("specs")
+        )
+        result: Dict[str, Any] = dict(initial_state)
+    
+        async for namespace, mode, chunk in chatbot.astream(
+            initial_state,
+            config=thread_config(_stream_config(), thread_id),
+            stream_mode=["custom", "values"],
+            subgraphs=True
+        ):
+            if mode == "custom":
+                yield chunk
+            elif not namespace:
+                result = chunk
+    
+    yield {"type": "result", "result": result}
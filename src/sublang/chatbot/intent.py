@@ -0,0 +1,201 @@
+"""Local fast-path intent classifier used before the LLM classifier.
+
+A small logistic model over word unigrams/bigrams. Its weights are seeded from
+the rules in prompts/classify_intent.md and can be refined from a JSONL log of
+past decisions (one ``{"message": ..., "intent": ...}`` object per line).
+"""
+
+import json
+import math
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+DESIGN = "DESIGN_SPECS"
+GENERAL = "GENERAL"
+
+# Seed weights: positive leans DESIGN_SPECS, negative leans GENERAL
+SEED_WEIGHTS: Dict[str, float] = {
+    # Software design topics
+    "design": 2.0, "designing": 2.0, "architecture": 2.5, "architect": 1.5,
+    "schema": 2.0, "database": 1.5, "api": 1.0, "endpoint": 1.0, "endpoints": 1.0,
+    "requirement": 2.0, "requirements": 2.0, "specification": 2.5,
+    "specifications": 2.5, "spec": 2.0, "specs": 2.0, "blueprint": 2.0,
+    "modeling": 1.5, "system": 1.0, "feature": 1.5, "features": 1.5,
+    "app": 1.5, "application": 1.5, "platform": 1.5, "service": 1.0,
+    "scalability": 2.0, "scalable": 1.5, "reliability": 1.5, "microservice": 2.0,
+    "microservices": 2.0, "workflow": 1.0, "module": 1.0, "component": 1.0,
+    "components": 1.0, "dashboard": 1.0, "constraint": 1.5, "constraints": 1.5,
+    "terms": 1.0, "manage": 0.5, "track": 0.5, "users": 0.5, "stack": 0.5,
+    "users can": 1.5, "user can": 1.5, "should allow": 1.5, "able to": 1.0,
+    "build a": 1.5, "create a": 1.0, "design a": 1.5, "tech stack": 1.5,
+    "data model": 2.0, "tool": 1.0, "want a": 0.5,
+    # General topics and programming help
+    "hi": -3.0, "hello": -3.0, "hey": -3.0, "thanks": -3.0, "thank": -3.0,
+    "bye": -3.0, "goodbye": -3.0, "ok": -1.5, "okay": -1.5, "cool": -1.5,
+    "great": -1.0, "joke": -2.5, "weather": -2.5, "who": -1.0,
+    "how are": -2.5, "what is": -1.0, "how do": -1.0, "explain": -0.5,
+    "error": -2.0, "bug": -2.0, "debug": -2.0, "debugging": -2.0,
+    "traceback": -2.5, "exception": -1.5, "syntax": -2.0, "compile": -1.5,
+    "stack trace": -3.0, "fix": -1.0, "regex": -1.5, "snippet": -1.5,
+    "sublang": -1.0, "project": -0.5,
+}
+SEED_BIAS = -0.5
+
+# Words that only express courtesy; they never make a follow-up sticky
+COURTESY: Set[str] = {
+    "thanks", "thank", "you", "ok", "okay", "cool", "great", "bye", "goodbye",
+    "nice", "awesome", "perfect",
+}
+
+# Short follow-ups to a design turn are kept in DESIGN_SPECS
+STICKY_MAX_WORDS = 30
+STICKY_BONUS = 3.0
+
+_WORD_RE = re.compile(r"[a-z0-9_']+")
+
+
+def _features(message: str) -> Tuple[List[str], int]:
+    """Extract unigram and bigram features and the word count."""
+    words = _WORD_RE.findall(message.lower())
+    features = set(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return list(features), len(words)
+
+
+def looks_like_specs(text: str) -> bool:
+    """Check whether an assistant response is a design specification."""
+    return bool(re.search(r"^#+\s*(Terms|Features|Constraints)\b|\*\*Term:", text, re.MULTILINE))
+
+
+class LocalIntentClassifier:
+    """Logistic keyword model returning an intent with a confidence score."""
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        bias: float = SEED_BIAS
+    ) -> None:
+        """Initialize the classifier.
+
+        Args:
+            weights: Feature weights (defaults to SEED_WEIGHTS)
+            bias: Intercept of the logistic model
+        """
+        self.weights: Dict[str, float] = dict(weights if weights is not None else SEED_WEIGHTS)
+        self.bias = bias
+
+    def _score(self, features: Iterable[str], word_count: int) -> float:
+        score = self.bias + sum(self.weights.get(f, 0.0) for f in features)
+        # Long inputs are usually product descriptions
+        if word_count >= 60:
+            score += 1.5
+        return score
+
+    def classify(
+        self,
+        message: str,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Tuple[str, float]:
+        """Classify a message.
+
+        Args:
+            message: User message
+            history: Conversation history, used for sticky follow-ups
+
+        Returns:
+            Tuple of (intent, confidence in [0.5, 1.0])
+        """
+        features, word_count = _features(message)
+        score = self._score(features, word_count)
+
+        # Sticky intent: a short, non-courtesy follow-up to a spec stays a design turn
+        if history and word_count <= STICKY_MAX_WORDS and not set(features) <= COURTESY:
+            for entry in reversed(history):
+                if entry.get("role") == "assistant":
+                    if looks_like_specs(entry.get("content", "")):
+                        score += STICKY_BONUS
+                    break
+
+        probability = 1.0 / (1.0 + math.exp(-score))
+        if probability >= 0.5:
+            return DESIGN, probability
+        return GENERAL, 1.0 - probability
+
+    def fit(
+        self,
+        examples: Iterable[Tuple[str, str]],
+        epochs: int = 5,
+        learning_rate: float = 0.1
+    ) -> None:
+        """Refine the weights with logistic-regression updates.
+
+        Args:
+            examples: (message, intent) pairs
+            epochs: Passes over the examples
+            learning_rate: Step size
+        """
+        data = [(_features(message), 1.0 if intent == DESIGN else 0.0)
+                for message, intent in examples]
+        for _ in range(epochs):
+            for (features, word_count), label in data:
+                probability = 1.0 / (1.0 + math.exp(-self._score(features, word_count)))
+                step = learning_rate * (label - probability)
+                self.bias += step
+                for feature in features:
+                    self.weights[feature] = self.weights.get(feature, 0.0) + step
+
+
+def load_decisions(path: str) -> List[Tuple[str, str]]:
+    """Load logged intent decisions.
+
+    Args:
+        path: JSONL file of {"message", "intent"} objects
+
+    Returns:
+        List of (message, intent) pairs; empty if the file is missing
+    """
+    log_path = Path(path)
+    if not log_path.exists():
+        return []
+    examples = []
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                examples.append((entry["message"], entry["intent"]))
+            except (ValueError, KeyError):
+                continue
+    return examples
+
+
+def log_decision(path: str, message: str, intent: str) -> None:
+    """Append an intent decision to the log.
+
+    Args:
+        path: JSONL log file
+        message: User message
+        intent: Decided intent (DESIGN_SPECS or GENERAL)
+    """
+    try:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"message": message, "intent": intent}, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"Warning: Could not log intent decision: {e}")
+
+
+def create_classifier(log_path: Optional[str] = None) -> LocalIntentClassifier:
+    """Create a classifier, refined from the decision log when available.
+
+    Args:
+        log_path: Optional JSONL decision log
+
+    Returns:
+        LocalIntentClassifier instance
+    """
+    classifier = LocalIntentClassifier()
+    if log_path:
+        examples = load_decisions(log_path)
+        if examples:
+            classifier.fit(examples)
+    return classifier
@@ -1,72 +1,120 @@
 """General response generation node for the LangGraph chatbot."""
 
-from typing import Any, Dict
-import litellm
+from typing import Any, Dict, List
 from pathlib import Path
-from sublang.utils import config, PromptLoader
+from sublang.utils import config, llm, get_prompt_loader
+from sublang.utils.context import afit_history, fit_history
+from sublang.utils.streaming import emit_stage, token_callback
+from sublang.utils.profiling import traced
 
-# Initialize prompt loader for chatbot subgraph
-prompt_loader = PromptLoader(str(Path(__file__).parent.parent / "prompts"))
+# Shared prompt loader for chatbot subgraph
+prompt_loader = get_prompt_loader(str(Path(__file__).parent.parent / "prompts"))
 
 
+@traced("build_messages")
+def _build_messages(state, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Build the LLM messages for a general response.
 
-def generate_response(state) -> Dict[str, Any]:
-    """Generate general response for non-design queries.
-    
     Args:
         state: Current chat state
-        
+        history: Conversation history fitted to the token budget
+
     Returns:
-        Dictionary with generated response and updated history
+        Messages to send to the LLM
     """
     message = state["message"]
-    history = state.get("history", [])
-    
+
     # Get the general prompt (includes README content automatically)
     system_prompt = prompt_loader.get_prompt("GENERAL")
-    
-    try:
-        # Create messages for the LLM
-        messages = [
-            {"role": "system", "content": system_prompt},
+
+    # Create messages for the LLM
+    messages = [
+        {"role": "system", "content": system_prompt},
+    ]
+
+    # Add conversation history (recent turns within the token budget,
+    # older ones as a rolling summary)
+    messages.extend(history)
+
+    # Add current user message
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+@traced("build_result")
+def _build_result(state, response_content: str) -> Dict[str, Any]:
+    """Turn the LLM response into a state update."""
+    message = state["message"]
+    history = state.get("history", [])
+    return {
+        "response": response_content,
+        "intent": "GENERAL",
+        "history": history + [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": response_content}
         ]
-        
-        # Add conversation history (last 4 messages = 2 rounds of talk)
-        if history:
-            for entry in history[-4:]:  # Keep last 4 messages for context
-                messages.append(entry)
-        
-        # Add current user message
-        messages.append({"role": "user", "content": message})
-        
-        # Generate response using LiteLLM
-        response = litellm.completion(
-            messages=messages,
-            **config.get_model_params()
+    }
+
+
+def _error_result(state, e: Exception) -> Dict[str, Any]:
+    """Build the state update used when the LLM call fails."""
+    message = state["message"]
+    history = state.get("history", [])
+
+    print(f"Error generating response: {e}")
+    error_msg = (
+        "I apologize, but I encountered an error while processing "
+        "your request. Please try again."
+    )
+    return {
+        "response": error_msg,
+        "intent": "GENERAL",
+        "history": history + [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": "Error occurred"}
+        ]
+    }
+
+
+def generate_response(state) -> Dict[str, Any]:
+    """Generate general response for non-design queries.
+
+    Args:
+        state: Current chat state
+
+    Returns:
+        Dictionary with generated response and updated history
+    """
+    emit_stage("generate_response")
+    try:
+        history = fit_history(state.get("history"), model=config.stage_model("general"))
+        response_content = llm.completion(
+            _build_messages(state, history),
+            on_token=token_callback("generate_response"),
+            **config.get_model_params("general")
         )
-        
-        response_content = response.choices[0].message.content
-        
-        return {
-            "response": response_content,
-            "intent": "GENERAL",
-            "history": history + [
-                {"role": "user", "content": message},
-                {"role": "assistant", "content": response_content}
-            ]
-        }
-    
+        return _build_result(state, response_content)
     except Exception as e:
-        print(f"Error generating response: {e}")
-        error_msg = (
-            "I apologize, but I encountered an error while processing "
-            "your request. Please try again."
+        return _error_result(state, e)
+
+
+async def agenerate_response(state) -> Dict[str, Any]:
+    """Async variant of generate_response.
+
+    Args:
+        state: Current chat state
+
+    Returns:
+        Dictionary with generated response and updated history
+    """
+    emit_stage("generate_response")
+    try:
+        history = await afit_history(state.get("history"), model=config.stage_model("general"))
+        response_content = await llm.acompletion(
+            _build_messages(state, history),
+            on_token=token_callback("generate_response"),
+            **config.get_model_params("general")
         )
-        return {
-            "response": error_msg,
-            "intent": "GENERAL",
-            "history": history + [
-                {"role": "user", "content": message},
-                {"role": "assistant", "content": "Error occurred"}
-            ]
-        }
+        return _build_result(state, response_content)
+    except Exception as e:
+        return _error_result(state, e)
@@ -1,10 +1,19 @@
 #!/usr/bin/env python3
 """SubLang Chatbot - LangGraph-based chatbot with predefined prompts."""
 
-from typing import List, Dict
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
-from sublang.utils import config
-from sublang.chatbot import create, process
+from sublang.utils import config, metrics
+from sublang.utils.profiling import profiled
+from sublang.batch import run_batch, DEFAULT_PATTERN
+
+# LangGraph, LiteLLM and the compiled graphs are imported lazily inside the
+# commands that need them, so argument parsing and the API key check stay fast
 
 # Load environment variables
 load_dotenv()
@@ -69,10 +78,384 @@ def get_multiline_input(prompt: str = "You: ") -> str:
     return '\n'.join(lines)
 
 
-def main() -> None:
+def print_streamed_turn(
+    chatbot,
+    user_input: str,
+    history: List[Dict[str, str]],
+    specs: str = "",
+    thread_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Run one turn in streaming mode, printing stage events and tokens as they arrive.
+
+    Args:
+        chatbot: Compiled chatbot
+        user_input: User message
+        history: Conversation history
+        specs: Finished specs of the previous design turn
+        thread_id: Optional session to store the turn in
+
+    Returns:
+        The final chatbot result
+    """
+    from sublang.chatbot import process_stream
+    
+    result: Dict[str, Any] = {}
+    streamed: List[str] = []
+    
+    for event in process_stream(chatbot, user_input, history, specs, thread_id=thread_id):
+        if event["type"] == "stage":
+            print(f"Bot: ({event['label']}...)", flush=True)
+        elif event["type"] == "token":
+            streamed.append(event["text"])
+            print(event["text"], end="", flush=True)
+        elif event["type"] == "result":
+            result = event["result"]
+    
+    if streamed:
+        print()
+    # The design pipeline keeps only the final code block of the streamed
+    # answer; print it when it differs from what was shown
+    if result.get("response", "") != "".join(streamed).strip():
+        if streamed:
+            print("\n--- Final specs ---")
+        print(result.get("response", ""))
+    return result
+
+
+def run_once(args: argparse.Namespace) -> int:
+    """Answer a single message read from a file or stdin, without the chat loop.
+
+    Args:
+        args: Parsed arguments of the run command
+
+    Returns:
+        Process exit code
+    """
+    if args.input and args.input != "-":
+        with open(args.input, 'r', encoding='utf-8') as f:
+            message = f.read().strip()
+    else:
+        message = sys.stdin.read().strip()
+    if not message:
+        print("Error: empty input", file=sys.stderr)
+        return 1
+    
+    checkpointer = None
+    if args.session:
+        from sublang.utils.session_store import get_session_store
+        checkpointer = get_session_store()
+    
+    with metrics.turn() as turn_metrics, profiled(args.profile, args.profile_cpu):
+        if args.design:
+            # Skip intent classification and go straight to the design pipeline
+            import sublang.design_specs as design_specs
+            result = design_specs.process(
+                design_specs.create(checkpointer), message, thread_id=args.session
+            )
+        else:
+            from sublang.chatbot import create, process
+            result = process(create(checkpointer), message, thread_id=args.session)
+    if args.metrics:
+        print(turn_metrics.summary(), file=sys.stderr)
+    
+    # A failed design run answers with an apology; don't pass it off as specs
+    error = result.get("error")
+    specs = result.get("specs", "")
+    if not error and args.design and (not specs or result.get("response") != specs):
+        error = "no specs in the response"
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 1
+    
+    if args.json:
+        from sublang.utils import llm
+        output = json.dumps(
+            {
+                "intent": result.get("intent", ""),
+                "response": result.get("response", ""),
+                "usage": llm.get_usage(),
+                "metrics": turn_metrics.to_json(),
+            },
+            ensure_ascii=False,
+            indent=2
+        )
+    else:
+        output = result.get("response", "")
+    
+    if args.output and args.output != "-":
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+def lint_files(paths: List[str], fix: bool = False) -> int:
+    """Check spec files against the formatting rules of specs/dev/rules.md.
+
+    Args:
+        paths: Markdown spec files
+        fix: Whether to rewrite the files to follow the rules
+
+    Returns:
+        Process exit code: 1 if violations remain, 0 otherwise (advisory
+        reports such as bare-term do not count)
+    """
+    from sublang.design_specs.lint import ADVISORY_RULES, lint
+    
+    remaining = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        fixed, violations = lint(text, fix=fix)
+        for violation in violations:
+            print(f"{path}: {violation}")
+        errors = [v for v in violations if v.rule not in ADVISORY_RULES]
+        if fix and fixed != text:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(fixed.rstrip("\n") + "\n")
+            print(f"{path}: fixed {len(errors)} violations")
+        elif errors:
+            remaining += len(errors)
+    return 1 if remaining else 0
+
+
+# Import stages measured by `sublang import-time`, each timed after the previous
+_IMPORT_TIME_SCRIPT = """
+import json, time
+t = time.perf_counter()
+timings = {}
+import sublang.cli
+timings["sublang.cli"] = time.perf_counter() - t
+t = time.perf_counter()
+import sublang.chatbot
+timings["sublang.chatbot"] = time.perf_counter() - t
+t = time.perf_counter()
+sublang.chatbot.create()
+timings["chatbot.create()"] = time.perf_counter() - t
+t = time.perf_counter()
+from sublang.utils import llm
+llm.get_litellm()
+timings["litellm"] = time.perf_counter() - t
+print(json.dumps(timings))
+"""
+
+
+def measure_import_times(repeat: int = 3) -> Dict[str, float]:
+    """Measure startup cost in fresh interpreters.
+
+    Args:
+        repeat: Number of runs; the fastest time of each stage is kept
+
+    Returns:
+        Milliseconds per stage, plus the whole process time under "process"
+    """
+    best: Dict[str, float] = {}
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-c", _IMPORT_TIME_SCRIPT],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        timings = json.loads(completed.stdout.strip().splitlines()[-1])
+        timings["process"] = time.perf_counter() - started
+        for stage, seconds in timings.items():
+            best[stage] = min(best.get(stage, seconds), seconds)
+    return {stage: round(seconds * 1000, 1) for stage, seconds in best.items()}
+
+
+def _turn_options(argument_default: Optional[str] = None) -> argparse.ArgumentParser:
+    """Build the parent parser of the per-turn options (chat loop and run).
+
+    Args:
+        argument_default: argparse.SUPPRESS for subcommand copies, so that
+            options given before the subcommand are not reset
+
+    Returns:
+        Parser to pass in parents=
+    """
+    parser = argparse.ArgumentParser(add_help=False, argument_default=argument_default)
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="print per-stage time, tokens, cost and cache status after each turn"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="write a Chrome trace-event timeline of each turn (the last one is kept)"
+    )
+    parser.add_argument(
+        "--profile-cpu",
+        metavar="PATH",
+        help="write a cProfile dump of each turn's local CPU time (pstats format)"
+    )
+    parser.add_argument(
+        "--session",
+        metavar="NAME",
+        help="resume and save the conversation under this session name"
+    )
+    return parser
+
+
+def _metrics_out_option(argument_default: Optional[str] = None) -> argparse.ArgumentParser:
+    """Build the parent parser of --metrics-out (chat loop, run, batch and serve).
+
+    Args:
+        argument_default: argparse.SUPPRESS for subcommand copies
+
+    Returns:
+        Parser to pass in parents=
+    """
+    parser = argparse.ArgumentParser(add_help=False, argument_default=argument_default)
+    parser.add_argument(
+        "--metrics-out",
+        metavar="PATH",
+        help="write cumulative metrics on exit (Prometheus text for .prom/.txt, JSON otherwise)"
+    )
+    return parser
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line arguments.
+
+    Args:
+        argv: Argument list (defaults to sys.argv)
+
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="sublang",
+        description="Chatbot for software design in well-defined sublanguages.",
+        parents=[_turn_options(), _metrics_out_option()]
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="show stage progress and stream the final answer token by token"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="generate specs for every description file under a directory",
+        parents=[_metrics_out_option(argparse.SUPPRESS)]
+    )
+    batch_parser.add_argument("directory", help="directory to search for description files")
+    batch_parser.add_argument(
+        "--pattern",
+        default=DEFAULT_PATTERN,
+        help=f"glob pattern for description files (default: {DEFAULT_PATTERN})"
+    )
+    batch_parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=4,
+        help="number of concurrent workers (default: 4)"
+    )
+    batch_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="regenerate items already recorded as done in the manifest"
+    )
+
+    run_parser = subparsers.add_parser(
+        "run",
+        help="answer one message from a file or stdin and exit",
+        parents=[_turn_options(argparse.SUPPRESS), _metrics_out_option(argparse.SUPPRESS)]
+    )
+    run_parser.add_argument("-i", "--input", help="input file (default: stdin)")
+    run_parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    run_parser.add_argument(
+        "--design",
+        action="store_true",
+        help="skip intent classification and generate design specs"
+    )
+    run_parser.add_argument(
+        "--json",
+        action="store_true",
+        help="write a JSON object with intent and response"
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="serve chat and design endpoints over HTTP with SSE streaming",
+        parents=[_metrics_out_option(argparse.SUPPRESS)]
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1", help="interface to bind (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8000, help="port to bind (default: 8000)")
+    serve_parser.add_argument(
+        "--workers",
+        type=int,
+        help=f"turns running at once (default: SERVE_WORKERS={config.serve_workers})"
+    )
+    serve_parser.add_argument(
+        "--queue",
+        type=int,
+        help=f"requests waiting for a slot before 429 (default: SERVE_QUEUE={config.serve_queue})"
+    )
+    serve_parser.add_argument(
+        "--per-client",
+        type=int,
+        help=f"requests in flight per client (default: SERVE_PER_CLIENT={config.serve_per_client})"
+    )
+
+    lint_parser = subparsers.add_parser(
+        "lint",
+        help="check spec files against the formatting rules (no LLM calls)"
+    )
+    lint_parser.add_argument("files", nargs="+", help="markdown spec files")
+    lint_parser.add_argument(
+        "--fix",
+        action="store_true",
+        help="rewrite the files to follow the rules"
+    )
+
+    import_time_parser = subparsers.add_parser(
+        "import-time",
+        help="measure startup and import time (milliseconds, as JSON)"
+    )
+    import_time_parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of fresh interpreters to measure (default: 3)"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
     """Main function to run the chatbot."""
+    args = parse_args(argv)
+    
+    if args.command == "import-time":
+        print(json.dumps(measure_import_times(args.repeat), indent=2))
+        return
+    
+    if args.command == "lint":
+        sys.exit(lint_files(args.files, args.fix))
+    
     # Check API keys
     if not check_api_keys():
+        sys.exit(1)
+    
+    if args.metrics_out:
+        import atexit
+        atexit.register(metrics.write, args.metrics_out)
+    
+    if args.command == "batch":
+        counts = run_batch(args.directory, pattern=args.pattern, jobs=args.jobs, force=args.force)
+        sys.exit(1 if counts["failed"] else 0)
+    
+    if args.command == "run":
+        sys.exit(run_once(args))
+    
+    if args.command == "serve":
+        from sublang.server import serve
+        serve(args.host, args.port, args.workers, args.queue, args.per_client)
         return
     
     # Create the chatbot
@@ -80,7 +463,12 @@ def main() -> None:
     print(f"Using model: {config.model}")
     
     try:
-        chatbot = create()
+        from sublang.chatbot import create, process
+        checkpointer = None
+        if args.session:
+            from sublang.utils.session_store import get_session_store
+            checkpointer = get_session_store()
+        chatbot = create(checkpointer)
         print("Chatbot ready! Type 'quit' to exit.")
         print("Press Enter twice to finish input.\n")
     except Exception as e:
@@ -89,6 +477,14 @@ def main() -> None:
     
     # Chat loop
     history: List[Dict[str, str]] = []
+    specs = ""
+    if args.session:
+        from sublang.utils.session_store import stored_values
+        stored = stored_values(chatbot, args.session)
+        history = stored.get("history") or []
+        specs = stored.get("specs") or ""
+        if history:
+            print(f"Resumed session '{args.session}' ({len(history)} messages).\n")
     
     while True:
         try:
@@ -101,18 +497,25 @@ def main() -> None:
             if not user_input:
                 continue
             
-            # Show that input is finished and bot is processing
-            print("Bot: (Working on it...)", flush=True)
-            
-            # Get response from chatbot
-            result = process(chatbot, user_input, history)
-            
-            # Print response
-            print(result['response'])
+            with metrics.turn() as turn_metrics, profiled(args.profile, args.profile_cpu):
+                if args.stream:
+                    result = print_streamed_turn(chatbot, user_input, history, specs, args.session)
+                else:
+                    # Show that input is finished and bot is processing
+                    print("Bot: (Working on it...)", flush=True)
+                    
+                    # Get response from chatbot
+                    result = process(chatbot, user_input, history, specs, thread_id=args.session)
+                    
+                    # Print response
+                    print(result['response'])
             print(f"(Intent: {result['intent']})\n")
+            if args.metrics:
+                print(turn_metrics.summary() + "\n")
             
-            # Update history
+            # Update history and the specs that follow-ups refine
             history = result['history']
+            specs = result.get('specs', specs)
             
         except KeyboardInterrupt:
             print("\nGoodbye!")
@@ -1,5 +1,9 @@
 """Design specifications subgraph."""
 
-from .design_specs import create, process
+from .design_specs import create, process, aprocess, process_stream, aprocess_stream
+from .spec_model import Spec, Term, Member, Feature, Constraint, parse_spec, serialize_spec
 
-__all__ = ["create", "process"]
+__all__ = [
+    "create", "process", "aprocess", "process_stream", "aprocess_stream",
+    "Spec", "Term", "Member", "Feature", "Constraint", "parse_spec", "serialize_spec",
+]
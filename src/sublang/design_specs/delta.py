@@ -0,0 +1,166 @@
+"""Changes-only outputs of the add_features and add_constraints stages.
+
+With SPEC_DELTAS on, the two stages no longer repeat the terms (and
+features) they received: they answer with the items they add or change, in
+full, plus the names of the items they remove. The pipeline applies that
+patch to the previous stage's specification locally, so output tokens follow
+what a stage changes rather than the size of the whole specification.
+
+In markdown, removals are listed in a ``## Removed`` section::
+
+    ## Removed
+
+    - Term: draft
+    - Feature: Export to PDF
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List
+from sublang.utils import config, get_prompt_loader
+from sublang.design_specs.spec_model import (
+    CONSTRAINTS, FEATURES, TERMS, Item, Spec, Term, item_key
+)
+from sublang.design_specs.utils import combine_prompts
+
+# Shared prompt loader for design_specs subgraph
+prompt_loader = get_prompt_loader(str(Path(__file__).parent / "prompts"))
+
+DELTA_STAGES = ("add_features", "add_constraints")
+REMOVED_SECTION = "removed"
+
+# Removal kinds, keyed by the label used in a "## Removed" section
+_REMOVAL_KINDS = {"term": "terms", "feature": "features", "constraint": "constraints"}
+_REMOVAL = re.compile(r"^\s*[-*]\s+(?:\*\*|_)?(term|feature|constraint)s?(?:\*\*|_)?\s*:\s*(.+?)\s*$", re.IGNORECASE)
+
+
+def enabled(stage: str) -> bool:
+    """Check whether a stage answers with changes only."""
+    return config.spec_deltas and stage in DELTA_STAGES
+
+
+def instructions(stage_prompt: str, stage: str) -> str:
+    """Append the changes-only instructions to a stage prompt.
+
+    Args:
+        stage_prompt: Step-specific prompt
+        stage: Pipeline stage
+
+    Returns:
+        The prompt, unchanged when the stage outputs full lists
+    """
+    if not enabled(stage):
+        return stage_prompt
+    return combine_prompts(stage_prompt, prompt_loader.get_prompt("SPEC_DELTA"))
+
+
+def _clean(name: str) -> str:
+    return name.strip().strip("`*_").strip()
+
+
+def parse_removals(text: str) -> Dict[str, List[str]]:
+    """Parse the lines of a ``## Removed`` section.
+
+    Args:
+        text: Section text (lines like ``- Term: name``)
+
+    Returns:
+        Removed names per kind ("terms", "features", "constraints")
+    """
+    removed: Dict[str, List[str]] = {kind: [] for kind in _REMOVAL_KINDS.values()}
+    for line in text.splitlines():
+        match = _REMOVAL.match(line)
+        if match:
+            removed[_REMOVAL_KINDS[match.group(1).lower()]].append(_clean(match.group(2)))
+    return removed
+
+
+def split_removals(delta: Spec) -> Dict[str, List[str]]:
+    """Take the ``## Removed`` section out of a parsed markdown delta.
+
+    Args:
+        delta: Delta parsed with parse_spec (modified in place)
+
+    Returns:
+        Removed names per kind
+    """
+    removed = {kind: [] for kind in _REMOVAL_KINDS.values()}
+    kept = []
+    for title, text in delta.extra_sections:
+        if title.lower() == REMOVED_SECTION:
+            for kind, names in parse_removals(text).items():
+                removed[kind].extend(names)
+        else:
+            kept.append((title, text))
+    delta.extra_sections = kept
+    delta.section_order = [t for t in delta.section_order if t.lower() != REMOVED_SECTION]
+    return removed
+
+
+def _patch_terms(terms: List[Term], changes: List[Term], removed: List[str]) -> List[Term]:
+    """Replace terms by name, append new ones and drop removed ones."""
+    position = {term.name.lower(): i for i, term in enumerate(terms)}
+    patched = list(terms)
+    for term in changes:
+        index = position.get(term.name.lower())
+        if index is None:
+            position[term.name.lower()] = len(patched)
+            patched.append(term)
+        else:
+            patched[index] = term
+    dropped = {_clean(name).lower() for name in removed}
+    return [term for term in patched if term.name.lower() not in dropped]
+
+
+def _patch_items(items: List[Item], changes: List[Item], removed: List[str]) -> List[Item]:
+    """Replace items by title (or text), append new ones and drop removed ones."""
+    position = {item_key(item): i for i, item in enumerate(items)}
+    patched = list(items)
+    for item in changes:
+        key = item_key(item)
+        index = position.get(key)
+        if index is None:
+            position[key] = len(patched)
+            patched.append(item)
+        else:
+            patched[index] = item
+    dropped = {item_key(Item(_clean(name), "")) for name in removed}
+    return [item for item in patched if item_key(item) not in dropped]
+
+
+def apply_delta(base: Spec, delta: Spec, removed: Dict[str, List[str]]) -> Spec:
+    """Apply a stage's changes to the specification it received.
+
+    Terms are matched by name and features and constraints by title
+    (case-insensitive); a matching item is replaced, others are appended in
+    order, and removed names are dropped. The layout of the base is kept,
+    and items the delta does not touch are written back as they were parsed.
+
+    Args:
+        base: Specification from the previous stage
+        delta: Added and changed items
+        removed: Removed names per kind ("terms", "features", "constraints")
+
+    Returns:
+        Patched specification
+    """
+    patched = Spec(
+        terms=_patch_terms(base.terms, delta.terms, removed.get("terms", [])),
+        features=_patch_items(base.features, delta.features, removed.get("features", [])),
+        constraints=_patch_items(base.constraints, delta.constraints, removed.get("constraints", [])),
+        preamble=base.preamble,
+        extra_sections=list(base.extra_sections),
+        section_order=list(base.section_order) or [TERMS],
+        style=base.style,
+    )
+    known = {title for title, _ in patched.extra_sections}
+    for title, text in delta.extra_sections:
+        if title not in known:
+            patched.extra_sections.append((title, text))
+    for title in delta.section_order:
+        if title not in patched.section_order:
+            patched.section_order.append(title)
+    for title, items in ((FEATURES, patched.features), (CONSTRAINTS, patched.constraints)):
+        if items and title not in patched.section_order:
+            patched.section_order.append(title)
+    return patched
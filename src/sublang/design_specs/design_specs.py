@@ -1,10 +1,27 @@
 """Design specifications subgraph with isolated state and functions."""
 
-from typing import Dict, List, Optional, Any
+import asyncio
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Any
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from typing_extensions import TypedDict
-from .nodes import extend_scenarios, extract_terms, add_features, add_constraints
+from .nodes import (
+    extend_scenarios, aextend_scenarios,
+    extract_terms, aextract_terms,
+    add_features, aadd_features,
+    add_constraints, aadd_constraints,
+    refine_specs, arefine_specs,
+    shard_specs, ashard_specs,
+    reuse_specs, areuse_specs,
+    lint_specs, alint_specs,
+)
+from .nodes.reuse_specs import find_reusable, remember_specs
+from .utils import is_change_request
+from sublang.utils import config, llm, metrics
+from sublang.utils.profiling import profiled
 from sublang.utils.model_config import get_langfuse_config
+from sublang.utils.session_store import astored_values, stored_values, thread_config
+from sublang.utils.streaming import STREAM_TOKENS_KEY
 
 # Isolated state for design_specs subgraph
 class DesignSpecsState(TypedDict):
@@ -15,38 +32,162 @@ class DesignSpecsState(TypedDict):
     response: str
     context: Dict[str, str]
     specs: str  # Evolving specification: terms -> terms+features -> terms+features+constraints
+    previous_specs: str  # Finished specification from the previous design turn, if any
+    error: str  # "<stage>: <error>" of the stage that failed this turn, if any
 
 
-def create():
+def _refines(state: DesignSpecsState) -> bool:
+    """Check whether the message is a short change request on existing specs.
+
+    Anything without an explicit change signal (e.g. a new short
+    description) goes through the full design stages.
+    """
+    return bool(config.refine
+                and state.get("previous_specs")
+                and len(state["message"].split()) <= config.refine_max_words
+                and is_change_request(state["message"], state["previous_specs"]))
+
+
+def route_request(state: DesignSpecsState) -> str:
+    """Route short change requests on existing specs to the refinement path and
+    near-duplicates of earlier descriptions to their stored specs.
+
+    Args:
+        state: Current design_specs state
+
+    Returns:
+        "refine_specs", "reuse_specs" or "extend_scenarios"
+    """
+    if _refines(state):
+        return "refine_specs"
+    if find_reusable(state) is not None:
+        return "reuse_specs"
+    return "extend_scenarios"
+
+
+async def aroute_request(state: DesignSpecsState) -> str:
+    """Async variant of route_request; the similarity lookup runs in a thread."""
+    return await asyncio.to_thread(route_request, state)
+
+
+def _remember(initial_state: DesignSpecsState, result: Dict[str, Any]) -> None:
+    """Store the specs of a new description for near-duplicate reuse."""
+    if not _refines(initial_state):
+        remember_specs(initial_state, result)
+
+
+def route_description(state: DesignSpecsState) -> str:
+    """Send long expanded descriptions through the sharded extraction path.
+
+    Args:
+        state: Current design_specs state
+
+    Returns:
+        "shard_specs" or "extract_terms"
+    """
+    if config.shard_tokens > 0 and llm.count_tokens(state["message"]) > config.shard_tokens:
+        return "shard_specs"
+    return "extract_terms"
+
+
+def _node(name: str, func, afunc) -> RunnableLambda:
+    """Build a graph node with sync and async implementations, timed as a stage."""
+    return RunnableLambda(
+        metrics.measured(name, func), afunc=metrics.measured(name, afunc), name=name
+    )
+
+
+def create(checkpointer=None):
     """Create and compile the design_specs subgraph.
 
+    Args:
+        checkpointer: Optional LangGraph checkpointer (e.g. SessionStore);
+            runs given a thread_id then resume that session. False disables
+            checkpointing when the subgraph runs inside a checkpointed graph
+
     Returns:
         Compiled LangGraph design_specs subgraph
     """
     # Create the graph
     graph = StateGraph(DesignSpecsState)
 
-    # Add nodes
-    graph.add_node("extend_scenarios", extend_scenarios)
-    graph.add_node("extract_terms", extract_terms)
-    graph.add_node("add_features", add_features)
-    graph.add_node("add_constraints", add_constraints)
+    # Add nodes (each with a sync and an async implementation so the graph
+    # supports both invoke and ainvoke)
+    graph.add_node("extend_scenarios", _node("extend_scenarios", extend_scenarios, aextend_scenarios))
+    graph.add_node("extract_terms", _node("extract_terms", extract_terms, aextract_terms))
+    graph.add_node("add_features", _node("add_features", add_features, aadd_features))
+    graph.add_node("add_constraints", _node("add_constraints", add_constraints, aadd_constraints))
+    graph.add_node("refine_specs", _node("refine_specs", refine_specs, arefine_specs))
+    graph.add_node("shard_specs", _node("shard_specs", shard_specs, ashard_specs))
+    graph.add_node("reuse_specs", _node("reuse_specs", reuse_specs, areuse_specs))
+    # Finished specs pass through the local formatting check (see lint.py);
+    # reused specs were checked when they were stored
+    finish = END
+    if config.spec_lint in ("report", "fix"):
+        graph.add_node("lint_specs", _node("lint_specs", lint_specs, alint_specs))
+        graph.add_edge("lint_specs", END)
+        finish = "lint_specs"
 
-    # Add edges
-    graph.add_edge(START, "extend_scenarios")
-    graph.add_edge("extend_scenarios", "extract_terms")
+    # Add edges: new descriptions run the full pipeline, follow-ups are refined,
+    # near-duplicates of earlier descriptions get the stored specs
+    graph.add_conditional_edges(
+        START,
+        RunnableLambda(route_request, afunc=aroute_request, name="route_request"),
+        {
+            "extend_scenarios": "extend_scenarios",
+            "refine_specs": "refine_specs",
+            "reuse_specs": "reuse_specs"
+        }
+    )
+    # Long descriptions are split into chunks processed in parallel, then
+    # merged before add_constraints
+    graph.add_conditional_edges(
+        "extend_scenarios",
+        route_description,
+        {
+            "extract_terms": "extract_terms",
+            "shard_specs": "shard_specs"
+        }
+    )
     graph.add_edge("extract_terms", "add_features")
     graph.add_edge("add_features", "add_constraints")
-    graph.add_edge("add_constraints", END)
+    graph.add_edge("shard_specs", "add_constraints")
+    graph.add_edge("add_constraints", finish)
+    graph.add_edge("refine_specs", finish)
+    graph.add_edge("reuse_specs", END)
 
     # Compile the graph
-    return graph.compile()
+    return graph.compile(checkpointer=checkpointer)
+
+
+def _initial_state(
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    previous_specs: Optional[str] = None
+) -> DesignSpecsState:
+    """Build the initial design_specs state for a request."""
+    if history is None:
+        history = []
+
+    return {
+        "message": message,
+        "history": history,
+        "intent": "DESIGN_SPECS",
+        "response": "",
+        "context": {},
+        "specs": "",
+        "previous_specs": previous_specs or "",
+        "error": ""
+    }
 
 
 def process(
     design_graph, 
     message: str, 
-    history: Optional[List[Dict[str, str]]] = None
+    history: Optional[List[Dict[str, str]]] = None,
+    previous_specs: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    profile: Optional[str] = None
 ) -> Dict[str, Any]:
     """Process request with the design_specs subgraph.
 
@@ -54,23 +195,167 @@ def process(
         design_graph: Compiled design_specs subgraph
         message: User message
         history: Optional conversation history
+        previous_specs: Finished specs of the previous design turn; short
+            follow-ups are applied to them instead of starting over
+        thread_id: Optional session to resume and update (the graph must be
+            created with a checkpointer); history and previous_specs default
+            to the session's stored ones
+        profile: Optional file to write a Chrome trace-event timeline of
+            this call to (see utils.profiling)
 
     Returns:
         Dictionary with design response and updated history
     """
-    if history is None:
-        history = []
+    with profiled(profile):
+        stored = stored_values(design_graph, thread_id)
+        initial_state = _initial_state(
+            message,
+            history if history is not None else stored.get("history"),
+            previous_specs if previous_specs is not None else stored.get("specs")
+        )
+
+        # Get LangFuse config for tracing
+        langfuse_config = thread_config(get_langfuse_config(), thread_id)
+        result = design_graph.invoke(initial_state, config=langfuse_config)
+        _remember(initial_state, result)
+    return result
 
-    initial_state = {
-        "message": message,
-        "history": history,
-        "intent": "DESIGN_SPECS",
-        "response": "",
-        "context": {},
-        "specs": ""
-    }
 
-    # Get LangFuse config for tracing
-    langfuse_config = get_langfuse_config()
-    result = design_graph.invoke(initial_state, config=langfuse_config)
+async def aprocess(
+    design_graph,
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    previous_specs: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    profile: Optional[str] = None
+) -> Dict[str, Any]:
+    """Async variant of process, built on ainvoke.
+
+    Args:
+        design_graph: Compiled design_specs subgraph
+        message: User message
+        history: Optional conversation history
+        previous_specs: Finished specs of the previous design turn; short
+            follow-ups are applied to them instead of starting over
+        thread_id: Optional session to resume and update (the graph must be
+            created with a checkpointer); history and previous_specs default
+            to the session's stored ones
+        profile: Optional file to write a Chrome trace-event timeline of
+            this call to (see utils.profiling)
+
+    Returns:
+        Dictionary with design response and updated history
+    """
+    with profiled(profile):
+        stored = await astored_values(design_graph, thread_id)
+        initial_state = _initial_state(
+            message,
+            history if history is not None else stored.get("history"),
+            previous_specs if previous_specs is not None else stored.get("specs")
+        )
+
+        # Get LangFuse config for tracing
+        langfuse_config = thread_config(get_langfuse_config(), thread_id)
+        result = await design_graph.ainvoke(initial_state, config=langfuse_config)
+        await asyncio.to_thread(_remember, initial_state, result)
     return result
+
+
+def _stream_config() -> Dict[str, Any]:
+    """Build the run config that turns on stage and token events."""
+    run_config = dict(get_langfuse_config())
+    run_config["configurable"] = {STREAM_TOKENS_KEY: True}
+    return run_config
+
+
+def process_stream(
+    design_graph,
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    previous_specs: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    profile: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """Process request with the design_specs subgraph, streaming progress events.
+
+    Yields the same stage and token events as chatbot.process_stream,
+    followed by a single ``{"type": "result", "result"}``.
+
+    Args:
+        design_graph: Compiled design_specs subgraph
+        message: User message
+        history: Optional conversation history
+        previous_specs: Finished specs of the previous design turn
+        thread_id: Optional session to resume and update
+        profile: Optional file to write a Chrome trace-event timeline of
+            this call to (see utils.profiling)
+
+    Yields:
+        Event dictionaries
+    """
+    with profiled(profile):
+        stored = stored_values(design_graph, thread_id)
+        initial_state = _initial_state(
+            message,
+            history if history is not None else stored.get("history"),
+            previous_specs if previous_specs is not None else stored.get("specs")
+        )
+        result: Dict[str, Any] = dict(initial_state)
+
+        for mode, chunk in design_graph.stream(
+            initial_state,
+            config=thread_config(_stream_config(), thread_id),
+            stream_mode=["custom", "values"]
+        ):
+            if mode == "custom":
+                yield chunk
+            else:
+                result = chunk
+
+        _remember(initial_state, result)
+    yield {"type": "result", "result": result}
+
+
+async def aprocess_stream(
+    design_graph,
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    previous_specs: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    profile: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Async variant of process_stream, built on astream.
+
+    Args:
+        design_graph: Compiled design_specs subgraph
+        message: User message
+        history: Optional conversation history
+        previous_specs: Finished specs of the previous design turn
+        thread_id: Optional session to resume and update
+        profile: Optional file to write a Chrome trace-event timeline of
+            this call to (see utils.profiling)
+
+    Yields:
+        Event dictionaries (see process_stream)
+    """
+    with profiled(profile):
+        stored = await astored_values(design_graph, thread_id)
+        initial_state = _initial_state(
+            message,
+            history if history is not None else stored.get("history"),
+            previous_specs if previous_specs is not None else stored.get("specs")
+        )
+        result: Dict[str, Any] = dict(initial_state)
+
+        async for mode, chunk in design_graph.astream(
+            initial_state,
+            config=thread_config(_stream_config(), thread_id),
+            stream_mode=["custom", "values"]
+        ):
+            if mode == "custom":
+                yield chunk
+            else:
+                result = chunk
+
+        await asyncio.to_thread(_remember, initial_state, result)
+    yield {"type": "result", "result": result}
@@ -0,0 +1,279 @@
+"""Deterministic checks and fixes for the formatting rules of specs/dev/rules.md.
+
+- Terms: first letter capitalized, wherever they appear (no backticks);
+  plain lowercase words spelled like a term are only reported
+- Attributes: **bold**, actions: _italic_, both named in lowercase
+- Otherwise lowercase (member descriptions and term properties start in
+  lowercase); labels such as "Attributes:" carry no bold or italics
+
+``lint`` parses a specification with the spec model, reports every violation
+and, when fixing, rewrites it in place of another LLM call. Inline references
+are classified by the markup the specification itself uses for attributes
+and actions, so both the prompt convention (_attribute_, **action**,
+`term`) and the rules convention are understood.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sublang.utils.profiling import traced
+from sublang.design_specs.spec_model import Spec, SpecStyle, parse_spec, serialize_spec
+
+RULES_HEADERS = ("{n}. {name}", "### {name}")
+
+# Group labels that carry markup, e.g. "**Attributes:**" or "- _Actions_:"
+_MARKED_GROUP = re.compile(r"^\s*(?:-\s+)?(?:\*\*|_)(?i:attributes|actions)\s*:?\s*(?:\*\*|_)\s*:?\s*$")
+# Bullets starting with a marked-up name: a member, or a marked-up property label
+_MARKED_BULLET = re.compile(r"^\s*-\s+(?:\*\*([^*]+)\*\*|_([^_]+)_)\s*:")
+# Backticked, bold and italic spans; multi-word terms and plain words follow
+_SPANS = (
+    r"`(?P<code>[^`\n]+)`"
+    r"|\*\*(?P<bold>[^*\n]+)\*\*"
+    r"|(?<![\w*])_(?P<italic>[^_\s][^_\n]*?)_(?![\w*])"
+)
+_WORD = r"(?P<word>[A-Za-z][\w'-]*)"
+_PLURAL = ("s", "es")
+_INFLECTIONS = ("s", "es", "d", "ed")
+
+
+@dataclass(slots=True)
+class Violation:
+    """A breach of the formatting rules."""
+    rule: str  # e.g. "term-case" or "action-mark"
+    where: str  # e.g. "Terms 2 (record) > attributes > path"
+    detail: str
+
+    def __str__(self) -> str:
+        return f"{self.where}: {self.detail} [{self.rule}]"
+
+
+def _capitalized(name: str) -> str:
+    return name[:1].upper() + name[1:]
+
+
+def _lowercased(text: str) -> str:
+    """Lowercase the first letter, unless the first word is an acronym or CamelCase."""
+    word = text.split(" ", 1)[0]
+    if not word[:1].isupper() or word[1:] != word[1:].lower():
+        return text
+    return text[:1].lower() + text[1:]
+
+
+def _sentence_case(text: str, names: "_Names") -> str:
+    """Lowercase the start of a description, unless it starts with a term."""
+    match = names.token.match(text)
+    if match and match.lastgroup in ("word", "phrase") and names.term(match.group(0)):
+        return text
+    return _lowercased(text)
+
+
+class _Names:
+    """Term, attribute and action names of a specification."""
+
+    def __init__(self, spec: Spec) -> None:
+        self.terms = {term.name.lower(): _capitalized(term.name) for term in spec.terms}
+        self.attributes = {m.name.lower() for t in spec.terms for m in t.attributes}
+        self.actions = {m.name.lower() for t in spec.terms for m in t.actions}
+        self.source_marks = {"attribute": spec.style.attribute_mark, "action": spec.style.action_mark}
+        phrases = sorted((re.escape(name) for name in self.terms if " " in name), key=len, reverse=True)
+        phrase = rf"|(?P<phrase>\b(?:{'|'.join(phrases)})(?:s|es)?\b)" if phrases else ""
+        self.token = re.compile(_SPANS + phrase + "|" + _WORD, re.IGNORECASE)
+
+    def term(self, word: str) -> Optional[Tuple[str, str]]:
+        """Get the (canonical name, plural suffix) of a mentioned term."""
+        key = word.lower()
+        if key in self.terms:
+            return self.terms[key], ""
+        for suffix in _PLURAL:
+            if key.endswith(suffix) and key[:-len(suffix)] in self.terms:
+                return self.terms[key[:-len(suffix)]], word[-len(suffix):]
+        return None
+
+    def role(self, name: str, mark: Optional[str] = None) -> Optional[str]:
+        """Classify a name as "attribute" or "action", tolerating inflections.
+
+        Args:
+            name: Attribute or action name, e.g. "store", "stored" or "recalls"
+            mark: Only consider the role the specification marks up this way
+
+        Returns:
+            "attribute", "action" or None
+        """
+        key = name.lower()
+        candidates = [key] + [key[:-len(suffix)] for suffix in _INFLECTIONS if key.endswith(suffix)]
+        for candidate in candidates:
+            for role, names in (("attribute", self.attributes), ("action", self.actions)):
+                if candidate in names and (mark is None or self.source_marks[role] == mark):
+                    return role
+        return None
+
+    def marked_role(self, mark: str) -> Optional[str]:
+        """Get the role a markup stands for in the specification, if only one."""
+        roles = [role for role, source in self.source_marks.items() if source == mark]
+        return roles[0] if len(roles) == 1 else None
+
+
+_TARGET_MARKS = {"attribute": "**", "action": "_"}
+
+
+def _fix_text(text: str, names: _Names) -> Tuple[str, List[str]]:
+    """Fix term capitalization and inline member markup in free text.
+
+    Only marked-up references are rewritten. Plain words spelled like a term
+    may be ordinary prose ("code changes"), so they are reported as
+    "bare-term" but left as they are.
+
+    Returns:
+        Tuple of (fixed text, rule of each change or report)
+    """
+    rules: List[str] = []
+    parts: List[str] = []
+    position = 0
+    for match in names.token.finditer(text):
+        parts.append(text[position:match.start()])
+        position = match.end()
+        kind = match.lastgroup
+        inner = match.group(kind)
+        replacement = match.group(0)
+        if kind in ("word", "phrase"):
+            if inner[:1].islower() and names.term(inner):
+                rules.append("bare-term")
+        else:
+            mark = {"code": "`", "bold": "**", "italic": "_"}[kind]
+            name = inner.strip()
+            # The specification's own markup tells members apart from terms
+            # of the same name (an action "link" and a term `link`)
+            role = names.role(name, mark)
+            found = names.term(name)
+            if role is None and found:
+                # Terms are capitalized, not quoted or emphasized
+                replacement = found[0] + found[1]
+                rules.append("term-reference")
+            else:
+                # Unknown names (e.g. **removed**) take the role the
+                # specification uses their markup for
+                role = role or names.role(name) or names.marked_role(mark)
+                if role is not None and mark != _TARGET_MARKS[role]:
+                    replacement = f"{_TARGET_MARKS[role]}{name}{_TARGET_MARKS[role]}"
+                    rules.append("inline-mark")
+        parts.append(replacement)
+    parts.append(text[position:])
+    return "".join(parts), rules
+
+
+# Rules only reported, never fixed (they may be false positives)
+ADVISORY_RULES = ("bare-term",)
+
+_RULE_DETAILS = {
+    "term-reference": "term references not capitalized",
+    "inline-mark": "members with the wrong markup",
+    "bare-term": "words spelled like a term, not capitalized (not fixed)",
+}
+
+
+def _check_text(text: str, names: _Names, where: str, violations: List[Violation]) -> str:
+    fixed, rules = _fix_text(text, names)
+    for rule in sorted(set(rules)):
+        violations.append(Violation(rule, where, f"{rules.count(rule)} {_RULE_DETAILS[rule]}"))
+    return fixed
+
+
+def check_spec(spec: Spec, markdown: str = "") -> List[Violation]:
+    """Check a parsed specification, fixing it in place.
+
+    Args:
+        spec: Specification parsed with parse_spec (modified in place)
+        markdown: The text it was parsed from, for the checks of markup the
+            parser drops (e.g. bold labels)
+
+    Returns:
+        Violations found, in document order
+    """
+    violations: List[Violation] = []
+    names = _Names(spec)
+    style: SpecStyle = spec.style
+
+    in_terms = False
+    for line in markdown.splitlines():
+        if line.startswith("## "):
+            in_terms = line[3:].strip().lower() == "terms"
+            continue
+        bullet = _MARKED_BULLET.match(line) if in_terms else None
+        if (bullet and names.role(bullet.group(1) or bullet.group(2)) is None
+                or in_terms and _MARKED_GROUP.match(line)):
+            violations.append(Violation("label-markup", "Terms", f"marked-up label {line.strip()!r}"))
+
+    if spec.terms and style.term_header not in RULES_HEADERS:
+        violations.append(Violation(
+            "term-header", "Terms", f"term headers written as {style.term_header.format(n=1, name='…')!r}"
+        ))
+        style.term_header = RULES_HEADERS[0]
+    for role, mark in (("attribute", style.attribute_mark), ("action", style.action_mark)):
+        target = _TARGET_MARKS[role]
+        members = [m for t in spec.terms for m in (t.attributes if role == "attribute" else t.actions)]
+        if members and mark != target:
+            violations.append(Violation(
+                f"{role}-mark", "Terms", f"{role}s written as {mark or ''}name{mark or ''}, not {target}name{target}"
+            ))
+        if role == "attribute":
+            style.attribute_mark = target
+        else:
+            style.action_mark = target
+
+    for n, term in enumerate(spec.terms, start=1):
+        where = f"Terms {n} ({term.name})"
+        if term.name[:1].islower():
+            violations.append(Violation("term-case", where, f"term {term.name!r} not capitalized"))
+            term.name = _capitalized(term.name)
+        for key, value in term.fields.items():
+            if value != _sentence_case(value, names):
+                violations.append(Violation("description-case", f"{where} > {key}", "starts in uppercase"))
+                value = _sentence_case(value, names)
+            term.fields[key] = _check_text(value, names, f"{where} > {key}", violations)
+        for group, members in (("attributes", term.attributes), ("actions", term.actions)):
+            for member in members:
+                path = f"{where} > {group} > {member.name}"
+                if member.name != _lowercased(member.name):
+                    violations.append(Violation("member-case", path, f"{member.name!r} not lowercase"))
+                    member.name = _lowercased(member.name)
+                if member.description != _sentence_case(member.description, names):
+                    violations.append(Violation("description-case", path, "starts in uppercase"))
+                    member.description = _sentence_case(member.description, names)
+                member.description = _check_text(member.description, names, path, violations)
+
+    for section, items in (("Features", spec.features), ("Constraints", spec.constraints)):
+        for n, item in enumerate(items, start=1):
+            where = f"{section} {n}" + (f" ({item.title})" if item.title else "")
+            item.title = _check_text(item.title, names, where, violations)
+            item.description = _check_text(item.description, names, where, violations)
+    spec.invalidate()
+    return violations
+
+
+@traced("lint")
+def lint(markdown: str, fix: bool = True) -> Tuple[str, List[Violation]]:
+    """Check a specification against the formatting rules.
+
+    Args:
+        markdown: Specification text
+        fix: Whether to return the text rewritten to follow the rules
+
+    Returns:
+        Tuple of (specification text, violations); the text is returned
+        unchanged when it has no terms, no violations or fix is False
+    """
+    spec = parse_spec(markdown)
+    if not spec.terms:
+        return markdown, []
+    violations = check_spec(spec, markdown)
+    if not fix or not violations:
+        return markdown, violations
+    return serialize_spec(spec), violations
+
+
+def summarize(violations: List[Violation]) -> str:
+    """Count violations per rule, e.g. "term-reference 12, action-mark 1"."""
+    counts: Dict[str, int] = {}
+    for violation in violations:
+        counts[violation.rule] = counts.get(violation.rule, 0) + 1
+    return ", ".join(f"{rule} {count}" for rule, count in counts.items())
@@ -1,8 +1,21 @@
 """Design specification nodes."""
 
-from .extend_scenarios import extend_scenarios
-from .extract_terms import extract_terms
-from .add_features import add_features
-from .add_constraints import add_constraints
+from .extend_scenarios import extend_scenarios, aextend_scenarios
+from .extract_terms import extract_terms, aextract_terms
+from .add_features import add_features, aadd_features
+from .add_constraints import add_constraints, aadd_constraints
+from .refine_specs import refine_specs, arefine_specs
+from .shard_specs import shard_specs, ashard_specs
+from .reuse_specs import reuse_specs, areuse_specs
+from .lint_specs import lint_specs, alint_specs
 
-__all__ = ["extend_scenarios", "extract_terms", "add_features", "add_constraints"]
\ No newline at end of file
+__all__ = [
+    "extend_scenarios", "aextend_scenarios",
+    "extract_terms", "aextract_terms",
+    "add_features", "aadd_features",
+    "add_constraints", "aadd_constraints",
+    "refine_specs", "arefine_specs",
+    "shard_specs", "ashard_specs",
+    "reuse_specs", "areuse_specs",
+    "lint_specs", "alint_specs",
+]
\ No newline at end of file
@@ -1,78 +1,136 @@
 """Add constraints to design specifications based on terms and features."""
 
-from typing import Any, Dict
-import litellm
+from typing import Any, Dict, List
 from pathlib import Path
-from sublang.utils import config, PromptLoader
-from sublang.design_specs.utils import combine_prompts, parse_markdown_code_block
+from sublang.utils import config, llm, get_prompt_loader
+from sublang.utils.streaming import emit_stage, token_callback
+from sublang.utils.profiling import traced
+from sublang.design_specs.structured import enabled, instructions, model_params, stage_output
+from sublang.design_specs.utils import build_stage_messages
 
-# Initialize prompt loader for design_specs subgraph
-prompt_loader = PromptLoader(str(Path(__file__).parent.parent / "prompts"))
+# Shared prompt loader for design_specs subgraph
+prompt_loader = get_prompt_loader(str(Path(__file__).parent.parent / "prompts"))
 
 
-def add_constraints(state) -> Dict[str, Any]:
-    """Add constraints based on terms and features, adjusting them if necessary.
+@traced("build_messages")
+def _build_messages(state) -> List[Dict[str, str]]:
+    """Build the LLM messages for constraint generation.
 
     Args:
         state: Current chat state
 
     Returns:
-        Dictionary with complete design response including constraints
+        Messages to send to the LLM
     """
     message = state["message"]
     specs = state.get("specs", "")  # Contains terms and features from previous steps
-    history = state.get("history", [])
 
     # Get the overall prompt and constraints addition prompt
     overall_prompt = prompt_loader.get_prompt("OVERALL")
-    add_constraints_prompt = prompt_loader.get_prompt("ADD_CONSTRAINTS")
-    system_prompt = combine_prompts(overall_prompt, add_constraints_prompt)
+    add_constraints_prompt = instructions(prompt_loader.get_prompt("ADD_CONSTRAINTS"), "add_constraints")
 
-    try:
-        # Create messages for the LLM - no history needed for internal processing
-        # Note: specs already contains terms and features from previous steps
-        user_message = f"Original description:\n{message}\n\n---\n\nTerms and Features from previous steps:\n{specs}"
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
+    # Create messages for the LLM - no history needed for internal processing
+    # The overall prompt and description form the prefix shared across stages
+    # Note: specs already contains terms and features from previous steps
+    return build_stage_messages(
+        overall_prompt,
+        add_constraints_prompt,
+        message,
+        f"Terms and Features from previous steps:\n{specs}",
+        model=config.stage_model("add_constraints")
+    )
+
+
+def _on_token():
+    """Get the token callback; structured answers are JSON, not worth streaming."""
+    return None if enabled("add_constraints") else token_callback("add_constraints")
+
+
+@traced("build_result")
+def _build_result(state, response_content: str) -> Dict[str, Any]:
+    """Turn the LLM response into a state update."""
+    message = state["message"]
+    history = state.get("history", [])
+
+    # Take the structured answer rendered to markdown, or the last markdown
+    # code block (the full response if there is neither), applied to the
+    # previous specs when the stage answers with changes only
+    final_output = stage_output(
+        response_content, "add_constraints", final=True, previous=state.get("specs", "")
+    )
+
+    return {
+        "response": final_output,
+        "specs": final_output,  # Finished specs, kept for refining follow-ups
+        "intent": "DESIGN_SPECS",
+        # Only the final step adds to history - the complete conversation
+        "history": history + [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": final_output}
         ]
+    }
 
-        # Generate response using LiteLLM
-        response = litellm.completion(
-            messages=messages,
-            **config.get_model_params()
-        )
 
-        response_content = response.choices[0].message.content
+def _error_result(state, e: Exception) -> Dict[str, Any]:
+    """Build the state update used when the LLM call fails."""
+    message = state["message"]
+    history = state.get("history", [])
+
+    print(f"Error adding constraints: {e}")
+    error_msg = (
+        "I apologize, but I encountered an error while adding "
+        "constraints to your design. Please try again."
+    )
+    return {
+        "response": error_msg,
+        "specs": state.get("previous_specs", ""),  # Keep the last good specs
+        "intent": "DESIGN_SPECS",
+        "error": f"add_constraints: {e}",
+        # Only the final step adds to history - even for errors
+        "history": history + [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": error_msg}
+        ]
+    }
 
-        # Parse the markdown code block from the response
-        parsed_constraints = parse_markdown_code_block(response_content)
 
-        # Use parsed constraints if found, otherwise use the full response
-        final_output = parsed_constraints if parsed_constraints else response_content
+def add_constraints(state) -> Dict[str, Any]:
+    """Add constraints based on terms and features, adjusting them if necessary.
 
-        return {
-            "response": final_output,
-            "intent": "DESIGN_SPECS",
-            # Only the final step adds to history - the complete conversation
-            "history": history + [
-                {"role": "user", "content": message},
-                {"role": "assistant", "content": final_output}
-            ]
-        }
+    Args:
+        state: Current chat state
 
+    Returns:
+        Dictionary with complete design response including constraints
+    """
+    emit_stage("add_constraints")
+    try:
+        response_content = llm.completion(
+            _build_messages(state),
+            on_token=_on_token(),
+            **model_params("add_constraints")
+        )
+        return _build_result(state, response_content)
     except Exception as e:
-        print(f"Error adding constraints: {e}")
-        error_msg = (
-            "I apologize, but I encountered an error while adding "
-            "constraints to your design. Please try again."
+        return _error_result(state, e)
+
+
+async def aadd_constraints(state) -> Dict[str, Any]:
+    """Async variant of add_constraints.
+
+    Args:
+        state: Current chat state
+
+    Returns:
+        Dictionary with complete design response including constraints
+    """
+    emit_stage("add_constraints")
+    try:
+        response_content = await llm.acompletion(
+            _build_messages(state),
+            on_token=_on_token(),
+            **model_params("add_constraints")
         )
-        return {
-            "response": error_msg,
-            "intent": "DESIGN_SPECS",
-            # Only the final step adds to history - even for errors
-            "history": history + [
-                {"role": "user", "content": message},
-                {"role": "assistant", "content": error_msg}
-            ]
-        }
+        return _build_result(state, response_content)
+    except Exception as e:
+        return _error_result(state, e)
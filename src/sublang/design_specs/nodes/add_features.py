@@ -1,69 +1,104 @@
 """Add features to design specifications based on terms and descriptions."""
 
-from typing import Any, Dict
-import litellm
+from typing import Any, Dict, List
 from pathlib import Path
-from sublang.utils import config, PromptLoader
-from sublang.design_specs.utils import combine_prompts, parse_markdown_code_block
+from sublang.utils import config, llm, get_prompt_loader
+from sublang.utils.streaming import emit_stage
+from sublang.utils.profiling import traced
+from sublang.design_specs.structured import instructions, model_params, stage_output
+from sublang.design_specs.utils import build_stage_messages
 
-# Initialize prompt loader for design_specs subgraph
-prompt_loader = PromptLoader(str(Path(__file__).parent.parent / "prompts"))
+# Shared prompt loader for design_specs subgraph
+prompt_loader = get_prompt_loader(str(Path(__file__).parent.parent / "prompts"))
 
 
-def add_features(state) -> Dict[str, Any]:
-    """Add features based on description and terms, adjusting terms if necessary.
+@traced("build_messages")
+def _build_messages(state) -> List[Dict[str, str]]:
+    """Build the LLM messages for feature generation.
 
     Args:
         state: Current chat state
 
     Returns:
-        Dictionary with features and potentially adjusted terms
+        Messages to send to the LLM
     """
     message = state["message"]
     specs = state.get("specs", "")  # Contains terms from previous step
-    history = state.get("history", [])
 
     # Get the overall prompt and features addition prompt
     overall_prompt = prompt_loader.get_prompt("OVERALL")
-    add_features_prompt = prompt_loader.get_prompt("ADD_FEATURES")
-    system_prompt = combine_prompts(overall_prompt, add_features_prompt)
+    add_features_prompt = instructions(prompt_loader.get_prompt("ADD_FEATURES"), "add_features")
 
-    try:
-        # Create messages for the LLM - no history needed for internal processing
-        user_message = f"Original description:\n{message}\n\n---\n\nPreviously extracted terms:\n{specs}"
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
-        ]
+    # Create messages for the LLM - no history needed for internal processing
+    # The overall prompt and description form the prefix shared across stages
+    return build_stage_messages(
+        overall_prompt,
+        add_features_prompt,
+        message,
+        f"Previously extracted terms:\n{specs}",
+        model=config.stage_model("add_features")
+    )
+
+
+@traced("build_result")
+def _build_result(state, response_content: str) -> Dict[str, Any]:
+    """Turn the LLM response into a state update."""
+    # Take the structured answer or the last markdown code block (the full
+    # response if there is neither), applied to the previous specs when the
+    # stage answers with changes only
+    features_output = stage_output(response_content, "add_features", previous=state.get("specs", ""))
+
+    return {
+        "specs": features_output,  # Now contains both terms and features
+        "intent": "DESIGN_SPECS",
+        "history": state.get("history", [])  # Don't add to history - this is internal processing
+    }
+
+
+def _error_result(state, e: Exception) -> Dict[str, Any]:
+    """Build the state update used when the LLM call fails."""
+    print(f"Error adding features: {e}")
+    error_msg = (
+        "I apologize, but I encountered an error while adding "
+        "features to your design. Please try again."
+    )
+    return {
+        "specs": error_msg,
+        "intent": "DESIGN_SPECS",
+        "error": f"add_features: {e}",
+        "history": state.get("history", [])  # Don't add to history - this is internal processing
+    }
+
+
+def add_features(state) -> Dict[str, Any]:
+    """Add features based on description and terms, adjusting terms if necessary.
 
-        # Generate response using LiteLLM
-        response = litellm.completion(
-            messages=messages,
-            **config.get_model_params()
-        )
+    Args:
+        state: Current chat state
 
-        response_content = response.choices[0].message.content
+    Returns:
+        Dictionary with features and potentially adjusted terms
+    """
+    emit_stage("add_features")
+    try:
+        response_content = llm.completion(_build_messages(state), **model_params("add_features"))
+        return _build_result(state, response_content)
+    except Exception as e:
+        return _error_result(state, e)
 
-        # Parse the markdown code block from the response
-        parsed_features = parse_markdown_code_block(response_content)
 
-        # Use parsed features if found, otherwise use the full response
-        features_output = parsed_features if parsed_features else response_content
+async def aadd_features(state) -> Dict[str, Any]:
+    """Async variant of add_features.
 
-        return {
-            "specs": features_output,  # Now contains both terms and features
-            "intent": "DESIGN_SPECS",
-            "history": history  # Don't add to history - this is internal processing
-        }
+    Args:
+        state: Current chat state
 
+    Returns:
+        Dictionary with features and potentially adjusted terms
+    """
+    emit_stage("add_features")
+    try:
+        response_content = await llm.acompletion(_build_messages(state), **model_params("add_features"))
+        return _build_result(state, response_content)
     except Exception as e:
-        print(f"Error adding features: {e}")
-        error_msg = (
-            "I apologize, but I encountered an error while adding "
-            "features to your design. Please try again."
-        )
-        return {
-            "specs": error_msg,
-            "intent": "DESIGN_SPECS",
-            "history": history  # Don't add to history - this is internal processing
-        }
+        return _error_result(state, e)
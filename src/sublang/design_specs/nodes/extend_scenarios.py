@@ -1,76 +1,239 @@
 """Extend use scenarios from user requirements for design specifications."""
 
-from typing import Any, Dict
-import litellm
+import asyncio
+import contextvars
+import hashlib
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 from pathlib import Path
-from sublang.utils import config, PromptLoader
+from sublang.utils import config, llm, metrics, get_prompt_loader
+from sublang.utils.context import afit_history, fit_history
+from sublang.utils.streaming import emit_stage
+from sublang.utils.profiling import traced
 from sublang.design_specs.utils import combine_prompts, parse_markdown_code_block
 
-# Initialize prompt loader for design_specs subgraph
-prompt_loader = PromptLoader(str(Path(__file__).parent.parent / "prompts"))
+# Shared prompt loader for design_specs subgraph
+prompt_loader = get_prompt_loader(str(Path(__file__).parent.parent / "prompts"))
 
+# Speculative runs started before routing (see speculate), keyed by the
+# message and history they extend; a _ThreadSpeculation, or an asyncio Task
+_speculations: Dict[str, Any] = {}
+_speculations_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
 
-def extend_scenarios(state) -> Dict[str, Any]:
-    """Extend user description by adding comprehensive use scenarios.
+
+@traced("build_messages")
+def _build_messages(state, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Build the LLM messages for scenario extension.
 
     Args:
         state: Current chat state
+        history: Conversation history fitted to the token budget
 
     Returns:
-        Dictionary with extended scenarios and updated state
+        Messages to send to the LLM
     """
     message = state["message"]
-    history = state.get("history", [])
 
     # Get the overall prompt and scenario extension prompt
     overall_prompt = prompt_loader.get_prompt("OVERALL")
     extend_scenarios_prompt = prompt_loader.get_prompt("EXTEND_SCENARIOS")
-    system_prompt = combine_prompts(overall_prompt, extend_scenarios_prompt)
 
-    try:
-        # Create messages for the LLM
-        messages = [
-            {"role": "system", "content": system_prompt},
-        ]
+    # Create messages for the LLM; the overall prompt alone is the system
+    # message shared (and cacheable) across all design stages
+    messages = [
+        {"role": "system", "content": overall_prompt},
+    ]
+
+    # Add conversation history (recent turns within the token budget, older
+    # ones as a rolling summary); only the first steps get the history
+    messages.extend(history)
+
+    # Add step instructions followed by the current user message
+    messages.append({"role": "user", "content": combine_prompts(extend_scenarios_prompt, message)})
+    return llm.mark_cache_prefix(messages, 1, config.stage_model("extend_scenarios"))
+
+
+@traced("build_result")
+def _build_result(state, response_content: str) -> Dict[str, Any]:
+    """Turn the LLM response into a state update."""
+    # Parse the markdown code block from the response
+    parsed_scenarios = parse_markdown_code_block(response_content)
+
+    # Use parsed scenarios if found, otherwise use the full response
+    scenarios_output = parsed_scenarios if parsed_scenarios else response_content
+
+    return {
+        "message": scenarios_output,  # Replace original message with extended scenarios
+        "intent": "DESIGN_SPECS",
+        "history": state.get("history", [])  # Don't add to history - this is internal processing
+    }
+
+
+def _error_result(state, e: Exception) -> Dict[str, Any]:
+    """Build the state update used when the LLM call fails."""
+    print(f"Error extending scenarios: {e}")
+    # On error, keep the original message
+    return {
+        "message": state["message"],
+        "intent": "DESIGN_SPECS",
+        "history": state.get("history", [])  # Don't add to history - this is internal processing
+    }
+
+
+def _complete(state, on_token: Optional[llm.TokenCallback] = None) -> str:
+    """Make the scenario extension LLM call."""
+    history = fit_history(state.get("history"), model=config.stage_model("extend_scenarios"))
+    messages = _build_messages(state, history)
+    return llm.completion(messages, on_token=on_token, **config.get_model_params("extend_scenarios"))
+
+
+async def _acomplete(state) -> str:
+    """Async variant of _complete."""
+    history = await afit_history(state.get("history"), model=config.stage_model("extend_scenarios"))
+    messages = _build_messages(state, history)
+    return await llm.acompletion(messages, **config.get_model_params("extend_scenarios"))
+
+
+def _speculation_key(state) -> str:
+    payload = json.dumps([state["message"], state.get("history") or []], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _SpeculationCancelled(Exception):
+    """Raised inside a speculative run in a worker thread to stop it."""
+
+
+class _ThreadSpeculation:
+    """A speculative run in a worker thread.
+
+    A thread cannot be interrupted, so the call is streamed and checks for
+    cancellation at every token.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, state) -> None:
+        self.cancelled = threading.Event()
+        self.future: Future = executor.submit(contextvars.copy_context().run, self._run, state)
+
+    def _check(self, text: str) -> None:
+        if self.cancelled.is_set():
+            raise _SpeculationCancelled("speculative scenario extension cancelled")
+
+    def _run(self, state) -> str:
+        with metrics.attributed("extend_scenarios"):
+            return _complete(state, on_token=self._check)
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        self.future.cancel()
+
+    def result(self) -> str:
+        return self.future.result()
+
 
-        # Add conversation history (last 4 messages = 2 rounds of talk)
-        # Only the first step gets the conversation history
-        if history:
-            for entry in history[-4:]:  # Keep last 4 messages for context
-                messages.append(entry)
+async def _aspeculative_complete(state) -> str:
+    with metrics.attributed("extend_scenarios"):
+        return await _acomplete(state)
 
-        # Add current user message
-        messages.append({"role": "user", "content": message})
 
-        # Generate response using LiteLLM
-        response = litellm.completion(
-            messages=messages,
-            **config.get_model_params()
-        )
+def speculate(state) -> None:
+    """Start the scenario extension call in the background, ahead of routing.
 
-        response_content = response.choices[0].message.content
+    A later extend_scenarios run on the same message and history uses its
+    result instead of calling the LLM again; discard_speculation stops it.
 
-        # Parse the markdown code block from the response
-        parsed_scenarios = parse_markdown_code_block(response_content)
+    Args:
+        state: Chat state holding the message and history
+    """
+    global _executor
+    key = _speculation_key(state)
+    with _speculations_lock:
+        if key in _speculations:
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sublang-speculate")
+        _speculations[key] = _ThreadSpeculation(_executor, state)
+
+
+def aspeculate(state) -> None:
+    """Async variant of speculate; must be called inside the running event loop."""
+    key = _speculation_key(state)
+    with _speculations_lock:
+        if key not in _speculations:
+            _speculations[key] = asyncio.ensure_future(_aspeculative_complete(state))
+
+
+def _take_speculation(state) -> Optional[Any]:
+    if not _speculations:
+        return None
+    with _speculations_lock:
+        return _speculations.pop(_speculation_key(state), None)
+
+
+def discard_speculation(state) -> None:
+    """Cancel a speculative run (a thread stops at its next streamed token).
 
-        # Use parsed scenarios if found, otherwise use the full response
-        scenarios_output = parsed_scenarios if parsed_scenarios else response_content
+    Args:
+        state: Chat state the run was started for
+    """
+    speculation = _take_speculation(state)
+    if speculation is not None:
+        speculation.cancel()
+
+
+def extend_scenarios(state) -> Dict[str, Any]:
+    """Extend user description by adding comprehensive use scenarios.
 
-        return {
-            "message": scenarios_output,  # Replace original message with extended scenarios
-            "intent": "DESIGN_SPECS",
-            "history": history  # Don't add to history - this is internal processing
-        }
+    Args:
+        state: Current chat state
 
+    Returns:
+        Dictionary with extended scenarios and updated state
+    """
+    emit_stage("extend_scenarios")
+    speculation = _take_speculation(state)
+    try:
+        response_content = None
+        if isinstance(speculation, _ThreadSpeculation):
+            try:
+                response_content = speculation.result()
+            except Exception as e:
+                print(f"Speculative scenario extension failed, retrying: {e}")
+        elif speculation is not None:
+            # An asyncio task cannot be awaited here (and may belong to a loop
+            # in another thread); cancel it so it makes no duplicate call
+            speculation.get_loop().call_soon_threadsafe(speculation.cancel)
+        if response_content is None:
+            response_content = _complete(state)
+        return _build_result(state, response_content)
+    except Exception as e:
+        return _error_result(state, e)
+
+
+async def aextend_scenarios(state) -> Dict[str, Any]:
+    """Async variant of extend_scenarios.
+
+    Args:
+        state: Current chat state
+
+    Returns:
+        Dictionary with extended scenarios and updated state
+    """
+    emit_stage("extend_scenarios")
+    speculation = _take_speculation(state)
+    try:
+        response_content = None
+        if speculation is not None:
+            try:
+                if isinstance(speculation, _ThreadSpeculation):
+                    speculation = asyncio.wrap_future(speculation.future)
+                response_content = await speculation
+            except Exception as e:
+                print(f"Speculative scenario extension failed, retrying: {e}")
+        if response_content is None:
+            response_content = await _acomplete(state)
+        return _build_result(state, response_content)
     except Exception as e:
-        print(f"Error extending scenarios: {e}")
-        error_msg = (
-            "I apologize, but I encountered an error while extending "
-            "use scenarios from your description. Using original description."
-        )
-        # On error, keep the original message
-        return {
-            "message": message,
-            "intent": "DESIGN_SPECS",
-            "history": history  # Don't add to history - this is internal processing
-        }
\ No newline at end of file
+        return _error_result(state, e)
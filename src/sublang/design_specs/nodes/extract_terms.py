@@ -1,75 +1,108 @@
 """Extract terms from user requirements for design specifications."""
 
-from typing import Any, Dict
-import litellm
+from typing import Any, Dict, List, Optional
 from pathlib import Path
-from sublang.utils import config, PromptLoader
-from sublang.design_specs.utils import combine_prompts, parse_markdown_code_block
+from sublang.utils import config, llm, get_prompt_loader
+from sublang.utils.context import afit_history, fit_history
+from sublang.utils.streaming import emit_stage
+from sublang.utils.profiling import traced
+from sublang.design_specs.structured import instructions, model_params, stage_output
+from sublang.design_specs.utils import build_stage_messages
 
-# Initialize prompt loader for design_specs subgraph
-prompt_loader = PromptLoader(str(Path(__file__).parent.parent / "prompts"))
+# Shared prompt loader for design_specs subgraph
+prompt_loader = get_prompt_loader(str(Path(__file__).parent.parent / "prompts"))
 
 
-def extract_terms(state) -> Dict[str, Any]:
-    """Extract key terms from user-provided descriptions.
+@traced("build_messages")
+def _build_messages(state, history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+    """Build the LLM messages for term extraction.
 
     Args:
         state: Current chat state
+        history: Conversation history fitted to the token budget, if any
 
     Returns:
-        Dictionary with extracted terms and updated history
+        Messages to send to the LLM
     """
     message = state["message"]
-    history = state.get("history", [])
 
     # Get the overall prompt and terms extraction prompt
     overall_prompt = prompt_loader.get_prompt("OVERALL")
-    extract_terms_prompt = prompt_loader.get_prompt("EXTRACT_TERMS")
-    system_prompt = combine_prompts(overall_prompt, extract_terms_prompt)
-
-    try:
-        # Create messages for the LLM
-        messages = [
-            {"role": "system", "content": system_prompt},
-        ]
+    extract_terms_prompt = instructions(prompt_loader.get_prompt("EXTRACT_TERMS"), "extract_terms")
+
+    # Shared prefix (overall prompt + description), then conversation history
+    # (recent turns within the token budget) and the step instructions
+    return build_stage_messages(
+        overall_prompt,
+        extract_terms_prompt,
+        message,
+        history=history,
+        model=config.stage_model("extract_terms")
+    )
+
+
+@traced("build_result")
+def _build_result(state, response_content: str) -> Dict[str, Any]:
+    """Turn the LLM response into a state update."""
+    # Take the structured answer or the last markdown code block (the full
+    # response if there is neither)
+    terms_output = stage_output(response_content, "extract_terms")
+
+    return {
+        "specs": terms_output,
+        "intent": "DESIGN_SPECS",
+        "history": state.get("history", [])  # Don't add to history - this is internal processing
+    }
+
+
+def _error_result(state, e: Exception) -> Dict[str, Any]:
+    """Build the state update used when the LLM call fails."""
+    print(f"Error extracting terms: {e}")
+    error_msg = (
+        "I apologize, but I encountered an error while extracting "
+        "terms from your description. Please try again."
+    )
+    return {
+        "specs": error_msg,
+        "intent": "DESIGN_SPECS",
+        "error": f"extract_terms: {e}",
+        "history": state.get("history", [])  # Don't add to history - this is internal processing
+    }
 
-        # Add conversation history (last 4 messages = 2 rounds of talk)
-        # Only the first step gets the conversation history
-        if history:
-            for entry in history[-4:]:  # Keep last 4 messages for context
-                messages.append(entry)
 
-        # Add current user message
-        messages.append({"role": "user", "content": message})
+def extract_terms(state) -> Dict[str, Any]:
+    """Extract key terms from user-provided descriptions.
 
-        # Generate response using LiteLLM
-        response = litellm.completion(
-            messages=messages,
-            **config.get_model_params()
-        )
+    Args:
+        state: Current chat state
 
-        response_content = response.choices[0].message.content
+    Returns:
+        Dictionary with extracted terms and updated history
+    """
+    emit_stage("extract_terms")
+    try:
+        history = fit_history(state.get("history"), model=config.stage_model("extract_terms"))
+        messages = _build_messages(state, history)
+        response_content = llm.completion(messages, **model_params("extract_terms"))
+        return _build_result(state, response_content)
+    except Exception as e:
+        return _error_result(state, e)
 
-        # Parse the markdown code block from the response
-        parsed_terms = parse_markdown_code_block(response_content)
 
-        # Use parsed terms if found, otherwise use the full response
-        terms_output = parsed_terms if parsed_terms else response_content
+async def aextract_terms(state) -> Dict[str, Any]:
+    """Async variant of extract_terms.
 
-        return {
-            "specs": terms_output,
-            "intent": "DESIGN_SPECS",
-            "history": history  # Don't add to history - this is internal processing
-        }
+    Args:
+        state: Current chat state
 
+    Returns:
+        Dictionary with extracted terms and updated history
+    """
+    emit_stage("extract_terms")
+    try:
+        history = await afit_history(state.get("history"), model=config.stage_model("extract_terms"))
+        messages = _build_messages(state, history)
+        response_content = await llm.acompletion(messages, **model_params("extract_terms"))
+        return _build_result(state, response_content)
     except Exception as e:
-        print(f"Error extracting terms: {e}")
-        error_msg = (
-            "I apologize, but I encountered an error while extracting "
-            "terms from your description. Please try again."
-        )
-        return {
-            "specs": error_msg,
-            "intent": "DESIGN_SPECS",
-            "history": history  # Don't add to history - this is internal processing
-        }
+        return _error_result(state, e)
@@ -0,0 +1,50 @@
+"""Check finished specifications against the formatting rules, fixing them locally."""
+
+from typing import Any, Dict
+from sublang.utils import config, metrics
+from sublang.utils.streaming import emit_stage
+from sublang.design_specs.lint import lint, summarize
+
+
+def lint_specs(state) -> Dict[str, Any]:
+    """Report, and with SPEC_LINT=fix rewrite, formatting rule violations.
+
+    Failed runs (whose response is an apology rather than the specs) are
+    left alone.
+
+    Args:
+        state: Current design_specs state
+
+    Returns:
+        Dictionary with the fixed specs, history and a violation summary in
+        the context, or nothing to update
+    """
+    specs = state.get("specs", "")
+    if not specs or state.get("response") != specs:
+        return {}
+    emit_stage("lint_specs")
+    fixed, violations = lint(specs, fix=config.spec_lint == "fix")
+    if not violations:
+        return {}
+    metrics.record(lint_violations=len(violations))
+    update: Dict[str, Any] = {
+        "context": {**(state.get("context") or {}), "spec_lint": summarize(violations)}
+    }
+    if fixed != specs:
+        history = list(state.get("history", []))
+        if history and history[-1].get("role") == "assistant":
+            history[-1] = {**history[-1], "content": fixed}
+        update.update({"response": fixed, "specs": fixed, "history": history})
+    return update
+
+
+async def alint_specs(state) -> Dict[str, Any]:
+    """Async variant of lint_specs (local work only).
+
+    Args:
+        state: Current design_specs state
+
+    Returns:
+        State update (see lint_specs)
+    """
+    return lint_specs(state)
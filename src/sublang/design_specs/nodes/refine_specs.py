@@ -0,0 +1,125 @@
+"""Refine existing design specifications according to a follow-up request."""
+
+from typing import Any, Dict, List
+from pathlib import Path
+from sublang.utils import config, llm, get_prompt_loader
+from sublang.utils.streaming import emit_stage, token_callback
+from sublang.utils.profiling import traced
+from sublang.design_specs.utils import combine_prompts, merge_sections, parse_markdown_code_block
+
+# Shared prompt loader for design_specs subgraph
+prompt_loader = get_prompt_loader(str(Path(__file__).parent.parent / "prompts"))
+
+
+@traced("build_messages")
+def _build_messages(state) -> List[Dict[str, str]]:
+    """Build the LLM messages for refining the previous specifications.
+
+    Args:
+        state: Current chat state
+
+    Returns:
+        Messages to send to the LLM
+    """
+    message = state["message"]
+    previous_specs = state.get("previous_specs", "")
+
+    # Get the overall prompt and refinement prompt
+    overall_prompt = prompt_loader.get_prompt("OVERALL")
+    refine_specs_prompt = prompt_loader.get_prompt("REFINE_SPECS")
+
+    # One targeted call: current specs plus the change request
+    stage_input = f"Current specifications:\n```\n{previous_specs}\n```\n\n---\n\nChange request:\n{message}"
+    messages = [
+        {"role": "system", "content": overall_prompt},
+        {"role": "user", "content": combine_prompts(refine_specs_prompt, stage_input)},
+    ]
+    return llm.mark_cache_prefix(messages, 1, config.stage_model("refine_specs"))
+
+
+@traced("build_result")
+def _build_result(state, response_content: str) -> Dict[str, Any]:
+    """Merge the updated sections into the previous specifications."""
+    message = state["message"]
+    history = state.get("history", [])
+
+    # Parse the markdown code block from the response
+    parsed_updates = parse_markdown_code_block(response_content)
+
+    # Use parsed updates if found, otherwise use the full response
+    updates = parsed_updates if parsed_updates else response_content
+    final_output = merge_sections(state.get("previous_specs", ""), updates)
+
+    return {
+        "response": final_output,
+        "specs": final_output,
+        "intent": "DESIGN_SPECS",
+        "history": history + [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": final_output}
+        ]
+    }
+
+
+def _error_result(state, e: Exception) -> Dict[str, Any]:
+    """Build the state update used when the LLM call fails."""
+    message = state["message"]
+    history = state.get("history", [])
+
+    print(f"Error refining specs: {e}")
+    error_msg = (
+        "I apologize, but I encountered an error while refining "
+        "your design. Please try again."
+    )
+    return {
+        "response": error_msg,
+        "specs": state.get("previous_specs", ""),  # Keep the last good specs
+        "intent": "DESIGN_SPECS",
+        "error": f"refine_specs: {e}",
+        "history": history + [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": error_msg}
+        ]
+    }
+
+
+def refine_specs(state) -> Dict[str, Any]:
+    """Apply a follow-up change request to the previous turn's specifications.
+
+    Args:
+        state: Current chat state
+
+    Returns:
+        Dictionary with the refined specifications and updated history
+    """
+    emit_stage("refine_specs")
+    try:
+        response_content = llm.completion(
+            _build_messages(state),
+            on_token=token_callback("refine_specs"),
+            **config.get_model_params("refine_specs")
+        )
+        return _build_result(state, response_content)
+    except Exception as e:
+        return _error_result(state, e)
+
+
+async def arefine_specs(state) -> Dict[str, Any]:
+    """Async variant of refine_specs.
+
+    Args:
+        state: Current chat state
+
+    Returns:
+        Dictionary with the refined specifications and updated history
+    """
+    emit_stage("refine_specs")
+    try:
+        response_content = await llm.acompletion(
+            _build_messages(state),
+            on_token=token_callback("refine_specs"),
+            **config.get_model_params("refine_specs")
+        )
+        return _build_result(state, response_content)
+    except Exception as e:
+        return _error_result(state, e)
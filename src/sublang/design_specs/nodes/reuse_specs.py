@@ -0,0 +1,154 @@
+"""Reuse the finished specifications of a near-identical earlier description."""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, Optional, Tuple
+from pathlib import Path
+from sublang.utils import config, metrics, get_prompt_loader
+from sublang.utils.similarity_cache import SimilarityCache
+from sublang.utils.streaming import emit_stage
+from sublang.design_specs.structured import model_params
+
+# Shared prompt loader for design_specs subgraph
+prompt_loader = get_prompt_loader(str(Path(__file__).parent.parent / "prompts"))
+
+# Prompts and stages that turn a description into specs; a change to any of
+# them (or to a stage's model settings) starts a fresh cache namespace
+PIPELINE_PROMPTS = (
+    "OVERALL", "EXTEND_SCENARIOS", "EXTRACT_TERMS", "ADD_FEATURES", "ADD_CONSTRAINTS",
+    "STRUCTURED_OUTPUT", "SPEC_DELTA"
+)
+PIPELINE_STAGES = ("extend_scenarios", "extract_terms", "add_features", "add_constraints")
+
+_cache: Optional[SimilarityCache] = None
+
+
+def get_description_cache() -> Optional[SimilarityCache]:
+    """Get the process-wide cache of specs by description.
+
+    Returns:
+        The shared SimilarityCache, or None if DESIGN_CACHE is off
+    """
+    global _cache
+    if not config.design_cache:
+        return None
+    if _cache is None:
+        _cache = SimilarityCache(
+            path=str(Path(config.cache_dir).expanduser() / "design_cache.sqlite3"),
+            threshold=config.design_cache_threshold,
+            max_entries=config.design_cache_entries,
+            max_age=config.design_cache_max_age_days * 24 * 3600,
+        )
+    return _cache
+
+
+def _cache_namespace() -> str:
+    """Fingerprint the pipeline prompts and stage model settings.
+
+    Recomputed on every lookup so that reloaded prompts or settings take
+    effect; the prompt loader only rereads files that changed.
+    """
+    payload = json.dumps(
+        [
+            [prompt_loader.get_prompt(name) for name in PIPELINE_PROMPTS],
+            [model_params(stage) for stage in PIPELINE_STAGES],
+            [config.structured_output, config.spec_deltas, config.spec_lint],
+        ],
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def find_reusable(state) -> Optional[Tuple[Dict[str, Any], float]]:
+    """Look up stored specs for the state's description (no hit/miss counted).
+
+    Only first turns are looked up: extend_scenarios works from the
+    conversation history, so specs of a later turn depend on more than the
+    message.
+
+    Args:
+        state: Current design_specs state
+
+    Returns:
+        Tuple of (stored entry, similarity), or None
+    """
+    cache = get_description_cache()
+    if cache is None or state.get("history"):
+        return None
+    return cache.find(state["message"], _cache_namespace())
+
+
+def remember_specs(state, result: Dict[str, Any]) -> None:
+    """Store the specs a full pipeline run produced for a description.
+
+    Counts the run as a cache miss. Reused specs, failed runs (whose
+    response is an apology rather than the specs) and turns with history
+    (see find_reusable) are not stored.
+
+    Args:
+        state: Initial design_specs state of the run
+        result: Final state of the run
+    """
+    cache = get_description_cache()
+    specs = result.get("specs")
+    if (cache is None or not specs or result.get("response") != specs or state.get("history")
+            or "reused_specs" in (result.get("context") or {})):
+        return
+    cache.record_miss()
+    metrics.record("reuse_specs", cache_misses=1)
+    cache.put(state["message"], {"specs": specs}, _cache_namespace())
+
+
+def reuse_specs(state) -> Dict[str, Any]:
+    """Answer with the specs stored for a near-identical description.
+
+    Args:
+        state: Current design_specs state
+
+    Returns:
+        Dictionary with the stored specifications and updated history
+    """
+    emit_stage("reuse_specs")
+    message = state["message"]
+    history = state.get("history", [])
+    found = get_description_cache().get(message, _cache_namespace())
+    if found is None:
+        # Evicted since routing (e.g. by another process filling the cache)
+        error_msg = "I apologize, but I could not finish your design. Please try again."
+        return {
+            "response": error_msg,
+            "specs": state.get("previous_specs", ""),
+            "intent": "DESIGN_SPECS",
+            "error": "reuse_specs: stored specs no longer cached",
+            "history": history + [
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": error_msg}
+            ]
+        }
+    metrics.record(cache_hits=1)
+    entry, similarity = found
+
+    return {
+        "response": entry["specs"],
+        "specs": entry["specs"],
+        "intent": "DESIGN_SPECS",
+        "context": {**(state.get("context") or {}), "reused_specs": f"{similarity:.3f}"},
+        "history": history + [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": entry["specs"]}
+        ]
+    }
+
+
+async def areuse_specs(state) -> Dict[str, Any]:
+    """Async variant of reuse_specs; the SQLite lookup runs in a thread.
+
+    Args:
+        state: Current design_specs state
+
+    Returns:
+        Dictionary with the stored specifications and updated history
+    """
+    return await asyncio.to_thread(reuse_specs, state)
@@ -0,0 +1,153 @@
+"""Extract terms and features from a long description in parallel chunks."""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Union
+from sublang.utils import config, llm
+from sublang.utils.streaming import emit_stage
+from sublang.utils.profiling import traced
+from sublang.design_specs.spec_model import merge_specs, serialize_spec
+from sublang.design_specs.structured import dump_spec, load_spec, model_params
+from sublang.design_specs.utils import split_chunks
+from .extract_terms import (
+    _build_messages as _terms_messages, _build_result as _terms_result
+)
+from .add_features import (
+    _build_messages as _features_messages, _build_result as _features_result
+)
+
+
+def _chunks(state) -> List[str]:
+    """Split the expanded description into token-sized chunks."""
+    return split_chunks(state["message"], config.shard_tokens)
+
+
+def _terms_state(chunk: str) -> Dict[str, Any]:
+    return {"message": chunk, "history": []}
+
+
+def _features_state(chunk: str, terms_result: Dict[str, Any]) -> Dict[str, Any]:
+    return {"message": chunk, "specs": terms_result["specs"], "history": []}
+
+
+def _shard(chunk: str) -> str:
+    """Run term extraction then feature generation on one chunk."""
+    terms_state = _terms_state(chunk)
+    terms_result = _terms_result(terms_state, llm.completion(
+        _terms_messages(terms_state), **model_params("extract_terms")
+    ))
+    features_state = _features_state(chunk, terms_result)
+    features_result = _features_result(features_state, llm.completion(
+        _features_messages(features_state), **model_params("add_features")
+    ))
+    return features_result["specs"]
+
+
+async def _ashard(chunk: str) -> str:
+    """Async variant of _shard."""
+    terms_state = _terms_state(chunk)
+    terms_result = _terms_result(terms_state, await llm.acompletion(
+        _terms_messages(terms_state), **model_params("extract_terms")
+    ))
+    features_state = _features_state(chunk, terms_result)
+    features_result = _features_result(features_state, await llm.acompletion(
+        _features_messages(features_state), **model_params("add_features")
+    ))
+    return features_result["specs"]
+
+
+@traced("build_result")
+def _build_result(state, shard_specs: List[Union[str, BaseException]]) -> Dict[str, Any]:
+    """Merge the per-chunk specifications (in chunk order) into one.
+
+    Chunks that failed are left out of the merge; only when every chunk
+    failed does the stage fail.
+    """
+    failures = [specs for specs in shard_specs if isinstance(specs, BaseException)]
+    if len(failures) == len(shard_specs):
+        return _error_result(state, failures[0])
+    update: Dict[str, Any] = {
+        "intent": "DESIGN_SPECS",
+        "history": state.get("history", [])  # Don't add to history - this is internal processing
+    }
+    if failures:
+        print(f"Warning: {len(failures)} of {len(shard_specs)} chunks failed, "
+              f"merging the others: {failures[0]}")
+        update["context"] = {**(state.get("context") or {}),
+                             "shard_failures": f"{len(failures)}/{len(shard_specs)}"}
+    # Chunks answer in JSON in structured output mode, in markdown otherwise
+    merged = merge_specs([load_spec(specs) for specs in shard_specs if isinstance(specs, str)])
+    update["specs"] = dump_spec(merged) if config.structured_output else serialize_spec(merged)
+    return update
+
+
+def _error_result(state, e: Exception) -> Dict[str, Any]:
+    """Build the state update used when a chunk fails."""
+    print(f"Error extracting terms and features from chunks: {e}")
+    error_msg = (
+        "I apologize, but I encountered an error while extracting "
+        "terms and features from your description. Please try again."
+    )
+    return {
+        "specs": error_msg,
+        "intent": "DESIGN_SPECS",
+        "error": f"shard_specs: {e}",
+        "history": state.get("history", [])  # Don't add to history - this is internal processing
+    }
+
+
+def shard_specs(state) -> Dict[str, Any]:
+    """Extract terms and features per chunk in parallel and merge them.
+
+    Replaces extract_terms and add_features for long descriptions, so the
+    wall-clock time follows the largest chunk instead of the whole text.
+    A failed chunk is left out rather than failing the whole stage.
+
+    Args:
+        state: Current chat state
+
+    Returns:
+        Dictionary with the merged terms and features
+    """
+    emit_stage("shard_specs")
+    try:
+        chunks = _chunks(state)
+        with ThreadPoolExecutor(max_workers=max(1, config.shard_workers)) as executor:
+            # Each worker runs in a copy of this context, so metrics and
+            # stream events stay attributed to this stage and turn
+            futures = [executor.submit(contextvars.copy_context().run, _shard, chunk)
+                       for chunk in chunks]
+            results: List[Union[str, BaseException]] = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+        return _build_result(state, results)
+    except Exception as e:
+        return _error_result(state, e)
+
+
+async def ashard_specs(state) -> Dict[str, Any]:
+    """Async variant of shard_specs.
+
+    Args:
+        state: Current chat state
+
+    Returns:
+        Dictionary with the merged terms and features
+    """
+    emit_stage("shard_specs")
+    semaphore = asyncio.Semaphore(max(1, config.shard_workers))
+
+    async def run(chunk: str) -> str:
+        async with semaphore:
+            return await _ashard(chunk)
+
+    try:
+        chunks = _chunks(state)
+        results = await asyncio.gather(*(run(c) for c in chunks), return_exceptions=True)
+        return _build_result(state, list(results))
+    except Exception as e:
+        return _error_result(state, e)
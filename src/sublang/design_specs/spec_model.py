@@ -0,0 +1,476 @@
+"""Typed in-memory model of design specifications.
+
+Parses the markdown produced by the design stages (see demo/tig/specs.md and
+specs/dev/rules.md) into Terms, Features and Constraints, serializes it back
+in the same layout, and indexes which items reference each term, attribute
+and action. Parsed items remember their source text, which is written back
+verbatim as long as the item (and, for terms, the style) is unchanged.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+TERMS = "Terms"
+FEATURES = "Features"
+CONSTRAINTS = "Constraints"
+
+
+@dataclass(slots=True)
+class Member:
+    """An attribute or action of a term."""
+    name: str
+    description: str = ""
+
+
+@dataclass(slots=True)
+class Term:
+    """A key concept, with its properties, attributes and actions."""
+    name: str
+    fields: Dict[str, str] = field(default_factory=dict)  # e.g. {"Represents": "..."}
+    attributes: List[Member] = field(default_factory=list)
+    actions: List[Member] = field(default_factory=list)
+    # (content, style, lines below the header) as parsed
+    _source: Optional[Tuple[Tuple, Tuple, str]] = field(default=None, repr=False, compare=False)
+
+
+@dataclass(slots=True)
+class Item:
+    """A feature or constraint: an optional bold title and its description."""
+    title: str
+    description: str
+    # (title, description, text after the list marker) as parsed
+    _source: Optional[Tuple[str, str, str]] = field(default=None, repr=False, compare=False)
+
+
+Feature = Item
+Constraint = Item
+
+
+@dataclass(slots=True)
+class ItemStyle:
+    """List markup of a Features or Constraints section."""
+    numbered: bool = True  # "1." rather than "-"
+    spaced: bool = True  # blank line between items
+
+
+@dataclass(slots=True)
+class SpecStyle:
+    """Markup choices detected while parsing, reused when serializing."""
+    term_header: str = "{n}. **Term: `{name}`**"
+    indent: str = "   "
+    attribute_mark: str = "_"
+    action_mark: str = "**"
+    bulleted_groups: bool = True  # "- Attributes:" rather than "Attributes:"
+    features: ItemStyle = field(default_factory=ItemStyle)
+    constraints: ItemStyle = field(default_factory=ItemStyle)
+
+
+def _term_content(term: Term) -> Tuple:
+    """Snapshot of a term's content, to tell whether it changed since parsing."""
+    return (term.name, tuple(term.fields.items()),
+            tuple((m.name, m.description) for m in term.attributes),
+            tuple((m.name, m.description) for m in term.actions))
+
+
+def _term_style(style: SpecStyle) -> Tuple:
+    """The parts of the style that the lines below a term header follow."""
+    return (style.indent, style.attribute_mark, style.action_mark, style.bulleted_groups)
+
+
+@dataclass(slots=True)
+class Spec:
+    """A design specification with reference indexes."""
+    terms: List[Term] = field(default_factory=list)
+    features: List[Item] = field(default_factory=list)
+    constraints: List[Item] = field(default_factory=list)
+    preamble: str = ""
+    # Sections other than Terms/Features/Constraints, kept verbatim in order
+    extra_sections: List[Tuple[str, str]] = field(default_factory=list)
+    section_order: List[str] = field(default_factory=lambda: [TERMS, FEATURES, CONSTRAINTS])
+    style: SpecStyle = field(default_factory=SpecStyle)
+    _index: Optional[Dict[str, Dict[str, Set[int]]]] = field(
+        default=None, repr=False, compare=False
+    )
+
+    def term(self, name: str) -> Optional[Term]:
+        """Find a term by name (case-insensitive)."""
+        key = name.lower()
+        for term in self.terms:
+            if term.name.lower() == key:
+                return term
+        return None
+
+    def invalidate(self) -> None:
+        """Drop the reference index after the spec was modified."""
+        self._index = None
+
+    def _build_index(self) -> Dict[str, Dict[str, Set[int]]]:
+        """Map every term, attribute and action name to the items referencing it."""
+        index: Dict[str, Dict[str, Set[int]]] = {}
+        names: Dict[str, str] = {}
+        for term in self.terms:
+            names[term.name.lower()] = term.name.lower()
+            for member in term.attributes + term.actions:
+                names.setdefault(member.name.lower(), member.name.lower())
+
+        def add(kind: str, position: int, text: str) -> None:
+            for name in _referenced_names(text, names):
+                index.setdefault(name, {}).setdefault(kind, set()).add(position)
+
+        for i, term in enumerate(self.terms):
+            text = " ".join(list(term.fields.values())
+                            + [m.description for m in term.attributes + term.actions])
+            add("terms", i, text)
+        for i, feature in enumerate(self.features):
+            add("features", i, f"{feature.title} {feature.description}")
+        for i, constraint in enumerate(self.constraints):
+            add("constraints", i, f"{constraint.title} {constraint.description}")
+        return index
+
+    def references(self, name: str) -> Dict[str, List[int]]:
+        """Get the positions of the items that reference a name.
+
+        Args:
+            name: Term, attribute or action name
+
+        Returns:
+            Dictionary with sorted "terms", "features" and "constraints" positions
+        """
+        if self._index is None:
+            self._index = self._build_index()
+        found = self._index.get(name.lower(), {})
+        return {kind: sorted(found.get(kind, ())) for kind in ("terms", "features", "constraints")}
+
+    def touching(self, name: str) -> Dict[str, List]:
+        """Get the terms, features and constraints that reference a name.
+
+        Args:
+            name: Term, attribute or action name
+
+        Returns:
+            Dictionary with the referencing "terms", "features" and "constraints"
+        """
+        refs = self.references(name)
+        return {
+            "terms": [self.terms[i] for i in refs["terms"]],
+            "features": [self.features[i] for i in refs["features"]],
+            "constraints": [self.constraints[i] for i in refs["constraints"]],
+        }
+
+
+# Backticked names (optionally pluralized), marked-up names and plain words
+_REFERENCE = re.compile(r"`([^`]+)`|\*\*([^*]+)\*\*|_([^_\s][^_]*)_|([A-Za-z][\w-]*)")
+
+
+def _referenced_names(text: str, names: Dict[str, str]) -> Set[str]:
+    """Find known names mentioned in a text, tolerating simple inflections."""
+    found = set()
+    for match in _REFERENCE.finditer(text):
+        word = next(g for g in match.groups() if g).lower()
+        candidates = [word]
+        for suffix in ("s", "es", "d", "ed"):
+            if word.endswith(suffix):
+                candidates.append(word[:-len(suffix)])
+        for candidate in candidates:
+            if candidate in names:
+                found.add(names[candidate])
+                break
+    return found
+
+
+_NUMBERED = re.compile(r"^(\d+)\.\s+(.*)$")
+_BULLET = re.compile(r"^-\s+(.*)$")
+_GROUP = re.compile(r"^(-\s+)?(?:\*\*|_)?(Attributes|Actions)(?:\*\*|_)?\s*:?\s*(?:\*\*)?\s*$", re.IGNORECASE)
+_FIELD = re.compile(r"^-\s+(?:\*\*)?([A-Z][\w ]*?)(?:\*\*)?:\s*(.*)$")
+_MEMBER = re.compile(r"^-\s+(?:_([^_]+)_|\*\*([^*]+)\*\*|`([^`]+)`|([^:]+?))\s*(?::\s*(.*))?$")
+_TITLED = re.compile(r"^\*\*(.+?)\*\*:\s*(.*)$", re.DOTALL)
+
+
+def _term_name(header: str, style: SpecStyle) -> str:
+    """Extract a term name from its header line and record the header style."""
+    inner = header.strip()
+    match = re.fullmatch(r"\*\*Term:\s*`([^`]+)`\*\*", inner)
+    if match:
+        style.term_header = "{n}. **Term: `{name}`**"
+        return match.group(1)
+    match = re.fullmatch(r"Term:\s*`([^`]+)`", inner)
+    if match:
+        style.term_header = "{n}. Term: `{name}`"
+        return match.group(1)
+    match = re.fullmatch(r"\*\*`?([^*`]+)`?\*\*", inner)
+    if match:
+        style.term_header = "{n}. **{name}**"
+        return match.group(1)
+    match = re.fullmatch(r"`([^`]+)`", inner)
+    if match:
+        style.term_header = "{n}. `{name}`"
+        return match.group(1)
+    style.term_header = "{n}. {name}"
+    return inner
+
+
+def _parse_terms(body: str, style: SpecStyle) -> List[Term]:
+    """Parse the body of a Terms section."""
+    terms: List[Term] = []
+    sources: List[List[str]] = []
+    group: Optional[str] = None
+    group_indent = 0
+    group_bulleted = True
+    seen_member_marks: Dict[str, bool] = {}
+
+    for raw in body.splitlines():
+        if terms and not (_NUMBERED.match(raw) or raw.startswith("###")):
+            sources[-1].append(raw.rstrip())
+        if not raw.strip():
+            continue
+        indent = len(raw) - len(raw.lstrip())
+        line = raw.strip()
+
+        numbered = _NUMBERED.match(line) if indent == 0 else None
+        heading = re.match(r"^###\s+(.*)$", line)
+        if numbered or heading:
+            name = _term_name(numbered.group(2) if numbered else heading.group(1), style)
+            if heading:
+                style.term_header = "### {name}"
+            terms.append(Term(name=name))
+            sources.append([])
+            group = None
+            continue
+        if not terms:
+            continue
+        term = terms[-1]
+
+        group_match = _GROUP.match(line)
+        if group_match:
+            group = group_match.group(2).lower()
+            group_indent = indent
+            group_bulleted = bool(group_match.group(1))
+            style.bulleted_groups = group_bulleted
+            if indent and len(terms) == 1:
+                style.indent = " " * indent
+            continue
+
+        in_group = group is not None and (
+            indent > group_indent or (not group_bulleted and indent >= group_indent)
+        )
+        if in_group:
+            member_match = _MEMBER.match(line)
+            if member_match:
+                italic, bold, code, plain, description = member_match.groups()
+                name = italic or bold or code or plain
+                mark = "_" if italic else "**" if bold else "`" if code else ""
+                if group not in seen_member_marks:
+                    seen_member_marks[group] = True
+                    if group == "attributes":
+                        style.attribute_mark = mark
+                    else:
+                        style.action_mark = mark
+                member = Member(name=name.strip(), description=(description or "").strip())
+                (term.attributes if group == "attributes" else term.actions).append(member)
+                continue
+
+        field_match = _FIELD.match(line)
+        if field_match:
+            group = None
+            if indent and len(terms) == 1:
+                style.indent = " " * indent
+            term.fields[field_match.group(1).strip()] = field_match.group(2).strip()
+    for term, lines in zip(terms, sources):
+        term._source = (_term_content(term), _term_style(style), "\n".join(lines).strip("\n"))
+    return terms
+
+
+def _parse_items(body: str, style: ItemStyle) -> List[Item]:
+    """Parse the body of a Features or Constraints section.
+
+    Continuation lines (e.g. nested bullets) keep their indentation.
+    """
+    blocks: List[List[str]] = []
+    blank_between = False
+    for raw in body.splitlines():
+        line = raw.rstrip()
+        start = _NUMBERED.match(line) or (_BULLET.match(line) if not raw.startswith(" ") else None)
+        if start:
+            if not blocks:
+                style.numbered = bool(_NUMBERED.match(line))
+            if blocks and blocks[-1] and blocks[-1][-1] == "":
+                blank_between = True
+            blocks.append([start.groups()[-1]])
+        elif blocks:
+            blocks[-1].append(line)
+    if len(blocks) > 1:
+        style.spaced = blank_between
+
+    items = []
+    for block in blocks:
+        text = "\n".join(block).strip()
+        titled = _TITLED.match(text)
+        if titled:
+            item = Item(title=titled.group(1).strip(), description=titled.group(2).strip())
+        else:
+            item = Item(title="", description=text)
+        item._source = (item.title, item.description, text)
+        items.append(item)
+    return items
+
+
+def parse_spec(markdown: str) -> Spec:
+    """Parse a specification from markdown.
+
+    Args:
+        markdown: Specification text with ``## Terms/Features/Constraints`` sections
+
+    Returns:
+        Parsed Spec; unknown sections are kept verbatim
+    """
+    # Imported here: utils depends on the LLM layer, the model does not
+    from sublang.design_specs.utils import split_sections
+
+    spec = Spec(section_order=[])
+    for title, text in split_sections(markdown):
+        if not title:
+            spec.preamble = text
+            continue
+        body = text.split("\n", 1)[1] if "\n" in text else ""
+        key = title.lower()
+        if key == "terms":
+            spec.terms = _parse_terms(body, spec.style)
+            spec.section_order.append(TERMS)
+        elif key == "features":
+            spec.features = _parse_items(body, spec.style.features)
+            spec.section_order.append(FEATURES)
+        elif key == "constraints":
+            spec.constraints = _parse_items(body, spec.style.constraints)
+            spec.section_order.append(CONSTRAINTS)
+        else:
+            spec.extra_sections.append((title, text))
+            spec.section_order.append(title)
+    return spec
+
+
+def _mark(name: str, mark: str) -> str:
+    return f"{mark}{name}{mark}" if mark else name
+
+
+def _serialize_terms(spec: Spec) -> str:
+    style = spec.style
+    blocks = []
+    for n, term in enumerate(spec.terms, start=1):
+        lines = [style.term_header.format(n=n, name=term.name)]
+        source = term._source
+        if source and source[0] == _term_content(term) and source[1] == _term_style(style):
+            blocks.append("\n".join(lines + ([source[2]] if source[2] else [])))
+            continue
+        for key, value in term.fields.items():
+            lines.append(f"{style.indent}- {key}: {value}")
+        for label, members, mark in (("Attributes", term.attributes, style.attribute_mark),
+                                     ("Actions", term.actions, style.action_mark)):
+            if not members:
+                continue
+            if style.bulleted_groups:
+                lines.append(f"{style.indent}- {label}:")
+                member_indent = style.indent + "  "
+            else:
+                lines.append(f"{style.indent}{label}:")
+                member_indent = style.indent
+            for member in members:
+                text = _mark(member.name, mark)
+                lines.append(f"{member_indent}- {text}: {member.description}" if member.description
+                             else f"{member_indent}- {text}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def _serialize_items(items: List[Item], style: ItemStyle) -> str:
+    lines = []
+    for n, item in enumerate(items, start=1):
+        marker = f"{n}." if style.numbered else "-"
+        if item._source and item._source[:2] == (item.title, item.description):
+            text = item._source[2]
+        else:
+            text = f"**{item.title}**: {item.description}" if item.title else item.description
+        lines.append(f"{marker} {text}")
+    return ("\n\n" if style.spaced else "\n").join(lines)
+
+
+def serialize_spec(spec: Spec) -> str:
+    """Render a specification as markdown in its original layout.
+
+    Args:
+        spec: Specification to render
+
+    Returns:
+        Markdown text
+    """
+    extra = dict(spec.extra_sections)
+    parts = [spec.preamble] if spec.preamble else []
+    for title in spec.section_order:
+        if title == TERMS:
+            parts.append(f"## {TERMS}\n\n{_serialize_terms(spec)}")
+        elif title == FEATURES:
+            parts.append(f"## {FEATURES}\n\n{_serialize_items(spec.features, spec.style.features)}")
+        elif title == CONSTRAINTS:
+            parts.append(f"## {CONSTRAINTS}\n\n{_serialize_items(spec.constraints, spec.style.constraints)}")
+        elif title in extra:
+            parts.append(extra[title])
+    return "\n\n".join(parts)
+
+
+def item_key(item: Item) -> str:
+    """Normalized identity of a feature or constraint, used for deduplication."""
+    text = item.title or item.description
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def merge_specs(parts: List[Spec]) -> Spec:
+    """Merge partial specifications into one, deterministically.
+
+    Parts are reconciled in order: terms are matched by name
+    (case-insensitive), their fields, attributes and actions are unioned with
+    the first description winning; features and constraints are deduplicated
+    by title (or text when untitled). The layout of the first part is kept.
+
+    Args:
+        parts: Partial specifications, e.g. one per description chunk
+
+    Returns:
+        Merged specification
+    """
+    merged = Spec(style=parts[0].style if parts else SpecStyle())
+    terms: Dict[str, Term] = {}
+    seen_items: Dict[str, Set[str]] = {FEATURES: set(), CONSTRAINTS: set()}
+
+    for part in parts:
+        for term in part.terms:
+            target = terms.get(term.name.lower())
+            if target is None:
+                target = Term(name=term.name)
+                terms[term.name.lower()] = target
+                merged.terms.append(target)
+            for key, value in term.fields.items():
+                target.fields.setdefault(key, value)
+            for source, dest in ((term.attributes, target.attributes), (term.actions, target.actions)):
+                names = {member.name.lower() for member in dest}
+                for member in source:
+                    if member.name.lower() not in names:
+                        names.add(member.name.lower())
+                        dest.append(Member(member.name, member.description))
+        for kind, source, dest in ((FEATURES, part.features, merged.features),
+                                   (CONSTRAINTS, part.constraints, merged.constraints)):
+            for item in source:
+                key = item_key(item)
+                if key not in seen_items[kind]:
+                    seen_items[kind].add(key)
+                    dest.append(Item(item.title, item.description))
+        for title, text in part.extra_sections:
+            if title not in dict(merged.extra_sections):
+                merged.extra_sections.append((title, text))
+
+    merged.section_order = [TERMS]
+    if merged.features:
+        merged.section_order.append(FEATURES)
+    if merged.constraints:
+        merged.section_order.append(CONSTRAINTS)
+    merged.section_order.extend(title for title, _ in merged.extra_sections)
+    return merged
@@ -0,0 +1,335 @@
+"""Structured (JSON-schema) output of the design stages.
+
+With STRUCTURED_OUTPUT on, extract_terms, add_features and add_constraints
+ask the model for a JSON object (LiteLLM ``response_format``) instead of
+reasoning followed by a fenced markdown block. Each answer is validated
+locally, passed on to the next stage as compact JSON and rendered to
+markdown in the layout of specs/dev/rules.md only by the final stage. An
+answer that does not validate falls back to the markdown code-block parsing.
+"""
+
+import json
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from sublang.utils import config, get_prompt_loader, metrics
+from sublang.utils.llm import get_litellm
+from sublang.design_specs import delta
+from sublang.design_specs.spec_model import (
+    CONSTRAINTS, FEATURES, TERMS, Item, Member, Spec, SpecStyle, Term, parse_spec, serialize_spec
+)
+from sublang.design_specs.utils import combine_prompts, parse_markdown_code_block
+
+# Shared prompt loader for design_specs subgraph
+prompt_loader = get_prompt_loader(str(Path(__file__).parent / "prompts"))
+
+_MEMBER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "description": {"type": "string"},
+    },
+    "required": ["name", "description"],
+    "additionalProperties": False,
+}
+
+_TERM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "represents": {"type": "string"},
+        "attributes": {"type": "array", "items": _MEMBER_SCHEMA},
+        "actions": {"type": "array", "items": _MEMBER_SCHEMA},
+    },
+    "required": ["name", "represents", "attributes", "actions"],
+    "additionalProperties": False,
+}
+
+_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "description": {"type": "string"},
+    },
+    "required": ["title", "description"],
+    "additionalProperties": False,
+}
+
+_SECTION_SCHEMAS = {
+    "terms": {"type": "array", "items": _TERM_SCHEMA},
+    "features": {"type": "array", "items": _ITEM_SCHEMA},
+    "constraints": {"type": "array", "items": _ITEM_SCHEMA},
+}
+
+# Sections each stage returns (the full specification so far)
+STAGE_SECTIONS: Dict[str, List[str]] = {
+    "extract_terms": ["terms"],
+    "add_features": ["terms", "features"],
+    "add_constraints": ["terms", "features", "constraints"],
+}
+
+# Layout of specs/dev/rules.md: plain term names, **attributes**, _actions_
+RULES_STYLE = SpecStyle(
+    term_header="{n}. {name}",
+    attribute_mark="**",
+    action_mark="_",
+    bulleted_groups=False,
+)
+
+
+def stage_schema(stage: str) -> Dict[str, Any]:
+    """Get the JSON schema of a stage's answer.
+
+    Stages answering with changes only (see delta) also list the names of
+    the terms and features they removed.
+
+    Args:
+        stage: extract_terms, add_features or add_constraints
+
+    Returns:
+        JSON schema of an object holding the stage's sections
+    """
+    sections = STAGE_SECTIONS[stage]
+    properties = {name: _SECTION_SCHEMAS[name] for name in sections}
+    if delta.enabled(stage):
+        for name in sections[:-1]:
+            properties[f"removed_{name}"] = {"type": "array", "items": {"type": "string"}}
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def enabled(stage: str) -> bool:
+    """Check whether a stage runs in structured output mode."""
+    return config.structured_output and stage in STAGE_SECTIONS
+
+
+def _supports_schema(model: str) -> bool:
+    try:
+        return bool(get_litellm().supports_response_schema(model=model))
+    except Exception:
+        return False
+
+
+def model_params(stage: str) -> Dict[str, Any]:
+    """Get a stage's LiteLLM parameters, with response_format in structured mode.
+
+    Models without JSON-schema support get plain JSON mode; the schema is then
+    part of the instructions (see instructions).
+
+    Args:
+        stage: Pipeline stage
+
+    Returns:
+        Parameters for llm.completion
+    """
+    params = config.get_model_params(stage)
+    if not enabled(stage):
+        return params
+    if _supports_schema(params["model"]):
+        params["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": stage, "schema": stage_schema(stage), "strict": True},
+        }
+    else:
+        params["response_format"] = {"type": "json_object"}
+    return params
+
+
+def instructions(stage_prompt: str, stage: str) -> str:
+    """Append the structured output and changes-only instructions to a stage prompt.
+
+    Args:
+        stage_prompt: Step-specific prompt
+        stage: Pipeline stage
+
+    Returns:
+        The prompt, unchanged outside structured and changes-only modes
+    """
+    stage_prompt = delta.instructions(stage_prompt, stage)
+    if not enabled(stage):
+        return stage_prompt
+    prompt = prompt_loader.get_prompt("STRUCTURED_OUTPUT")
+    if not _supports_schema(config.stage_model(stage)):
+        prompt += f"\n\nJSON schema:\n{json.dumps(stage_schema(stage), separators=(',', ':'))}"
+    return combine_prompts(stage_prompt, prompt)
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$") -> None:
+    """Check a value against the subset of JSON schema used by the stages.
+
+    Args:
+        value: Decoded JSON value
+        schema: Schema with type, properties, required, items and
+            additionalProperties keywords
+        path: Location of the value, for error messages
+
+    Raises:
+        ValueError: If the value does not match
+    """
+    kind = schema["type"]
+    if kind == "object":
+        if not isinstance(value, dict):
+            raise ValueError(f"{path}: expected an object")
+        for name in schema.get("required", ()):
+            if name not in value:
+                raise ValueError(f"{path}: missing {name!r}")
+        properties = schema.get("properties", {})
+        for name, item in value.items():
+            if name in properties:
+                validate(item, properties[name], f"{path}.{name}")
+            elif schema.get("additionalProperties") is False:
+                raise ValueError(f"{path}: unexpected {name!r}")
+    elif kind == "array":
+        if not isinstance(value, list):
+            raise ValueError(f"{path}: expected an array")
+        for i, item in enumerate(value):
+            validate(item, schema["items"], f"{path}[{i}]")
+    elif kind == "string" and not isinstance(value, str):
+        raise ValueError(f"{path}: expected a string")
+
+
+def spec_from_json(data: Dict[str, Any]) -> Spec:
+    """Build a specification from a validated stage answer."""
+    spec = Spec(style=deepcopy(RULES_STYLE))
+    for term in data.get("terms", []):
+        spec.terms.append(Term(
+            name=term["name"].strip(),
+            fields={"Represents": term["represents"].strip()} if term["represents"].strip() else {},
+            attributes=[Member(m["name"].strip(), m["description"].strip()) for m in term["attributes"]],
+            actions=[Member(m["name"].strip(), m["description"].strip()) for m in term["actions"]],
+        ))
+    spec.features = [Item(i["title"].strip(), i["description"].strip()) for i in data.get("features", [])]
+    spec.constraints = [Item(i["title"].strip(), i["description"].strip()) for i in data.get("constraints", [])]
+    spec.section_order = [TERMS]
+    if "features" in data:
+        spec.section_order.append(FEATURES)
+    if "constraints" in data:
+        spec.section_order.append(CONSTRAINTS)
+    return spec
+
+
+def spec_to_json(spec: Spec) -> Dict[str, Any]:
+    """Convert a specification to the stage answer format."""
+    data: Dict[str, Any] = {"terms": [
+        {
+            "name": term.name,
+            "represents": term.fields.get("Represents", next(iter(term.fields.values()), "")),
+            "attributes": [{"name": m.name, "description": m.description} for m in term.attributes],
+            "actions": [{"name": m.name, "description": m.description} for m in term.actions],
+        }
+        for term in spec.terms
+    ]}
+    if FEATURES in spec.section_order or spec.features:
+        data["features"] = [{"title": i.title, "description": i.description} for i in spec.features]
+    if CONSTRAINTS in spec.section_order or spec.constraints:
+        data["constraints"] = [{"title": i.title, "description": i.description} for i in spec.constraints]
+    return data
+
+
+def dump_spec(spec: Spec) -> str:
+    """Serialize a specification as compact JSON for the next stage."""
+    return json.dumps(spec_to_json(spec), ensure_ascii=False, separators=(",", ":"))
+
+
+def load_spec(text: str) -> Spec:
+    """Load a specification passed on by a stage, as JSON or markdown.
+
+    Args:
+        text: Stage output
+
+    Returns:
+        Parsed Spec
+    """
+    try:
+        data = json.loads(text)
+        validate(data, {"type": "object", "properties": _SECTION_SCHEMAS, "additionalProperties": False})
+        return spec_from_json(data)
+    except ValueError:
+        return parse_spec(text)
+
+
+def render(spec: Spec) -> str:
+    """Render a specification as markdown following specs/dev/rules.md.
+
+    Term names get a capitalized first letter; attributes are bold and
+    actions italic.
+
+    Args:
+        spec: Specification to render
+
+    Returns:
+        Markdown text
+    """
+    for term in spec.terms:
+        term.name = term.name[:1].upper() + term.name[1:]
+    spec.invalidate()
+    return serialize_spec(spec)
+
+
+def parse_answer(content: str, stage: str) -> Optional[Dict[str, Any]]:
+    """Decode and validate a structured stage answer.
+
+    Args:
+        content: Response content
+        stage: Pipeline stage
+
+    Returns:
+        Decoded answer, or None if it is not valid JSON of the stage's schema
+    """
+    text = content.strip()
+    if text.startswith("```"):
+        text = parse_markdown_code_block(text) or text
+    try:
+        data = json.loads(text)
+        validate(data, stage_schema(stage))
+    except ValueError as e:
+        print(f"Warning: {stage} returned invalid structured output, parsing it as markdown: {e}")
+        return None
+    return data
+
+
+def stage_output(content: str, stage: str, final: bool = False, previous: str = "") -> str:
+    """Get the specification text a stage passes on from its response.
+
+    In structured mode a valid answer becomes compact JSON, or markdown for
+    the final stage; otherwise the last fenced code block is used, or the
+    whole response if there is none. Changes-only answers are applied to the
+    previous specification first. Parse failures are counted per stage.
+
+    Args:
+        content: Response content
+        stage: Pipeline stage
+        final: Whether the output is the finished specification
+        previous: Specification the stage received (JSON or markdown)
+
+    Returns:
+        Specification text
+    """
+    structured = enabled(stage)
+    patched = delta.enabled(stage) and previous
+    if structured:
+        data = parse_answer(content, stage)
+        if data is not None:
+            spec = spec_from_json(data)
+            if patched:
+                removed = {kind: data.get(f"removed_{kind}", []) for kind in _SECTION_SCHEMAS}
+                spec = delta.apply_delta(load_spec(previous), spec, removed)
+            return render(spec) if final else dump_spec(spec)
+    parsed = parse_markdown_code_block(content)
+    if structured or not parsed:
+        metrics.record(parse_failures=1)
+    output = parsed if parsed else content
+    if patched:
+        base = load_spec(previous)
+        if base.terms:
+            changes = parse_spec(output)
+            spec = delta.apply_delta(base, changes, delta.split_removals(changes))
+            if not structured:
+                output = serialize_spec(spec)
+            else:
+                output = render(spec) if final else dump_spec(spec)
+    return output
@@ -1,7 +1,9 @@
 """Utility functions for design specs nodes."""
 
 import re
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sublang.utils import llm
+from sublang.design_specs.spec_model import parse_spec
 
 
 def parse_markdown_code_block(response: str) -> Optional[str]:
@@ -26,13 +28,212 @@ def parse_markdown_code_block(response: str) -> Optional[str]:
 
 
 def combine_prompts(overall_prompt: str, specific_prompt: str) -> str:
-    """Combine the overall.md prompt with a step-specific prompt.
+    """Combine a prompt with a more specific section that follows it.
+
+    Used for overall.md followed by a step-specific prompt, and for a
+    step-specific prompt followed by that step's input.
 
     Args:
-        overall_prompt: Content of overall.md
+        overall_prompt: Content of overall.md (or another leading section)
         specific_prompt: Content of step-specific prompt (extract_terms.md, etc.)
 
     Returns:
         Combined prompt with overall context followed by specific instructions
     """
     return f"{overall_prompt}\n\n---\n\n{specific_prompt}"
+
+
+def build_stage_messages(
+    overall_prompt: str,
+    stage_prompt: str,
+    description: str,
+    stage_input: str = "",
+    history: Optional[List[Dict[str, str]]] = None,
+    model: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Build stage messages around a prefix shared by all design stages.
+
+    The overall prompt and the description come first and are byte-identical
+    across the stages that see the same description, so provider prompt
+    caching can reuse them; everything stage-specific follows.
+
+    Args:
+        overall_prompt: Content of overall.md
+        stage_prompt: Content of the step-specific prompt
+        description: Description the stage works on, i.e. the user's request
+            expanded with use scenarios by extend_scenarios
+        stage_input: Output of previous stages, if any
+        history: Conversation history to include after the shared prefix
+        model: Model the stage runs on (defaults to the configured model)
+
+    Returns:
+        Messages to send to the LLM, with the prefix marked for caching
+    """
+    messages = [
+        {"role": "system", "content": overall_prompt},
+        {"role": "user", "content": f"Description with use scenarios:\n{description}"},
+    ]
+    prefix_length = len(messages)
+
+    if history:
+        messages.extend(history)
+
+    stage_message = combine_prompts(stage_prompt, stage_input) if stage_input else stage_prompt
+    messages.append({"role": "user", "content": stage_message})
+    return llm.mark_cache_prefix(messages, prefix_length, model)
+
+
+_SECTION_HEADING = re.compile(r'^## +(.+?)\s*$', re.MULTILINE)
+
+
+def split_sections(markdown: str) -> List[Tuple[str, str]]:
+    """Split a specification into its ``## `` sections.
+
+    Args:
+        markdown: Specification text
+
+    Returns:
+        List of (heading title, section text including the heading); text
+        before the first heading is returned with an empty title
+    """
+    sections = []
+    matches = list(_SECTION_HEADING.finditer(markdown))
+    if matches and matches[0].start() > 0 and markdown[:matches[0].start()].strip():
+        sections.append(("", markdown[:matches[0].start()].strip()))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(markdown)
+        sections.append((match.group(1).strip(), markdown[match.start():end].strip()))
+    return sections
+
+
+def merge_sections(existing: str, updates: str) -> str:
+    """Replace sections of a specification with updated versions.
+
+    Sections are matched by heading title (case-insensitive); updated sections
+    without a match are appended. If either text has no section headings, the
+    updates are taken as the complete new specification.
+
+    Args:
+        existing: Current specification
+        updates: Updated sections
+
+    Returns:
+        Merged specification
+    """
+    existing_sections = split_sections(existing)
+    updated_sections = [(t, s) for t, s in split_sections(updates) if t]
+    if not updated_sections or not any(title for title, _ in existing_sections):
+        return updates.strip()
+
+    replacements = {title.lower(): text for title, text in updated_sections}
+    merged = []
+    for title, text in existing_sections:
+        merged.append(replacements.pop(title.lower(), text))
+    for title, text in updated_sections:
+        if title.lower() in replacements:
+            merged.append(text)
+    return "\n\n".join(merged)
+
+
+def split_chunks(
+    text: str,
+    max_tokens: int,
+    count: Optional[Callable[[str], int]] = None
+) -> List[str]:
+    """Split a description into chunks of at most about max_tokens tokens.
+
+    Paragraphs are packed greedily in order; a paragraph larger than a chunk
+    is split on line boundaries, then on sentence boundaries.
+
+    Args:
+        text: Description to split
+        max_tokens: Token budget per chunk
+        count: Token counter (defaults to llm.count_tokens)
+
+    Returns:
+        Chunks in document order
+    """
+    count = count or llm.count_tokens
+
+    def pieces(block: str, separators: List[str]) -> List[str]:
+        if count(block) <= max_tokens or not separators:
+            return [block]
+        parts = [p for p in re.split(separators[0], block) if p.strip()]
+        if len(parts) == 1:
+            return pieces(block, separators[1:])
+        return [piece for part in parts for piece in pieces(part, separators[1:])]
+
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text.strip()):
+        if paragraph.strip():
+            units.extend(pieces(paragraph, [r"\n", r"(?<=[.!?])\s+"]))
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for unit in units:
+        unit_tokens = count(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+# Verbs and connectives that open a change request ("Rename X to Y", "Also ...")
+_EDIT_OPENERS = {
+    "add", "also", "remove", "delete", "drop", "rename", "change", "update",
+    "replace", "make", "move", "merge", "split", "include", "exclude", "allow",
+    "let", "support", "require", "limit", "restrict", "extend", "modify",
+    "adjust", "edit", "revise", "refine", "instead", "plus", "and", "but",
+    "don't",
+}
+# Leading words skipped before looking for an opener ("Could you please add ...")
+_EDIT_FILLERS = {"please", "can", "could", "would", "will", "you", "ok", "okay", "now", "then", "so"}
+# Phrases that refer to the existing specification or change it in place
+_EDIT_REFERENCE = re.compile(
+    r"\b(?:the|this|that|these|your|current|existing) (?:spec|specs|specification|design|terms?|features?|constraints?)\b"
+    r"|\binstead of\b|\bas well\b|\bno longer\b|\brename\b|\bremove\b",
+    re.IGNORECASE,
+)
+# Phrases that introduce a new product rather than a change to the current one
+_NEW_PRODUCT = re.compile(
+    r"\b(?:build|design|create|develop|make|write|want|need)\s+(?:me\s+)?(?:an?|the)\s+(?:new\s+|simple\s+|small\s+)?"
+    r"(?:[\w-]+\s+){0,3}?(?:app|application|tool|system|platform|service|website|site|game|bot|program)\b"
+    r"|^\s*(?:an?|my|our)\s+(?:[\w-]+\s+){0,3}?(?:app|application|tool|system|platform|service|website|site|game|bot|program)\b",
+    re.IGNORECASE,
+)
+
+
+def is_change_request(message: str, specs: str) -> bool:
+    """Check whether a message asks to change an existing specification.
+
+    A change request opens with an edit verb or connective, or refers to the
+    specification or one of its terms or features by name, and does not
+    introduce a new product. Messages that give no such signal are not
+    change requests, so they are designed from scratch.
+
+    Args:
+        message: Follow-up message
+        specs: Current specification
+
+    Returns:
+        True if the message explicitly asks for a change
+    """
+    if _NEW_PRODUCT.search(message):
+        return False
+    words = re.findall(r"[a-z']+", message.lower())
+    while words and words[0] in _EDIT_FILLERS:
+        words.pop(0)
+    if not words:
+        return False
+    if words[0] in _EDIT_OPENERS or _EDIT_REFERENCE.search(message):
+        return True
+    spec = parse_spec(specs)
+    names = [term.name for term in spec.terms] + [item.title for item in spec.features if item.title]
+    return any(
+        re.search(rf"\b{re.escape(name)}\b", message) for name in names if name[:1].isupper()
+    )
@@ -0,0 +1,482 @@
+"""HTTP serving mode: chat and design-spec endpoints with SSE streaming.
+
+One asyncio event loop serves every connection, sharing one compiled graph
+per endpoint (and the prompt loaders they hold). Turns run on the async
+graph API, so a slow provider ties up no threads.
+
+Admission control keeps tail latency predictable under load: at most
+``workers`` turns run at once, up to ``queue_size`` more wait for a slot
+(each at most ``queue_timeout`` seconds), and each client may have at most
+``per_client`` requests in flight. Anything beyond that is answered
+immediately with 429 and a Retry-After estimate instead of piling up.
+
+Endpoints:
+    POST /v1/chat    {"message", "history"?, "specs"?, "session"?, "stream"?}
+    POST /v1/design  {"message", "history"?, "previous_specs"?, "session"?, "stream"?}
+    GET  /health     admission state
+    GET  /metrics    per-stage metrics in the Prometheus text format
+
+With ``"stream": true`` the response is a text/event-stream of ``stage``,
+``token`` and a final ``result`` (or ``error``) event; otherwise a JSON
+object with intent, response, specs, history and the turn's metrics.
+Clients are identified by their address. Behind a reverse proxy listed in
+SERVE_TRUSTED_PROXIES, or with the X-Client-Token header matching
+SERVE_CLIENT_TOKEN, the X-Client-Id header names the client instead; from
+anyone else it is ignored, so callers cannot pick a fresh identity per
+request to get around the per-client limit.
+"""
+
+import asyncio
+import hmac
+import json
+import math
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, suppress
+from http import HTTPStatus
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+from sublang.utils import config, llm, metrics
+
+# Largest accepted request head and body
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 4 * 1024 * 1024
+
+ENDPOINTS = {"/v1/chat": "chat", "/v1/design": "design"}
+
+
+class HttpError(Exception):
+    """Error answered with a JSON body ``{"error": message}``."""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class AdmissionControl:
+    """Bounded concurrency, bounded queue and per-client in-flight limits."""
+
+    def __init__(self, workers: int, queue_size: int, per_client: int, queue_timeout: float):
+        """Initialize the limits.
+
+        Args:
+            workers: Turns allowed to run at once
+            queue_size: Requests allowed to wait for a running slot
+            per_client: Requests in flight (running or queued) per client
+            queue_timeout: Longest wait for a slot, in seconds
+        """
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.per_client = max(1, per_client)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(self.workers)
+        self._clients: Dict[str, int] = defaultdict(int)
+        self._turn_seconds = 5.0  # Moving average of turn durations
+
+    def retry_after(self) -> int:
+        """Estimate the seconds until a slot frees up."""
+        return max(1, math.ceil(self._turn_seconds * (self.waiting + 1) / self.workers))
+
+    def _reject(self, message: str) -> HttpError:
+        self.rejected += 1
+        return HttpError(
+            HTTPStatus.TOO_MANY_REQUESTS, message, {"Retry-After": str(self.retry_after())}
+        )
+
+    @asynccontextmanager
+    async def slot(self, client: str) -> AsyncIterator[None]:
+        """Hold a running slot for the duration of a turn.
+
+        Args:
+            client: Client identifier
+
+        Raises:
+            HttpError: 429 when the client or the server is saturated
+        """
+        if self._clients[client] >= self.per_client:
+            raise self._reject("too many concurrent requests from this client")
+        # Counters change before any await, so concurrent arrivals see each other
+        if self.active + self.waiting >= self.workers + self.queue_size:
+            raise self._reject("server is at capacity")
+
+        self._clients[client] += 1
+        try:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("timed out waiting for a free slot")
+            finally:
+                self.waiting -= 1
+
+            self.active += 1
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.active -= 1
+                self._semaphore.release()
+                self._turn_seconds += 0.2 * (time.perf_counter() - started - self._turn_seconds)
+        finally:
+            self._clients[client] -= 1
+            if not self._clients[client]:
+                del self._clients[client]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the current admission state."""
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "rejected": self.rejected,
+            "clients": len(self._clients),
+        }
+
+
+def _result_payload(result: Dict[str, Any], turn_metrics: metrics.MetricsRecorder) -> Dict[str, Any]:
+    """Select the fields of a graph result returned to clients."""
+    return {
+        "intent": result.get("intent", ""),
+        "response": result.get("response", ""),
+        "specs": result.get("specs", ""),
+        "history": result.get("history", []),
+        "metrics": turn_metrics.to_json(),
+    }
+
+
+def _sse(event: Dict[str, Any]) -> bytes:
+    """Encode an event as a server-sent event named after its type."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode()
+
+
+class SubLangServer:
+    """Asyncio HTTP server sharing compiled graphs across requests."""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        per_client: Optional[int] = None,
+        queue_timeout: Optional[float] = None
+    ):
+        """Initialize the server; limits default to the SERVE_* settings.
+
+        Args:
+            workers: Turns allowed to run at once
+            queue_size: Requests allowed to wait for a running slot
+            per_client: Requests in flight per client
+            queue_timeout: Longest wait for a slot, in seconds
+        """
+        self.admission = AdmissionControl(
+            workers if workers is not None else config.serve_workers,
+            queue_size if queue_size is not None else config.serve_queue,
+            per_client if per_client is not None else config.serve_per_client,
+            queue_timeout if queue_timeout is not None else config.serve_queue_timeout,
+        )
+        self.trusted_proxies: Set[str] = set(config.serve_trusted_proxies)
+        self._graphs: Dict[Tuple[str, bool], Any] = {}
+        self._busy_sessions: Set[str] = set()
+        self.server: Optional[asyncio.Server] = None
+
+    def _graph(self, kind: str, stateful: bool):
+        """Get the shared compiled graph of an endpoint, compiling it once."""
+        key = (kind, stateful)
+        graph = self._graphs.get(key)
+        if graph is None:
+            checkpointer = None
+            if stateful:
+                from sublang.utils.session_store import get_session_store
+                checkpointer = get_session_store()
+            if kind == "chat":
+                import sublang.chatbot as chatbot
+                graph = chatbot.create(checkpointer)
+            else:
+                import sublang.design_specs as design_specs
+                graph = design_specs.create(checkpointer)
+            self._graphs[key] = graph
+        return graph
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> asyncio.Server:
+        """Compile the graphs, load LiteLLM and start listening.
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+
+        Returns:
+            The listening asyncio server
+        """
+        # Pay the one-off costs before the first request rather than during it
+        for kind in ENDPOINTS.values():
+            self._graph(kind, False)
+        await asyncio.to_thread(llm.get_litellm)
+        self.server = await asyncio.start_server(
+            self._handle_connection, host, port, limit=MAX_HEADER_BYTES
+        )
+        return self.server
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8000) -> None:
+        """Start the server and serve until cancelled."""
+        server = await self.start(host, port)
+        address = server.sockets[0].getsockname()
+        print(f"Serving on http://{address[0]}:{address[1]} "
+              f"({self.admission.workers} workers, queue {self.admission.queue_size}, "
+              f"{self.admission.per_client} per client)", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    async def _read_request(
+        self,
+        reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """Read one request; None if the client closed the connection first."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "request head too large")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+
+        if "transfer-encoding" in headers:
+            raise HttpError(HTTPStatus.LENGTH_REQUIRED, "chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "request body too large")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _send(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: bytes,
+        content_type: str = "application/json",
+        headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        """Write a complete response (connections are closed after each one)."""
+        lines = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Connection: close",
+        ]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        await self._send(writer, status, json.dumps(payload, ensure_ascii=False).encode(),
+                         headers=headers)
+
+    def _client_id(self, address: str, headers: Dict[str, str]) -> str:
+        """Identify the client of a request for the per-client limit.
+
+        Args:
+            address: Peer address of the connection
+            headers: Request headers (lowercase names)
+
+        Returns:
+            The X-Client-Id header if the peer is a trusted proxy or the
+            request carries the client token, else the peer address
+        """
+        claimed = headers.get("x-client-id")
+        if not claimed:
+            return address
+        token = config.serve_client_token
+        if address in self.trusted_proxies or (
+            token and hmac.compare_digest(headers.get("x-client-token", ""), token)
+        ):
+            return claimed
+        return address
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        started = time.perf_counter()
+        peer = writer.get_extra_info("peername")
+        client = peer[0] if peer else "unknown"
+        request_line = "-"
+        status = HTTPStatus.OK
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                return
+            method, path, headers, body = request
+            request_line = f"{method} {path}"
+            client = self._client_id(client, headers)
+            await self._dispatch(method, path, body, client, writer)
+        except HttpError as e:
+            status = e.status
+            with suppress(ConnectionError):
+                await self._send_json(writer, e.status, {"error": e.message}, e.headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            status = 499  # Client went away
+        except Exception as e:
+            status = HTTPStatus.INTERNAL_SERVER_ERROR
+            print(f"Error serving {request_line}: {e}")
+            with suppress(ConnectionError):
+                await self._send_json(writer, status, {"error": str(e)})
+        finally:
+            writer.close()
+            with suppress(Exception):
+                await writer.wait_closed()
+            if request_line != "-":
+                print(f"{client} {request_line} {int(status)} "
+                      f"{time.perf_counter() - started:.2f}s", flush=True)
+
+    async def _dispatch(
+        self,
+        method: str,
+        path: str,
+        body: bytes,
+        client: str,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        if path == "/health":
+            await self._send_json(writer, HTTPStatus.OK, {"status": "ok", **self.admission.stats()})
+            return
+        if path == "/metrics":
+            await self._send(writer, HTTPStatus.OK, metrics.totals.to_prometheus().encode(),
+                             content_type="text/plain; version=0.0.4")
+            return
+        kind = ENDPOINTS.get(path)
+        if kind is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"unknown path {path}")
+        if method != "POST":
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, "use POST", {"Allow": "POST"})
+
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "body must be JSON")
+        if not isinstance(request, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "body must be a JSON object")
+        message = request.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise HttpError(HTTPStatus.BAD_REQUEST, "message is required")
+        history = request.get("history")
+        if history is not None and not isinstance(history, list):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "history must be a list of messages")
+        session = request.get("session")
+        if session is not None and not isinstance(session, str):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "session must be a string")
+
+        async with self.admission.slot(client), self._session(session):
+            await self._run(kind, request, message.strip(), history, session, writer)
+
+    @asynccontextmanager
+    async def _session(self, session: Optional[str]) -> AsyncIterator[None]:
+        """Allow one turn at a time per session; concurrent ones get 409."""
+        if not session:
+            yield
+            return
+        if session in self._busy_sessions:
+            raise HttpError(HTTPStatus.CONFLICT, "a turn of this session is already running")
+        self._busy_sessions.add(session)
+        try:
+            yield
+        finally:
+            self._busy_sessions.discard(session)
+
+    async def _run(
+        self,
+        kind: str,
+        request: Dict[str, Any],
+        message: str,
+        history: Optional[list],
+        session: Optional[str],
+        writer: asyncio.StreamWriter
+    ) -> None:
+        """Run one turn and write its JSON or SSE response."""
+        graph = self._graph(kind, bool(session))
+        specs = request.get("specs") if kind == "chat" else request.get("previous_specs")
+
+        with metrics.turn() as turn_metrics:
+            if not request.get("stream"):
+                if kind == "chat":
+                    import sublang.chatbot as chatbot
+                    result = await chatbot.aprocess(graph, message, history, specs, thread_id=session)
+                else:
+                    import sublang.design_specs as design_specs
+                    result = await design_specs.aprocess(graph, message, history, specs, thread_id=session)
+                await self._send_json(writer, HTTPStatus.OK, _result_payload(result, turn_metrics))
+                return
+
+            if kind == "chat":
+                import sublang.chatbot as chatbot
+                events = chatbot.aprocess_stream(graph, message, history, specs, thread_id=session)
+            else:
+                import sublang.design_specs as design_specs
+                events = design_specs.aprocess_stream(graph, message, history, specs, thread_id=session)
+
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/event-stream\r\n"
+                b"Cache-Control: no-cache\r\n"
+                b"X-Accel-Buffering: no\r\n"
+                b"Connection: close\r\n\r\n"
+            )
+            try:
+                async for event in events:
+                    if event["type"] == "result":
+                        event = {"type": "result", "result": _result_payload(event["result"], turn_metrics)}
+                    writer.write(_sse(event))
+                    # Waiting for slow readers here bounds the buffered output
+                    await writer.drain()
+            except ConnectionError:
+                raise
+            except Exception as e:
+                print(f"Error in {kind} turn: {e}")
+                writer.write(_sse({"type": "error", "error": str(e)}))
+                await writer.drain()
+            finally:
+                # Stops the graph run when the client disconnected mid-stream
+                await events.aclose()
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    workers: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    per_client: Optional[int] = None,
+    queue_timeout: Optional[float] = None
+) -> None:
+    """Serve the chat and design endpoints until interrupted.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind
+        workers: Turns allowed to run at once (default: SERVE_WORKERS)
+        queue_size: Requests allowed to wait for a slot (default: SERVE_QUEUE)
+        per_client: Requests in flight per client (default: SERVE_PER_CLIENT)
+        queue_timeout: Longest wait for a slot in seconds (default: SERVE_QUEUE_TIMEOUT)
+    """
+    server = SubLangServer(workers, queue_size, per_client, queue_timeout)
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        print("Server stopped")
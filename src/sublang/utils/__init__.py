@@ -1,6 +1,7 @@
 """Utility modules for SubLang chatbot."""
 
 from .model_config import config
-from .prompt_loader import PromptLoader
+from .prompt_loader import PromptLoader, get_prompt_loader
+from . import llm, metrics
 
-__all__ = ["config", "PromptLoader"]
+__all__ = ["config", "PromptLoader", "get_prompt_loader", "llm", "metrics"]
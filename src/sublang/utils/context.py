@@ -0,0 +1,256 @@
+"""Token-budgeted conversation context with a rolling summary of older turns.
+
+Nodes pass the full conversation history through ``fit_history`` (or
+``afit_history``): the most recent messages that fit the model's history
+budget are kept verbatim, oversized messages are truncated, and everything
+older is folded into one summary message. Summaries are cached and extended
+incrementally, so a long session costs at most one short summarization call
+per turn and keeps a steady prompt size.
+"""
+
+import asyncio
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from .model_config import config
+from . import llm
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+TRUNCATION_MARK = "\n[... truncated ...]\n"
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below for a software design assistant. Keep "
+    "the product being designed, the decisions made, the names of terms, "
+    "features and constraints, and any open requests. Be concise; use plain "
+    "sentences or short bullets."
+)
+
+# Rolling summaries keyed by the hash chain of the summarized messages
+_summaries: Dict[str, str] = {}
+_summaries_lock = threading.Lock()
+_MAX_SUMMARIES = 256
+
+
+@lru_cache(maxsize=4096)
+def _count(text: str, model: str) -> int:
+    return llm.count_tokens(text, model)
+
+
+def message_tokens(message: Dict[str, str], model: Optional[str] = None) -> int:
+    """Count the tokens of one message, including a small per-message overhead.
+
+    Args:
+        message: Chat message
+        model: Model name (defaults to the configured model)
+
+    Returns:
+        Token count
+    """
+    return _count(str(message.get("content", "")), model or config.model) + 4
+
+
+def history_budget(model: Optional[str] = None) -> int:
+    """Get the token budget for conversation history.
+
+    Args:
+        model: Model name (defaults to the configured model)
+
+    Returns:
+        HISTORY_TOKENS when set, otherwise the smaller of 4000 tokens and an
+        eighth of the model's input window
+    """
+    if config.history_tokens:
+        return config.history_tokens
+    window = _input_window(model or config.model)
+    return min(4000, window // 8) if window else 4000
+
+
+@lru_cache(maxsize=32)
+def _input_window(model: str) -> Optional[int]:
+    """Get the model's input window from LiteLLM's model info, if known."""
+    try:
+        info = llm.get_litellm().get_model_info(model)
+        return info.get("max_input_tokens") or info.get("max_tokens")
+    except Exception:
+        return None
+
+
+def truncate_text(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Shorten a text to about max_tokens, keeping its beginning and end.
+
+    Args:
+        text: Text to shorten
+        max_tokens: Token budget
+        model: Model name (defaults to the configured model)
+
+    Returns:
+        The text itself if it fits, otherwise head and tail joined by a marker
+    """
+    model = model or config.model
+    tokens = _count(text, model)
+    if tokens <= max_tokens:
+        return text
+    keep = max(1, int(len(text) * max_tokens / tokens) // 2)
+    return text[:keep] + TRUNCATION_MARK + text[-keep:]
+
+
+def _chain(messages: List[Dict[str, str]], seed: str = "") -> List[str]:
+    """Hash chain over messages: element i identifies messages[:i + 1]."""
+    keys = []
+    digest = seed
+    for message in messages:
+        digest = hashlib.sha256(
+            f"{digest}\x00{message.get('role')}\x00{message.get('content')}".encode("utf-8")
+        ).hexdigest()
+        keys.append(digest)
+    return keys
+
+
+def _plan(
+    history: List[Dict[str, str]],
+    budget: int,
+    model: str
+) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """Split history into (older messages to summarize, recent messages to keep)."""
+    kept: List[Dict[str, str]] = []
+    used = 0
+    # Any single message may use at most half the budget
+    per_message = max(1, budget // 2)
+    for i in range(len(history) - 1, -1, -1):
+        message = history[i]
+        tokens = message_tokens(message, model)
+        if tokens > per_message:
+            message = dict(message, content=truncate_text(
+                str(message.get("content", "")), per_message, model))
+            tokens = per_message
+        if used + tokens > budget:
+            return history[:i + 1], kept
+        kept.insert(0, message)
+        used += tokens
+    return [], kept
+
+
+def _summary_request(
+    previous: str,
+    messages: List[Dict[str, str]],
+    model: str
+) -> List[Dict[str, str]]:
+    """Build the LLM messages extending a summary with more messages."""
+    per_message = max(1, config.summary_max_tokens * 2)
+    lines = [f"{m.get('role')}: {truncate_text(str(m.get('content', '')), per_message, model)}"
+             for m in messages]
+    content = "\n\n".join(lines)
+    if previous:
+        content = f"Summary so far:\n{previous}\n\nLater messages:\n{content}"
+    return [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": content},
+    ]
+
+
+def _summary_params() -> Dict:
+    params = config.get_model_params("summarize_history")
+    params["max_tokens"] = config.stage_settings["summarize_history"].get(
+        "max_tokens", config.summary_max_tokens
+    )
+    return params
+
+
+def _summary_progress(older: List[Dict[str, str]]) -> Tuple[List[str], int, str]:
+    """Find the longest already-summarized prefix of the older messages.
+
+    Returns:
+        (hash chain of older, length of the summarized prefix, its summary)
+    """
+    keys = _chain(older)
+    with _summaries_lock:
+        for i in range(len(keys) - 1, -1, -1):
+            summary = _summaries.get(keys[i])
+            if summary is not None:
+                return keys, i + 1, summary
+    return keys, 0, ""
+
+
+def _store_summary(key: str, summary: str) -> None:
+    with _summaries_lock:
+        if len(_summaries) >= _MAX_SUMMARIES:
+            _summaries.pop(next(iter(_summaries)))
+        _summaries[key] = summary
+
+
+def _assemble(summary: str, kept: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    if not summary:
+        return kept
+    return [{"role": "system", "content": SUMMARY_PREFIX + summary}] + kept
+
+
+def fit_history(
+    history: Optional[List[Dict[str, str]]],
+    budget: Optional[int] = None,
+    model: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """Fit conversation history into a token budget.
+
+    Args:
+        history: Full conversation history
+        budget: Token budget (defaults to history_budget(model))
+        model: Model name (defaults to the configured model)
+
+    Returns:
+        Recent messages that fit the budget, preceded by a summary message of
+        the older ones when CONTEXT_SUMMARY is enabled
+    """
+    if not history:
+        return []
+    model = model or config.model
+    older, kept = _plan(history, budget or history_budget(model), model)
+    if not older or not config.context_summary:
+        return kept
+
+    keys, done, summary = _summary_progress(older)
+    if done < len(older):
+        try:
+            summary = llm.completion(
+                _summary_request(summary, older[done:], model), **_summary_params()
+            ).strip()
+            _store_summary(keys[-1], summary)
+        except Exception as e:
+            print(f"Warning: Could not summarize earlier conversation: {e}")
+    return _assemble(summary, kept)
+
+
+async def afit_history(
+    history: Optional[List[Dict[str, str]]],
+    budget: Optional[int] = None,
+    model: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """Async variant of fit_history.
+
+    Args:
+        history: Full conversation history
+        budget: Token budget (defaults to history_budget(model))
+        model: Model name (defaults to the configured model)
+
+    Returns:
+        Recent messages that fit the budget, preceded by a summary message of
+        the older ones when CONTEXT_SUMMARY is enabled
+    """
+    if not history:
+        return []
+    model = model or config.model
+    # Token counting runs in a thread, off the event loop
+    older, kept = await asyncio.to_thread(_plan, history, budget or history_budget(model), model)
+    if not older or not config.context_summary:
+        return kept
+
+    keys, done, summary = _summary_progress(older)
+    if done < len(older):
+        try:
+            summary = (await llm.acompletion(
+                _summary_request(summary, older[done:], model), **_summary_params()
+            )).strip()
+            _store_summary(keys[-1], summary)
+        except Exception as e:
+            print(f"Warning: Could not summarize earlier conversation: {e}")
+    return _assemble(summary, kept)
@@ -0,0 +1,431 @@
+"""Shared LLM call layer used by every node."""
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .model_config import config
+from .llm_cache import LLMCache, make_cache_key
+from . import llm_resilience, llm_scheduler, metrics, profiling
+
+TokenCallback = Callable[[str], None]
+
+_cache: Optional[LLMCache] = None
+_litellm = None
+
+# Token usage reported by the provider, including prompt-cache reads
+_usage: Dict[str, int] = {
+    "calls": 0,
+    "prompt_tokens": 0,
+    "completion_tokens": 0,
+    "cached_tokens": 0,
+}
+_usage_lock = threading.Lock()
+
+
+def get_litellm():
+    """Import and configure LiteLLM on first use.
+
+    LiteLLM is slow to import, so it is kept out of module import time.
+
+    Returns:
+        The litellm module
+    """
+    global _litellm
+    if _litellm is None:
+        import litellm
+
+        config.configure_litellm()
+        _litellm = litellm
+    return _litellm
+
+
+def get_cache() -> Optional[LLMCache]:
+    """Get the process-wide completion cache.
+
+    Returns:
+        The shared LLMCache, or None if caching is disabled
+    """
+    global _cache
+    if not config.cache_enabled:
+        return None
+    if _cache is None:
+        _cache = LLMCache(
+            path=str(Path(config.cache_dir).expanduser() / "llm_cache.sqlite3"),
+            memory_entries=config.cache_memory_entries,
+            max_bytes=int(config.cache_max_mb * 1024 * 1024),
+            max_age=config.cache_max_age_days * 24 * 3600,
+        )
+    return _cache
+
+
+def _cache_lookup(
+    messages: List[Dict[str, Any]],
+    params: Dict[str, Any]
+) -> Tuple[Optional[str], Optional[str]]:
+    """Look up a request in the shared cache.
+
+    Only deterministic requests (temperature 0) are cached: replaying one
+    sampled answer would pin every later answer to it.
+
+    Args:
+        messages: Chat messages in OpenAI format
+        params: LiteLLM parameters
+
+    Returns:
+        Tuple of (cache key, cached content); both None when caching is
+        disabled or the request is sampled
+    """
+    temperature = params.get("temperature")
+    if temperature is None or temperature > 0:
+        return None, None
+    cache = get_cache()
+    if cache is None:
+        return None, None
+    key = make_cache_key(
+        params.get("model", ""),
+        params.get("temperature"),
+        params.get("max_tokens"),
+        messages,
+        params.get("response_format")
+    )
+    return key, cache.get(key)
+
+
+def _cache_store(key: Optional[str], content: Optional[str]) -> None:
+    """Store a fresh completion in the shared cache."""
+    cache = get_cache()
+    if cache is not None and key is not None and content:
+        cache.put(key, content)
+
+
+def supports_prompt_caching(model: str) -> bool:
+    """Check whether explicit prompt-cache markers should be sent for a model.
+
+    Controlled by config.prompt_caching: "true", "false", or "auto" to ask
+    LiteLLM's model map.
+
+    Args:
+        model: Model name
+
+    Returns:
+        True if cache_control markers should be added
+    """
+    if config.prompt_caching in ("true", "false"):
+        return config.prompt_caching == "true"
+    try:
+        return bool(get_litellm().supports_prompt_caching(model=model))
+    except Exception:
+        return False
+
+
+def mark_cache_prefix(
+    messages: List[Dict[str, Any]],
+    prefix_length: int,
+    model: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Mark the end of a shared message prefix for provider prompt caching.
+
+    For providers with explicit caching (e.g. Anthropic) the last prefix
+    message gets an ephemeral cache_control block; providers that cache
+    prefixes automatically (e.g. OpenAI) are left untouched.
+
+    Args:
+        messages: Chat messages
+        prefix_length: Number of leading messages shared between calls
+        model: Model name (defaults to the configured model)
+
+    Returns:
+        Messages, with the prefix boundary marked when supported
+    """
+    if prefix_length <= 0 or not supports_prompt_caching(model or config.model):
+        return messages
+    marked = list(messages)
+    boundary = marked[prefix_length - 1]
+    marked[prefix_length - 1] = {
+        "role": boundary["role"],
+        "content": [{
+            "type": "text",
+            "text": boundary["content"],
+            "cache_control": {"type": "ephemeral"},
+        }],
+    }
+    return marked
+
+
+def _record_usage(usage: Any) -> int:
+    """Accumulate provider token usage, including cached prompt tokens.
+
+    Returns:
+        Number of prompt tokens served from the provider's prompt cache
+    """
+    if usage is None:
+        return 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", None) if details else None) \
+        or getattr(usage, "cache_read_input_tokens", None) or 0
+    with _usage_lock:
+        _usage["calls"] += 1
+        _usage["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        _usage["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+        _usage["cached_tokens"] += cached
+    return cached
+
+
+def _record_call(
+    messages: List[Dict[str, Any]],
+    params: Dict[str, Any],
+    usage: Any,
+    content: str,
+    started: float,
+    first_token_at: Optional[float] = None
+) -> None:
+    """Record the metrics of a provider call under the current stage.
+
+    Token counts come from the provider's usage when reported (streamed
+    responses often omit it) and are estimated with LiteLLM otherwise.
+    """
+    ended = time.perf_counter()
+    cached = _record_usage(usage)
+    model = params.get("model", config.model)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    litellm = get_litellm()
+    # LiteLLM fills in zero usage when the provider reports none
+    if not prompt_tokens:
+        try:
+            prompt_tokens = litellm.token_counter(model=model, messages=messages)
+        except Exception:
+            prompt_tokens = 0
+    if not completion_tokens and content:
+        completion_tokens = count_tokens(content, model)
+    try:
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        )
+        cost = prompt_cost + completion_cost
+    except Exception:
+        cost = 0.0  # Model without pricing information
+
+    values: Dict[str, Any] = {
+        "calls": 1,
+        "llm_time": time.perf_counter() - started,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached,
+        "cost": cost,
+    }
+    if first_token_at is not None:
+        values["ttft"] = first_token_at - started
+        values["streamed_calls"] = 1
+    metrics.record(**values)
+    profiling.complete(
+        f"llm {metrics.current_stage()}", started, ended,
+        model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+    )
+
+
+def _record_cache(key: Optional[str], cached: Optional[str]) -> None:
+    """Record the completion cache status of a request (when caching is on)."""
+    if key is None:
+        return
+    if cached is not None:
+        metrics.record(cache_hits=1)
+    else:
+        metrics.record(cache_misses=1)
+
+
+def get_usage() -> Dict[str, int]:
+    """Get token usage accumulated over all LLM calls in this process.
+
+    Returns:
+        Dictionary with calls, prompt_tokens, completion_tokens and cached_tokens
+    """
+    with _usage_lock:
+        return dict(_usage)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count the tokens of a text with the model's tokenizer.
+
+    Args:
+        text: Text to measure
+        model: Model name (defaults to the configured model)
+
+    Returns:
+        Token count; a 4-characters-per-token estimate if LiteLLM cannot count
+    """
+    try:
+        return get_litellm().token_counter(model=model or config.model, text=text)
+    except Exception:
+        return len(text) // 4 + 1
+
+
+def _chunk_text(chunk: Any) -> Optional[str]:
+    """Extract the text delta from a streaming chunk."""
+    if not chunk.choices:
+        return None
+    return chunk.choices[0].delta.content
+
+
+def _attempt_params(params: Dict[str, Any], model: str) -> Dict[str, Any]:
+    """Parameters of one provider attempt; retries are left to llm_resilience."""
+    return {**params, "model": model, "max_retries": 0}
+
+
+class _Stream:
+    """Text, usage and first-token time collected from a streamed response."""
+
+    def __init__(self, on_token: TokenCallback):
+        self.on_token = on_token
+        self.parts: List[str] = []
+        self.usage: Any = None
+        self.first_token_at: Optional[float] = None
+
+    def add(self, chunk: Any) -> None:
+        self.usage = getattr(chunk, "usage", None) or self.usage
+        text = _chunk_text(chunk)
+        if text:
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self.parts.append(text)
+            self.on_token(text)
+
+    def failed(self, error: Exception) -> Exception:
+        """Get the error to raise; once tokens were passed on, it is not retried."""
+        if self.parts:
+            return llm_resilience.StreamInterrupted(f"stream failed after {len(self.parts)} chunks: {error}")
+        return error
+
+
+def completion(
+    messages: List[Dict[str, Any]],
+    on_token: Optional[TokenCallback] = None,
+    **params: Any
+) -> str:
+    """Get a completion text, serving repeated requests from the cache.
+
+    Provider calls are retried, hedged and failed over as configured (see
+    llm_resilience).
+
+    Args:
+        messages: Chat messages in OpenAI format
+        on_token: Optional callback; when given, the response is streamed
+            and each text delta is passed to it as it arrives
+        **params: LiteLLM parameters (model, temperature, max_tokens, ...)
+
+    Returns:
+        Content of the first choice
+    """
+    key, cached = _cache_lookup(messages, params)
+    _record_cache(key, cached)
+    if cached is not None:
+        if on_token:
+            on_token(cached)
+        return cached
+
+    litellm = get_litellm()
+    started = time.perf_counter()
+    prompt_tokens = llm_scheduler.estimate_tokens(messages)
+    if on_token is None:
+        def call(model: str) -> Any:
+            with llm_scheduler.slot(model, prompt_tokens, params.get("max_tokens")) as ticket:
+                sent = time.perf_counter()
+                response = litellm.completion(messages=messages, **_attempt_params(params, model))
+                profiling.request(sent, None, model)
+                ticket.settle(getattr(response, "usage", None))
+                return response
+
+        response, model = llm_resilience.run(call, params.get("model", config.model), hedge=True)
+        content = response.choices[0].message.content
+        _record_call(messages, {**params, "model": model}, getattr(response, "usage", None), content, started)
+    else:
+        def call_stream(model: str) -> _Stream:
+            stream = _Stream(on_token)
+            with llm_scheduler.slot(model, prompt_tokens, params.get("max_tokens")) as ticket:
+                sent = time.perf_counter()
+                try:
+                    for chunk in litellm.completion(messages=messages, stream=True, **_attempt_params(params, model)):
+                        stream.add(chunk)
+                except Exception as e:
+                    raise stream.failed(e) from e
+                profiling.request(sent, stream.first_token_at, model)
+                ticket.settle(stream.usage)
+            return stream
+
+        stream, model = llm_resilience.run(call_stream, params.get("model", config.model))
+        content = "".join(stream.parts)
+        _record_call(messages, {**params, "model": model}, stream.usage, content, started, stream.first_token_at)
+
+    _cache_store(key, content)
+    return content
+
+
+async def acompletion(
+    messages: List[Dict[str, Any]],
+    on_token: Optional[TokenCallback] = None,
+    **params: Any
+) -> str:
+    """Async variant of completion() built on litellm.acompletion.
+
+    Args:
+        messages: Chat messages in OpenAI format
+        on_token: Optional callback receiving streamed text deltas
+        **params: LiteLLM parameters (model, temperature, max_tokens, ...)
+
+    Returns:
+        Content of the first choice
+    """
+    # SQLite and tokenizer work runs in a thread so it does not hold up the
+    # event loop (and every other connection of the server)
+    key, cached = await asyncio.to_thread(_cache_lookup, messages, params)
+    _record_cache(key, cached)
+    if cached is not None:
+        if on_token:
+            on_token(cached)
+        return cached
+
+    litellm = get_litellm()
+    started = time.perf_counter()
+    prompt_tokens = llm_scheduler.estimate_tokens(messages)
+    if on_token is None:
+        async def call(model: str) -> Any:
+            async with llm_scheduler.aslot(model, prompt_tokens, params.get("max_tokens")) as ticket:
+                sent = time.perf_counter()
+                response = await litellm.acompletion(messages=messages, **_attempt_params(params, model))
+                profiling.request(sent, None, model)
+                ticket.settle(getattr(response, "usage", None))
+                return response
+
+        response, model = await llm_resilience.arun(call, params.get("model", config.model), hedge=True)
+        content = response.choices[0].message.content
+        await asyncio.to_thread(
+            _record_call, messages, {**params, "model": model}, getattr(response, "usage", None), content, started
+        )
+    else:
+        async def call_stream(model: str) -> _Stream:
+            stream = _Stream(on_token)
+            async with llm_scheduler.aslot(model, prompt_tokens, params.get("max_tokens")) as ticket:
+                sent = time.perf_counter()
+                try:
+                    response = await litellm.acompletion(
+                        messages=messages, stream=True, **_attempt_params(params, model)
+                    )
+                    async for chunk in response:
+                        stream.add(chunk)
+                except Exception as e:
+                    raise stream.failed(e) from e
+                profiling.request(sent, stream.first_token_at, model)
+                ticket.settle(stream.usage)
+            return stream
+
+        stream, model = await llm_resilience.arun(call_stream, params.get("model", config.model))
+        content = "".join(stream.parts)
+        await asyncio.to_thread(
+            _record_call, messages, {**params, "model": model}, stream.usage, content, started, stream.first_token_at
+        )
+
+    if key is not None:
+        await asyncio.to_thread(_cache_store, key, content)
+    return content
@@ -0,0 +1,254 @@
+"""Content-addressed cache for LLM completions with memory and SQLite tiers."""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Normalize chat messages so that insignificant differences share a key.
+
+    Line endings are unified and surrounding whitespace is stripped from
+    text content; keys other than role and content are ignored.
+
+    Args:
+        messages: Chat messages in OpenAI format
+
+    Returns:
+        Normalized list of messages
+    """
+    normalized = []
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            content = content.replace("\r\n", "\n").strip()
+        elif isinstance(content, list):
+            # Content blocks (e.g. with cache_control): keep only the text
+            content = "\n".join(
+                str(block.get("text", "")).replace("\r\n", "\n").strip()
+                for block in content
+                if isinstance(block, dict)
+            )
+        normalized.append({"role": message.get("role", ""), "content": content})
+    return normalized
+
+
+def make_cache_key(
+    model: str,
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    messages: List[Dict[str, Any]],
+    response_format: Optional[Dict[str, Any]] = None
+) -> str:
+    """Build the cache key for a completion request.
+
+    Args:
+        model: Model name
+        temperature: Sampling temperature
+        max_tokens: Maximum completion tokens, if set
+        messages: Chat messages sent to the model
+        response_format: Requested output format, if any
+
+    Returns:
+        Hex SHA-256 digest identifying the request
+    """
+    request: Dict[str, Any] = {
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "messages": normalize_messages(messages),
+    }
+    if response_format is not None:
+        # Only set when used, so keys of plain requests stay unchanged
+        request["response_format"] = response_format
+    payload = json.dumps(
+        request,
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Two-tier (memory LRU + SQLite) cache of completion texts."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        memory_entries: int = 256,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_age: float = 30 * 24 * 3600,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            path: SQLite file for the disk tier; None keeps the cache in memory only
+            memory_entries: Maximum number of entries in the memory tier
+            max_bytes: Maximum total size of cached values on disk
+            max_age: Maximum age of an entry in seconds
+        """
+        self.path = Path(path) if path else None
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if self.path:
+            self._open()
+
+    def _open(self) -> None:
+        """Open the SQLite database, disabling the disk tier on failure."""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_completions_accessed "
+                "ON completions (accessed)"
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: LLM disk cache disabled ({self.path}): {e}")
+            self._conn = None
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up a cached completion.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Cached completion text, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.max_age:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self.memory[key]
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT value, created FROM completions WHERE key = ?",
+                        (key,)
+                    ).fetchone()
+                    if row and now - row[1] <= self.max_age:
+                        self._conn.execute(
+                            "UPDATE completions SET accessed = ? WHERE key = ?",
+                            (now, key)
+                        )
+                        self._conn.commit()
+                        self._remember(key, row[0], row[1])
+                        self.disk_hits += 1
+                        return row[0]
+                except sqlite3.Error as e:
+                    print(f"Warning: LLM cache read failed: {e}")
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        """Store a completion in both tiers and apply eviction.
+
+        Args:
+            key: Cache key from make_cache_key
+            value: Completion text
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions "
+                    "(key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value.encode("utf-8")), now, now)
+                )
+                self._evict(now)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: LLM cache write failed: {e}")
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        """Insert into the memory tier, dropping least recently used entries."""
+        self.memory[key] = (value, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then least recently used ones over the size limit."""
+        self._conn.execute(
+            "DELETE FROM completions WHERE created < ?", (now - self.max_age,)
+        )
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM completions"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM completions ORDER BY accessed"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self) -> None:
+        """Remove all entries from both tiers."""
+        with self._lock:
+            self.memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM completions")
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and tier sizes.
+
+        Returns:
+            Dictionary of cache statistics
+        """
+        with self._lock:
+            disk_entries, disk_bytes = 0, 0
+            if self._conn is not None:
+                try:
+                    disk_entries, disk_bytes = self._conn.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions"
+                    ).fetchone()
+                except sqlite3.Error:
+                    pass
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_bytes,
+            }
@@ -0,0 +1,314 @@
+"""Retries, hedged requests and circuit-breaker failover for LLM calls.
+
+``run`` and ``arun`` wrap one provider request (a function of the model
+name) with:
+
+- retries with full-jitter exponential backoff on 429, 5xx, timeouts and
+  connection errors, honoring the provider's Retry-After
+- hedging: when a non-streamed call outlasts the LLM_HEDGE_PERCENTILE
+  latency of its model and stage, an identical second request is sent and
+  whichever answers first wins
+- a circuit breaker per model: after LLM_BREAKER_FAILURES consecutive
+  failures the model is skipped for LLM_BREAKER_COOLDOWN seconds and calls
+  go to FALLBACK_MODEL; retryable failures of the primary also fail over
+
+The per-call deadline is LiteLLM's ``timeout`` parameter (LLM_TIMEOUT or the
+stage's timeout).
+"""
+
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+from .model_config import config
+from .llm_scheduler import is_throttled, scheduler
+from . import metrics
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying (429 and 529 are rate limiting / overload)
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+# Exception class names of transient errors that carry no status code
+RETRYABLE_ERRORS = {"Timeout", "APITimeoutError", "APIConnectionError", "ServiceUnavailableError"}
+
+MAX_BACKOFF = 8.0
+MAX_RETRY_AFTER = 30.0
+
+
+class StreamInterrupted(RuntimeError):
+    """A streamed response failed after tokens were already passed on.
+
+    Not retried: the tokens cannot be taken back from the receiver.
+    """
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Check whether an error is transient (rate limit, overload, timeout, network)."""
+    if isinstance(error, StreamInterrupted):
+        return False
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS or status >= 500
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in RETRYABLE_ERRORS
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Get the Retry-After seconds of a provider error response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return min(float(headers.get("retry-after")), MAX_RETRY_AFTER)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def retry_delay(error: BaseException, attempt: int) -> float:
+    """Get the wait before a retry: full-jitter backoff, at least Retry-After.
+
+    Args:
+        error: Error of the failed attempt
+        attempt: Number of the failed attempt, from 0
+
+    Returns:
+        Seconds to wait
+    """
+    delay = random.uniform(0, min(MAX_BACKOFF, config.llm_retry_backoff * 2 ** attempt))
+    retry_after = _retry_after(error)
+    return max(delay, retry_after) if retry_after else delay
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker of one model."""
+
+    def __init__(self, threshold: int, cooldown: float):
+        """Initialize the breaker.
+
+        Args:
+            threshold: Consecutive failures that open the circuit (0 disables)
+            cooldown: Seconds the circuit stays open before a trial call
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Check whether calls may go to the model (closed, or open past the cooldown)."""
+        with self._lock:
+            return self.opened_at is None or time.monotonic() - self.opened_at >= self.cooldown
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.threshold and self.failures >= self.threshold:
+                # Reopened on every failure, so a failed trial waits a full cooldown
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Recent call latencies per (model, stage), for hedging thresholds."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: Tuple[str, str], seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key: Tuple[str, str], q: float, min_samples: int) -> Optional[float]:
+        """Get the q-th percentile latency, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+latencies = LatencyTracker()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def breaker(model: str) -> CircuitBreaker:
+    """Get the circuit breaker of a model."""
+    with _breakers_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker(config.breaker_failures, config.breaker_cooldown)
+        return _breakers[model]
+
+
+def _hedge_pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="sublang-llm")
+    return _executor
+
+
+def _candidates(model: str) -> List[str]:
+    """Models to try in order: the primary, then the fallback (first if the primary is open)."""
+    fallback = config.fallback_model
+    if not fallback or fallback == model:
+        return [model]
+    if not breaker(model).allow():
+        metrics.record(failovers=1)
+        return [fallback]
+    return [model, fallback]
+
+
+def _hedge_delay(model: str) -> Optional[float]:
+    # No duplicates while requests already queue for the rate limiter
+    if not config.llm_hedge_percentile or scheduler.saturated(model):
+        return None
+    return latencies.percentile(
+        (model, metrics.current_stage()), config.llm_hedge_percentile, config.llm_hedge_min_samples
+    )
+
+
+def _hedged(call: Callable[[str], T], model: str) -> T:
+    """Run a call, sending a duplicate if it outlasts the hedging threshold."""
+    delay = _hedge_delay(model)
+    if delay is None:
+        return call(model)
+    pool = _hedge_pool()
+    first = pool.submit(contextvars.copy_context().run, call, model)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    metrics.record(hedges=1)
+    pending = {first, pool.submit(contextvars.copy_context().run, call, model)}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # The slower request finishes in the background and is dropped
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+async def _ahedged(call: Callable[[str], Awaitable[T]], model: str) -> T:
+    """Async variant of _hedged; the losing request is cancelled."""
+    delay = _hedge_delay(model)
+    if delay is None:
+        return await call(model)
+    first = asyncio.ensure_future(call(model))
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    metrics.record(hedges=1)
+    pending = {first, asyncio.ensure_future(call(model))}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+    raise error
+
+
+def _should_retry(error: BaseException, model: str, attempt: int) -> bool:
+    """Record a failed attempt and decide whether to retry the same model."""
+    if not is_retryable(error):
+        return False
+    model_breaker = breaker(model)
+    # Rate limiting says we send too much, not that the model is down; the
+    # scheduler narrows its window and pauses for Retry-After instead
+    if not is_throttled(error):
+        model_breaker.failure()
+    # An open circuit ends the retries so the call can fail over
+    if attempt >= config.llm_retries or not model_breaker.allow():
+        return False
+    metrics.record(retries=1)
+    return True
+
+
+def run(call: Callable[[str], T], model: str, hedge: bool = False) -> Tuple[T, str]:
+    """Run a provider call with retries, hedging and failover.
+
+    Args:
+        call: Makes one request with the given model name
+        model: Primary model
+        hedge: Whether a slow request may be duplicated (not for streams,
+            whose tokens are already being passed on)
+
+    Returns:
+        Tuple of (call result, model that produced it)
+
+    Raises:
+        The last error when every attempt failed
+    """
+    error: Optional[BaseException] = None
+    for index, candidate in enumerate(_candidates(model)):
+        if index:
+            metrics.record(failovers=1)
+        for attempt in range(config.llm_retries + 1):
+            started = time.perf_counter()
+            try:
+                result = _hedged(call, candidate) if hedge else call(candidate)
+            except Exception as e:
+                error = e
+                if _should_retry(e, candidate, attempt):
+                    time.sleep(retry_delay(e, attempt))
+                    continue
+                if not is_retryable(e):
+                    raise
+                break
+            breaker(candidate).success()
+            if hedge:
+                latencies.add((candidate, metrics.current_stage()), time.perf_counter() - started)
+            return result, candidate
+    raise error
+
+
+async def arun(call: Callable[[str], Awaitable[T]], model: str, hedge: bool = False) -> Tuple[T, str]:
+    """Async variant of run.
+
+    Args:
+        call: Makes one request with the given model name
+        model: Primary model
+        hedge: Whether a slow request may be duplicated
+
+    Returns:
+        Tuple of (call result, model that produced it)
+    """
+    error: Optional[BaseException] = None
+    for index, candidate in enumerate(_candidates(model)):
+        if index:
+            metrics.record(failovers=1)
+        for attempt in range(config.llm_retries + 1):
+            started = time.perf_counter()
+            try:
+                result = await (_ahedged(call, candidate) if hedge else call(candidate))
+            except Exception as e:
+                error = e
+                if _should_retry(e, candidate, attempt):
+                    await asyncio.sleep(retry_delay(e, attempt))
+                    continue
+                if not is_retryable(e):
+                    raise
+                break
+            breaker(candidate).success()
+            if hedge:
+                latencies.add((candidate, metrics.current_stage()), time.perf_counter() - started)
+            return result, candidate
+    raise error
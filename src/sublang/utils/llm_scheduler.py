@@ -0,0 +1,633 @@
+"""Central admission of provider requests: rate limits, AIMD concurrency, priorities.
+
+Every provider request (each attempt, retry and hedge made by sublang.utils.llm)
+takes a slot from the limiter of its model before it is sent. A limiter
+applies:
+
+- token buckets for requests and tokens per minute (LLM_RPM / LLM_TPM, or a
+  per-model or per-provider entry of the RATE_LIMITS file); requests are
+  charged their estimated prompt plus completion tokens, corrected with the
+  provider's usage afterwards
+- an AIMD concurrency window up to LLM_CONCURRENCY: halved when the provider
+  answers 429/529 (and paused for its Retry-After), grown by one per window
+  of successful calls
+- priority classes: waiting interactive requests (CLI, server turns) are
+  admitted before batch ones (``prioritized("batch")``)
+
+Waiting requests are admitted in priority order when a slot is released, and
+by a timer thread when they wait for a bucket to refill.
+
+With LLM_SHARED_LIMITS (the default) the buckets, Retry-After pauses and the
+interactive requests waiting are kept in an SQLite file (``SharedLimits``),
+so that e.g. ``sublang batch`` running next to ``sublang serve`` spends the
+same budgets and holds its requests back while the server has interactive
+ones waiting. The concurrency window is adapted per process.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+from .model_config import config
+from . import metrics, profiling
+
+# Priority classes, most urgent first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+# Provider responses that mean "slow down"
+THROTTLED_STATUS = {429, 529}
+
+# With shared limits, waiting requests look at the shared state at least this
+# often (seconds), and other processes' waiting interactive requests count for
+# this long after they were last reported
+SHARED_POLL = 1.0
+DEMAND_TTL = 5.0
+
+_priority: ContextVar[str] = ContextVar("sublang_llm_priority", default="interactive")
+
+
+@contextmanager
+def prioritized(priority: str) -> Iterator[None]:
+    """Run the LLM calls of a block with a priority class.
+
+    Args:
+        priority: "interactive" or "batch"
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}'")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_throttled(error: BaseException) -> bool:
+    """Check whether an error is the provider asking to slow down."""
+    status = getattr(error, "status_code", None)
+    return status in THROTTLED_STATUS or type(error).__name__ == "RateLimitError"
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Roughly estimate the prompt tokens of messages (4 characters per token)."""
+    chars = 0
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            chars += sum(len(str(block.get("text", ""))) for block in content if isinstance(block, dict))
+        else:
+            chars += len(str(content))
+    return chars // 4 + 4 * len(messages)
+
+
+class TokenBucket:
+    """Continuously refilled budget of requests or tokens per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Get the seconds until amount is available (at most a full bucket)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        """Spend amount; may go negative when a charge is corrected upwards."""
+        self.level = min(self.capacity, self.level - amount)
+
+
+class SharedLimits:
+    """Token buckets, pauses and interactive demand shared across processes.
+
+    State lives in an SQLite file; every read-modify-write runs in an
+    immediate transaction, so concurrent processes never spend the same
+    budget twice. Times are wall-clock (``time.time``) since monotonic clocks
+    are not comparable between processes. After an SQLite error the state is
+    given up (``failed``) and the limiters go back to their local buckets.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open (or create) the shared state.
+
+        Args:
+            path: SQLite file
+        """
+        self.path = path
+        self.failed = False
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " name TEXT, kind TEXT, level REAL, updated REAL, PRIMARY KEY (name, kind))"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pauses (name TEXT PRIMARY KEY, until REAL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS demand ("
+            " name TEXT, pid INTEGER, waiting INTEGER, updated REAL, PRIMARY KEY (name, pid))"
+        )
+
+    def _transaction(self, work: Callable[[sqlite3.Connection, float], Any], default: Any) -> Any:
+        """Run work(conn, now) in an immediate transaction; default after an error."""
+        if self.failed:
+            return default
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    result = work(self._conn, time.time())
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self._conn.execute("COMMIT")
+                return result
+            except sqlite3.Error as e:
+                print(f"Warning: shared rate limits disabled ({self.path}): {e}")
+                self.failed = True
+                return default
+
+    def take(self, name: str, budgets: Dict[str, float], amounts: Dict[str, float]) -> float:
+        """Spend from the buckets of a limiter if all of them have enough.
+
+        Args:
+            name: Limiter name
+            budgets: Per-minute budget of each bucket kind ("requests", "tokens")
+            amounts: Amount to spend from each bucket kind
+
+        Returns:
+            0 if spent, else the seconds until the buckets should have enough
+        """
+        def work(conn: sqlite3.Connection, now: float) -> float:
+            levels = {}
+            delay = 0.0
+            for kind, per_minute in budgets.items():
+                row = conn.execute(
+                    "SELECT level, updated FROM buckets WHERE name = ? AND kind = ?", (name, kind)
+                ).fetchone()
+                level, updated = row if row else (per_minute, now)
+                level = min(per_minute, level + max(0.0, now - updated) * per_minute / 60.0)
+                missing = min(amounts[kind], per_minute) - level
+                if missing > 0:
+                    delay = max(delay, missing * 60.0 / per_minute)
+                levels[kind] = level
+            if delay > 0:
+                return delay
+            for kind, level in levels.items():
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, kind, level, updated) VALUES (?, ?, ?, ?)",
+                    (name, kind, level - amounts[kind], now),
+                )
+            return 0.0
+        return self._transaction(work, -1.0)
+
+    def adjust(self, name: str, kind: str, amount: float) -> None:
+        """Spend (or with a negative amount refund) from a bucket that was charged before."""
+        def work(conn: sqlite3.Connection, now: float) -> None:
+            conn.execute(
+                "UPDATE buckets SET level = level - ? WHERE name = ? AND kind = ?", (amount, name, kind)
+            )
+        self._transaction(work, None)
+
+    def pause(self, name: str, seconds: float) -> None:
+        """Hold back every process's requests of a limiter (Retry-After)."""
+        def work(conn: sqlite3.Connection, now: float) -> None:
+            conn.execute(
+                "INSERT INTO pauses (name, until) VALUES (?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET until = MAX(until, excluded.until)",
+                (name, now + seconds),
+            )
+        self._transaction(work, None)
+
+    def paused_for(self, name: str) -> float:
+        """Get the seconds left of a shared pause (0 if none)."""
+        def work(conn: sqlite3.Connection, now: float) -> float:
+            row = conn.execute("SELECT until FROM pauses WHERE name = ?", (name,)).fetchone()
+            return max(0.0, row[0] - now) if row else 0.0
+        return self._transaction(work, 0.0)
+
+    def report_demand(self, name: str, waiting: int) -> None:
+        """Report how many interactive requests of this process wait for a limiter."""
+        def work(conn: sqlite3.Connection, now: float) -> None:
+            if waiting:
+                conn.execute(
+                    "INSERT OR REPLACE INTO demand (name, pid, waiting, updated) VALUES (?, ?, ?, ?)",
+                    (name, self._pid, waiting, now),
+                )
+            else:
+                conn.execute("DELETE FROM demand WHERE name = ? AND pid = ?", (name, self._pid))
+        self._transaction(work, None)
+
+    def demand_elsewhere(self, name: str) -> bool:
+        """Check whether other processes have interactive requests waiting for a limiter."""
+        def work(conn: sqlite3.Connection, now: float) -> bool:
+            return conn.execute(
+                "SELECT 1 FROM demand WHERE name = ? AND pid != ? AND waiting > 0 AND updated > ?",
+                (name, self._pid, now - DEMAND_TTL),
+            ).fetchone() is not None
+        return self._transaction(work, False)
+
+
+class _Waiter:
+    """A request waiting for a slot."""
+
+    __slots__ = ("priority", "seq", "tokens", "wake", "granted", "cancelled", "admitted")
+
+    def __init__(self, priority: int, seq: int, tokens: int, wake: Callable[[], None]):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.wake = wake
+        self.granted = False
+        self.cancelled = False
+        self.admitted = 0.0
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Ticket:
+    """A granted slot; report the provider's token usage with ``settle``."""
+
+    __slots__ = ("limiter", "tokens")
+
+    def __init__(self, limiter: "Limiter", tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+
+    def settle(self, usage: Any) -> None:
+        """Correct the token charge with the provider's reported usage.
+
+        Args:
+            usage: Usage object of the response (ignored if None or empty)
+        """
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        if prompt or completion:
+            self.limiter.settle(self, prompt + completion, completion)
+
+
+class Limiter:
+    """Rate limits and AIMD concurrency window of one model or provider."""
+
+    def __init__(self, name: str, rpm: float, tpm: float, concurrency: int, condition: threading.Condition,
+                 shared: Optional[SharedLimits] = None):
+        """Initialize the limiter.
+
+        Args:
+            name: Model or provider the limits apply to
+            rpm: Requests per minute (0 = unlimited)
+            tpm: Prompt plus completion tokens per minute (0 = unlimited)
+            concurrency: Upper bound of the concurrency window
+            condition: Scheduler-wide lock and timer wake-up
+            shared: State shared with other processes, if any
+        """
+        self.name = name
+        self.budgets = {kind: float(limit) for kind, limit in (("requests", rpm), ("tokens", tpm)) if limit}
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.shared = shared
+        self._reported_demand = 0
+        self._reported_at = 0.0
+        self.max_concurrency = max(1, concurrency)
+        self.window = float(self.max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.completion_tokens = 500.0  # Moving average, for requests without max_tokens
+        self._last_decrease = 0.0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._condition = condition
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.cancelled)
+
+    def _shared(self) -> Optional[SharedLimits]:
+        return self.shared if self.shared is not None and not self.shared.failed else None
+
+    def _report_demand(self, shared: SharedLimits, now: float) -> None:
+        """Tell other processes how many interactive requests wait here."""
+        waiting = sum(1 for w in self._waiters if not w.cancelled and w.priority == PRIORITIES["interactive"])
+        if waiting != self._reported_demand or (waiting and now - self._reported_at >= SHARED_POLL):
+            shared.report_demand(self.name, waiting)
+            self._reported_demand = waiting
+            self._reported_at = now
+
+    def _admission_delay(self, head: _Waiter, now: float) -> float:
+        """Get the seconds until head may be admitted, spending its budget if 0."""
+        shared = self._shared()
+        if shared is None:
+            delay = max(
+                self.requests.delay(1, now) if self.requests else 0.0,
+                self.tokens.delay(head.tokens, now) if self.tokens else 0.0,
+            )
+            if delay <= 0:
+                if self.requests:
+                    self.requests.take(1)
+                if self.tokens:
+                    self.tokens.take(head.tokens)
+            return delay
+        paused = shared.paused_for(self.name)
+        if paused > 0:
+            return min(paused, SHARED_POLL)
+        # Other processes' interactive requests go before this process's batch ones
+        if head.priority > PRIORITIES["interactive"] and shared.demand_elsewhere(self.name):
+            return SHARED_POLL
+        if not self.budgets:
+            return 0.0
+        delay = shared.take(self.name, self.budgets, {"requests": 1, "tokens": head.tokens})
+        if delay < 0:  # The shared state just failed
+            return self._admission_delay(head, now)
+        # Other processes spend the same budget, so look again at least every SHARED_POLL
+        return min(delay, SHARED_POLL)
+
+    def dispatch(self) -> Optional[float]:
+        """Admit waiting requests in priority order; the caller holds the lock.
+
+        Returns:
+            Seconds until the first waiting request may be admitted by a
+            timer, or None if it waits for a release (or nothing waits)
+        """
+        now = time.monotonic()
+        delay = self._admit(now)
+        shared = self._shared()
+        if shared is not None:
+            self._report_demand(shared, now)
+            if delay is None and self._reported_demand:
+                delay = SHARED_POLL  # Keep the report fresh while waiting for a release
+        return delay
+
+    def _admit(self, now: float) -> Optional[float]:
+        """Admit what can be admitted now; see dispatch."""
+        while self._waiters:
+            head = self._waiters[0]
+            if head.cancelled:
+                heapq.heappop(self._waiters)
+                continue
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.in_flight >= int(self.window):
+                return None
+            delay = self._admission_delay(head, now)
+            if delay > 0:
+                return delay
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            head.admitted = now
+            head.granted = True
+            head.wake()
+        return None
+
+    def enqueue(self, priority: str, prompt_tokens: int, max_tokens: Optional[int],
+                wake: Callable[[], None]) -> _Waiter:
+        """Add a request to the queue and admit what can be admitted; caller holds the lock."""
+        completion = max_tokens or int(self.completion_tokens)
+        waiter = _Waiter(PRIORITIES[priority], next(self._seq), prompt_tokens + completion, wake)
+        heapq.heappush(self._waiters, waiter)
+        if self.dispatch() is not None:
+            self._condition.notify()
+        return waiter
+
+    def release(self, throttled: bool = False, retry_after: Optional[float] = None,
+                succeeded: bool = False, admitted: float = 0.0) -> None:
+        """Return a slot and adapt the concurrency window; caller holds the lock."""
+        self.in_flight = max(0, self.in_flight - 1)
+        now = time.monotonic()
+        if throttled:
+            # Halve once per overload: requests admitted before the last
+            # decrease were sent with the old window and say nothing new
+            if admitted >= self._last_decrease:
+                self.window = max(1.0, self.window / 2)
+                self._last_decrease = now
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+                shared = self._shared()
+                if shared is not None:
+                    shared.pause(self.name, retry_after)
+        elif succeeded:
+            self.window = min(float(self.max_concurrency), self.window + 1.0 / self.window)
+        if self.dispatch() is not None:
+            self._condition.notify()
+
+    def settle(self, ticket: Ticket, used: int, completion: int) -> None:
+        with self._condition:
+            shared = self._shared()
+            if shared is not None and "tokens" in self.budgets:
+                shared.adjust(self.name, "tokens", used - ticket.tokens)
+            elif self.tokens:
+                self.tokens.take(used - ticket.tokens)
+            self.completion_tokens += 0.2 * (completion - self.completion_tokens)
+
+
+class Scheduler:
+    """Limiters per model or provider, sharing one lock and timer thread."""
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._limiters: Dict[str, Limiter] = {}
+        self._keys: Dict[str, str] = {}  # Model name -> limiter key
+        self._timer: Optional[threading.Thread] = None
+        self._shared: Optional[SharedLimits] = None
+        self._shared_opened = False
+
+    def shared(self) -> Optional[SharedLimits]:
+        """Get the state shared with other processes (None with LLM_SHARED_LIMITS off)."""
+        if not self._shared_opened:
+            self._shared_opened = True
+            if config.llm_shared_limits:
+                path = Path(config.cache_dir).expanduser() / "llm_limits.sqlite3"
+                try:
+                    self._shared = SharedLimits(str(path))
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Warning: rate limits kept per process ({path}): {e}")
+        return self._shared
+
+    def limiter(self, model: str) -> Limiter:
+        """Get the limiter of a model: its own RATE_LIMITS entry, its provider's, or the defaults.
+
+        Args:
+            model: Model name, e.g. "gpt-4o-mini" or "anthropic/claude-3-5-haiku-latest"
+
+        Returns:
+            The shared Limiter
+        """
+        limits = config.rate_limits
+        key = self._keys.get(model)
+        if key is None:
+            key = model
+            if model not in limits:
+                provider = _provider(model)
+                key = provider if provider in limits else model
+            self._keys[model] = key
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            with self._condition:
+                limiter = self._limiters.get(key)
+                if limiter is None:
+                    settings = limits.get(key, {})
+                    limiter = Limiter(
+                        key,
+                        settings.get("rpm", config.llm_rpm),
+                        settings.get("tpm", config.llm_tpm),
+                        int(settings.get("concurrency", config.llm_concurrency)),
+                        self._condition,
+                        self.shared(),
+                    )
+                    self._limiters[key] = limiter
+                    self._start_timer()
+        return limiter
+
+    def _start_timer(self) -> None:
+        if self._timer is None:
+            self._timer = threading.Thread(target=self._run_timer, name="sublang-llm-scheduler", daemon=True)
+            self._timer.start()
+
+    def _run_timer(self) -> None:
+        """Admit requests that wait for buckets to refill or a pause to end."""
+        with self._condition:
+            while True:
+                delays = [d for d in (limiter.dispatch() for limiter in list(self._limiters.values()))
+                          if d is not None]
+                self._condition.wait(min(delays) if delays else None)
+
+    def saturated(self, model: str) -> bool:
+        """Check whether requests for a model are waiting for a slot."""
+        return self.limiter(model).waiting > 0
+
+    def _finish(self, limiter: Limiter, waiter: _Waiter, error: Optional[BaseException]) -> None:
+        # Imported here: llm_resilience imports this module
+        from .llm_resilience import _retry_after
+        throttled = error is not None and is_throttled(error)
+        if throttled:
+            metrics.record(rate_limited=1)
+        with self._condition:
+            limiter.release(
+                throttled=throttled,
+                retry_after=_retry_after(error) if throttled else None,
+                succeeded=error is None,
+                admitted=waiter.admitted,
+            )
+
+    @contextmanager
+    def slot(self, model: str, prompt_tokens: int, max_tokens: Optional[int] = None) -> Iterator[Ticket]:
+        """Hold a slot for one provider request, waiting for it if necessary.
+
+        Args:
+            model: Model the request goes to
+            prompt_tokens: Estimated prompt tokens
+            max_tokens: Completion token limit of the request, if any
+
+        Yields:
+            Ticket to settle with the response's usage
+        """
+        limiter = self.limiter(model)
+        started = time.perf_counter()
+        event = threading.Event()
+        with self._condition:
+            waiter = limiter.enqueue(_priority.get(), prompt_tokens, max_tokens, event.set)
+        try:
+            event.wait()
+        except BaseException:
+            self._abandon(limiter, waiter)
+            raise
+        self._record_wait(started)
+        error: Optional[BaseException] = None
+        try:
+            yield Ticket(limiter, waiter.tokens)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._finish(limiter, waiter, error)
+
+    @asynccontextmanager
+    async def aslot(self, model: str, prompt_tokens: int, max_tokens: Optional[int] = None) -> AsyncIterator[Ticket]:
+        """Async variant of slot; waiting does not block the event loop."""
+        limiter = self.limiter(model)
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        with self._condition:
+            waiter = limiter.enqueue(_priority.get(), prompt_tokens, max_tokens, wake)
+        try:
+            await granted
+        except BaseException:
+            self._abandon(limiter, waiter)
+            raise
+        self._record_wait(started)
+        error: Optional[BaseException] = None
+        try:
+            yield Ticket(limiter, waiter.tokens)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._finish(limiter, waiter, error)
+
+    def _abandon(self, limiter: Limiter, waiter: _Waiter) -> None:
+        """Withdraw a cancelled wait, returning the slot if it was just granted."""
+        with self._condition:
+            if waiter.granted:
+                limiter.release()
+            else:
+                waiter.cancelled = True
+
+    @staticmethod
+    def _record_wait(started: float) -> None:
+        ended = time.perf_counter()
+        if ended - started > 0.001:
+            metrics.record(queue_time=ended - started)
+            profiling.complete("queue", started, ended)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Get the state of each limiter.
+
+        Returns:
+            Mapping of limiter name to its window, in-flight and waiting counts
+        """
+        with self._condition:
+            return {
+                name: {
+                    "window": round(limiter.window, 2),
+                    "in_flight": limiter.in_flight,
+                    "waiting": limiter.waiting,
+                }
+                for name, limiter in self._limiters.items()
+            }
+
+
+def _provider(model: str) -> str:
+    """Get the provider of a model name (prefix, or LiteLLM's lookup)."""
+    if "/" in model:
+        return model.split("/", 1)[0]
+    try:
+        from .llm import get_litellm
+        return get_litellm().get_llm_provider(model)[1]
+    except Exception:
+        return ""
+
+
+scheduler = Scheduler()
+slot = scheduler.slot
+aslot = scheduler.aslot
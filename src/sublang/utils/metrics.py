@@ -0,0 +1,269 @@
+"""Local per-stage latency, token and cost metrics.
+
+Each graph node (and classify_and_route) is wrapped with ``measured`` to
+record its wall time; every LLM call made inside it is attributed to that
+stage by the LLM layer. Metrics accumulate per process and, inside a
+``turn()`` block, per turn. They can be exported as JSON or in the
+Prometheus text format.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterator, Optional
+from . import profiling
+
+
+@dataclass(slots=True)
+class StageMetrics:
+    """Counters of one stage."""
+    runs: int = 0
+    wall_time: float = 0.0
+    calls: int = 0
+    llm_time: float = 0.0  # Time spent waiting for provider responses
+    ttft: float = 0.0  # Sum of time-to-first-token over streamed calls
+    streamed_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+    retries: int = 0
+    hedges: int = 0  # Duplicate requests sent for slow calls
+    failovers: int = 0  # Calls moved to the fallback model
+    cache_hits: int = 0
+    cache_misses: int = 0
+    parse_failures: int = 0  # Stage outputs without the expected code block or JSON
+    queue_time: float = 0.0  # Time provider requests waited for the rate limiter
+    rate_limited: int = 0  # Provider requests answered with 429/529
+    lint_violations: int = 0  # Breaches of the spec formatting rules found by lint_specs
+
+    def add(self, other: "StageMetrics") -> None:
+        for name, value in asdict(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+
+class MetricsRecorder:
+    """Thread-safe collection of StageMetrics keyed by stage name."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, StageMetrics] = {}
+        self._lock = threading.Lock()
+
+    def update(self, stage: str, **values: Any) -> None:
+        """Add values to the counters of a stage.
+
+        Args:
+            stage: Stage name
+            **values: StageMetrics field increments
+        """
+        with self._lock:
+            metrics = self.stages.setdefault(stage, StageMetrics())
+            for name, value in values.items():
+                setattr(metrics, name, getattr(metrics, name) + value)
+
+    def snapshot(self) -> Dict[str, StageMetrics]:
+        """Get a copy of the counters, with a "total" entry over all stages."""
+        with self._lock:
+            stages = {stage: StageMetrics(**asdict(m)) for stage, m in self.stages.items()}
+        total = StageMetrics()
+        for metrics in stages.values():
+            total.add(metrics)
+        # Nested stages (e.g. design_specs contains the design nodes) would be
+        # counted twice in wall time; the total keeps the outermost only
+        total.wall_time = sum(m.wall_time for s, m in stages.items() if s in OUTER_STAGES) \
+            or total.wall_time
+        total.runs = 0
+        stages["total"] = total
+        return stages
+
+    def to_json(self) -> Dict[str, Dict[str, float]]:
+        """Get the metrics as a JSON-serializable dictionary.
+
+        Returns:
+            Mapping of stage name to its counters (seconds, tokens, USD)
+        """
+        result = {}
+        for stage, metrics in self.snapshot().items():
+            values = asdict(metrics)
+            values["ttft"] = metrics.ttft / metrics.streamed_calls if metrics.streamed_calls else None
+            values["wall_time"] = round(metrics.wall_time, 4)
+            values["llm_time"] = round(metrics.llm_time, 4)
+            values["cost"] = round(metrics.cost, 6)
+            values["queue_time"] = round(metrics.queue_time, 4)
+            del values["streamed_calls"]
+            result[stage] = values
+        return result
+
+    def to_prometheus(self, prefix: str = "sublang") -> str:
+        """Get the metrics in the Prometheus text exposition format.
+
+        Args:
+            prefix: Metric name prefix
+
+        Returns:
+            Exposition text
+        """
+        series = [
+            ("stage_runs_total", "counter", "Stage executions", "runs"),
+            ("stage_wall_seconds_total", "counter", "Stage wall time", "wall_time"),
+            ("llm_calls_total", "counter", "LLM calls", "calls"),
+            ("llm_seconds_total", "counter", "Time waiting for LLM responses", "llm_time"),
+            ("llm_ttft_seconds_total", "counter", "Sum of time to first token", "ttft"),
+            ("llm_streamed_calls_total", "counter", "Streamed LLM calls", "streamed_calls"),
+            ("llm_prompt_tokens_total", "counter", "Prompt tokens", "prompt_tokens"),
+            ("llm_completion_tokens_total", "counter", "Completion tokens", "completion_tokens"),
+            ("llm_cached_tokens_total", "counter", "Provider-cached prompt tokens", "cached_tokens"),
+            ("llm_cost_usd_total", "counter", "Estimated cost in USD", "cost"),
+            ("llm_retries_total", "counter", "LLM call retries", "retries"),
+            ("llm_hedges_total", "counter", "Hedged duplicate LLM requests", "hedges"),
+            ("llm_failovers_total", "counter", "LLM calls failed over to the fallback model", "failovers"),
+            ("llm_cache_hits_total", "counter", "Completion cache hits", "cache_hits"),
+            ("llm_cache_misses_total", "counter", "Completion cache misses", "cache_misses"),
+            ("stage_parse_failures_total", "counter", "Stage outputs that failed to parse", "parse_failures"),
+            ("llm_queue_seconds_total", "counter", "Time waiting for the LLM rate limiter", "queue_time"),
+            ("llm_rate_limited_total", "counter", "Provider requests answered with 429/529", "rate_limited"),
+            ("stage_lint_violations_total", "counter", "Spec formatting rule violations", "lint_violations"),
+        ]
+        stages = self.snapshot()
+        stages.pop("total")
+        lines = []
+        for name, kind, help_text, field_name in series:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for stage, metrics in sorted(stages.items()):
+                lines.append(f'{prefix}_{name}{{stage="{stage}"}} {getattr(metrics, field_name)}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Get a one-line-per-stage human-readable summary.
+
+        Returns:
+            Table text with wall time, TTFT, tokens, cost and cache status
+        """
+        lines = [f"{'stage':<20} {'time':>7} {'ttft':>6} {'in':>7} {'out':>6} "
+                 f"{'cost $':>9} {'cache':>6} {'retry':>5}"]
+        for stage, metrics in self.snapshot().items():
+            ttft = f"{metrics.ttft / metrics.streamed_calls:.2f}" if metrics.streamed_calls else "-"
+            cache = f"{metrics.cache_hits}/{metrics.cache_hits + metrics.cache_misses}"
+            lines.append(
+                f"{stage:<20} {metrics.wall_time:>6.2f}s {ttft:>6} {metrics.prompt_tokens:>7} "
+                f"{metrics.completion_tokens:>6} {metrics.cost:>9.5f} {cache:>6} {metrics.retries:>5}"
+            )
+        return "\n".join(lines)
+
+
+# Stages that contain other stages; their wall time is the turn's wall time
+OUTER_STAGES = {"classify_and_route", "generate_response", "design_specs"}
+
+# Process-wide metrics and the metrics of the current turn, if any
+totals = MetricsRecorder()
+_turn: ContextVar[Optional[MetricsRecorder]] = ContextVar("sublang_turn_metrics", default=None)
+_stage: ContextVar[str] = ContextVar("sublang_stage", default="other")
+
+
+def current_stage() -> str:
+    """Get the stage that LLM calls are currently attributed to."""
+    return _stage.get()
+
+
+@contextmanager
+def attributed(stage: str) -> Iterator[None]:
+    """Attribute the LLM calls made inside the block to a stage.
+
+    Args:
+        stage: Stage name
+    """
+    token = _stage.set(stage)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+def record(stage: Optional[str] = None, **values: Any) -> None:
+    """Add values to a stage's counters, in the totals and the current turn.
+
+    Args:
+        stage: Stage name (defaults to the current stage)
+        **values: StageMetrics field increments
+    """
+    stage = stage or _stage.get()
+    totals.update(stage, **values)
+    turn_metrics = _turn.get()
+    if turn_metrics is not None:
+        turn_metrics.update(stage, **values)
+
+
+@contextmanager
+def turn() -> Iterator[MetricsRecorder]:
+    """Collect the metrics of one conversation turn.
+
+    Yields:
+        Recorder receiving the metrics recorded inside the block
+    """
+    recorder = MetricsRecorder()
+    token = _turn.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _turn.reset(token)
+
+
+def measured(stage: str, func: Callable) -> Callable:
+    """Wrap a node function to record its wall time under a stage name.
+
+    LLM calls made inside the function are attributed to the same stage.
+    While profiling, the run is also a span of the trace (see profiling).
+
+    Args:
+        stage: Stage name
+        func: Sync or async node function
+
+    Returns:
+        Wrapped function of the same kind
+    """
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            token = _stage.set(stage)
+            started = time.perf_counter()
+            try:
+                with profiling.stage_section(stage):
+                    return await func(*args, **kwargs)
+            finally:
+                record(stage, runs=1, wall_time=time.perf_counter() - started)
+                _stage.reset(token)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        token = _stage.set(stage)
+        started = time.perf_counter()
+        try:
+            with profiling.stage_section(stage):
+                return func(*args, **kwargs)
+        finally:
+            record(stage, runs=1, wall_time=time.perf_counter() - started)
+            _stage.reset(token)
+    return wrapper
+
+
+def write(path: str, recorder: Optional[MetricsRecorder] = None) -> None:
+    """Write metrics to a file: Prometheus text for .prom/.txt, JSON otherwise.
+
+    Args:
+        path: Output file
+        recorder: Metrics to write (defaults to the process totals)
+    """
+    import json
+    recorder = recorder or totals
+    with open(path, 'w', encoding='utf-8') as f:
+        if path.endswith((".prom", ".txt")):
+            f.write(recorder.to_prometheus())
+        else:
+            json.dump(recorder.to_json(), f, indent=2)
+            f.write("\n")
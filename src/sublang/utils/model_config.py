@@ -1,12 +1,37 @@
 """Model configuration for the SubLang chatbot."""
 
+import json
 import os
-import litellm
-from typing import Optional
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Pipeline stages whose model settings can be overridden individually
+MODEL_STAGES = (
+    "classify_intent",
+    "general",
+    "extend_scenarios",
+    "extract_terms",
+    "add_features",
+    "add_constraints",
+    "refine_specs",
+    "summarize_history",
+)
+
+# Per-stage settings and their types
+STAGE_SETTINGS = {"model": str, "temperature": float, "max_tokens": int, "timeout": float}
+
+
+def _read_stage_file(path: str) -> Dict[str, Any]:
+    """Read a stage settings file (TOML for .toml, JSON otherwise)."""
+    with open(Path(path).expanduser(), 'rb') as f:
+        if path.endswith(".toml"):
+            import tomllib
+            return tomllib.load(f)
+        return json.load(f)
+
 
 class ModelConfig:
     """Model configuration supporting multiple providers via LiteLLM."""
@@ -17,6 +42,14 @@ class ModelConfig:
         self.temperature: float = float(os.getenv("TEMPERATURE", "0.7"))
         max_tokens_env = os.getenv("MAX_TOKENS")
         self.max_tokens: Optional[int] = int(max_tokens_env) if max_tokens_env else None
+        # Deadline of each LLM call in seconds (0 = none)
+        self.timeout: Optional[float] = float(os.getenv("LLM_TIMEOUT", "120")) or None
+
+        # Per-stage overrides of model, temperature, max_tokens and timeout:
+        # read from the STAGE_CONFIG file, then from <STAGE>_<SETTING> variables
+        # (e.g. CLASSIFY_INTENT_MODEL), which take precedence
+        self.stage_config: Optional[str] = os.getenv("STAGE_CONFIG")
+        self.stage_settings: Dict[str, Dict[str, Any]] = self._load_stage_settings()
         
         # API keys (automatically detected by LiteLLM)
         self.openai_api_key: Optional[str] = os.getenv("OPENAI_API_KEY")
@@ -28,13 +61,188 @@ class ModelConfig:
         # Provider-specific configurations
         self.azure_api_base: Optional[str] = os.getenv("AZURE_API_BASE")
         self.azure_api_version: Optional[str] = os.getenv("AZURE_API_VERSION")
+
+        # Completion cache (memory + SQLite), used for temperature-0 requests only
+        self.cache_enabled: bool = os.getenv("LLM_CACHE", "true").lower() == "true"
+        self.cache_dir: str = os.getenv(
+            "LLM_CACHE_DIR", str(Path.home() / ".cache" / "sublang")
+        )
+        self.cache_memory_entries: int = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+        self.cache_max_mb: float = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+        self.cache_max_age_days: float = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30"))
+
+        # Provider prompt caching for the shared design-stage prefix: auto, true or false
+        self.prompt_caching: str = os.getenv("PROMPT_CACHING", "auto").lower()
+
+        # Follow-ups to a finished spec take the one-call refinement path
+        self.refine: bool = os.getenv("REFINE", "true").lower() == "true"
+        self.refine_max_words: int = int(os.getenv("REFINE_MAX_WORDS", "150"))
+
+        # Term, feature and constraint stages answer in JSON (response_format)
+        # validated locally and rendered to markdown by the last stage
+        self.structured_output: bool = os.getenv("STRUCTURED_OUTPUT", "false").lower() == "true"
+
+        # add_features and add_constraints answer with added, changed and removed
+        # items only; the pipeline applies them to the previous stage's specs
+        self.spec_deltas: bool = os.getenv("SPEC_DELTAS", "false").lower() == "true"
+
+        # Finished specs are checked against specs/dev/rules.md by a local
+        # lint_specs stage: "off", "report" (violations only) or "fix"
+        self.spec_lint: str = os.getenv("SPEC_LINT", "off").lower()
+
+        # New descriptions at least DESIGN_CACHE_THRESHOLD similar (word 3-gram
+        # Jaccard) to an earlier one reuse its finished specs (SQLite under LLM_CACHE_DIR);
+        # only first turns of a conversation, whose specs depend on the message alone
+        self.design_cache: bool = os.getenv("DESIGN_CACHE", "false").lower() == "true"
+        self.design_cache_threshold: float = float(os.getenv("DESIGN_CACHE_THRESHOLD", "0.9"))
+        self.design_cache_entries: int = int(os.getenv("DESIGN_CACHE_ENTRIES", "1000"))
+        self.design_cache_max_age_days: float = float(os.getenv("DESIGN_CACHE_MAX_AGE_DAYS", "30"))
+
+        # Failing calls are retried with jittered backoff on 429/5xx/timeouts; a
+        # call slower than the LLM_HEDGE_PERCENTILE latency of its stage gets a
+        # duplicate request (0 disables); after LLM_BREAKER_FAILURES consecutive
+        # failures a model is skipped for LLM_BREAKER_COOLDOWN seconds in favor
+        # of FALLBACK_MODEL
+        self.llm_retries: int = int(os.getenv("LLM_RETRIES", "2"))
+        self.llm_retry_backoff: float = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+        self.llm_hedge_percentile: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.llm_hedge_min_samples: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        self.fallback_model: Optional[str] = os.getenv("FALLBACK_MODEL") or None
+        self.breaker_failures: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+        self.breaker_cooldown: float = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+        # Provider requests per model (or per provider, see RATE_LIMITS) are held
+        # to LLM_RPM requests and LLM_TPM tokens per minute (0 = unlimited) and an
+        # adaptive concurrency window of at most LLM_CONCURRENCY that halves on 429s
+        self.llm_rpm: float = float(os.getenv("LLM_RPM", "0"))
+        self.llm_tpm: float = float(os.getenv("LLM_TPM", "0"))
+        self.llm_concurrency: int = int(os.getenv("LLM_CONCURRENCY", "32"))
+        self.rate_limits_file: Optional[str] = os.getenv("RATE_LIMITS")
+        self.rate_limits: Dict[str, Dict[str, float]] = self._load_rate_limits()
+        # Token buckets, Retry-After pauses and waiting interactive requests are
+        # shared with the other sublang processes (e.g. serve and batch) through
+        # an SQLite file under LLM_CACHE_DIR; the concurrency window stays per process
+        self.llm_shared_limits: bool = os.getenv("LLM_SHARED_LIMITS", "true").lower() == "true"
+
+        # Local intent classifier in front of the LLM classifier
+        self.local_intent: bool = os.getenv("LOCAL_INTENT", "true").lower() == "true"
+        self.local_intent_threshold: float = float(os.getenv("LOCAL_INTENT_THRESHOLD", "0.9"))
+        self.intent_log: Optional[str] = os.getenv("INTENT_LOG")
+
+        # Speculative scenario extension: when intent needs the LLM classifier and
+        # the local classifier calls the message a design request with at least
+        # SPECULATE_THRESHOLD confidence, extend_scenarios starts alongside classification
+        self.speculate: bool = os.getenv("SPECULATE", "false").lower() == "true"
+        self.speculate_threshold: float = float(os.getenv("SPECULATE_THRESHOLD", "0.7"))
+
+        # Expanded descriptions longer than SHARD_TOKENS are split into chunks whose
+        # terms and features are extracted in parallel (0, the default, disables sharding)
+        self.shard_tokens: int = int(os.getenv("SHARD_TOKENS", "0"))
+        self.shard_workers: int = int(os.getenv("SHARD_WORKERS", "4"))
+
+        # Conversation history is fitted into HISTORY_TOKENS (0 = derived from the
+        # model's input window); older turns are folded into a rolling summary
+        self.history_tokens: int = int(os.getenv("HISTORY_TOKENS", "0"))
+        self.context_summary: bool = os.getenv("CONTEXT_SUMMARY", "true").lower() == "true"
+        self.summary_max_tokens: int = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
+
+        # Durable sessions (--session / thread_id): SQLite checkpointer file,
+        # compressed size cap per session and idle eviction
+        self.session_store: str = os.getenv(
+            "SESSION_STORE", os.path.join(self.cache_dir, "sessions.sqlite3")
+        )
+        self.session_keep: int = int(os.getenv("SESSION_KEEP", "2"))
+        self.session_max_kb: float = float(os.getenv("SESSION_MAX_KB", "512"))
+        self.session_max_idle_days: float = float(os.getenv("SESSION_MAX_IDLE_DAYS", "30"))
+
+        # HTTP serving (sublang serve): concurrent turns, bounded wait queue,
+        # in-flight limit per client and the longest time a request may queue
+        self.serve_workers: int = int(os.getenv("SERVE_WORKERS", "8"))
+        self.serve_queue: int = int(os.getenv("SERVE_QUEUE", "32"))
+        self.serve_per_client: int = int(os.getenv("SERVE_PER_CLIENT", "2"))
+        self.serve_queue_timeout: float = float(os.getenv("SERVE_QUEUE_TIMEOUT", "30"))
+        # The X-Client-Id header names the client only when sent by one of these
+        # peer addresses (comma-separated) or with X-Client-Token set to the token
+        self.serve_trusted_proxies: List[str] = [
+            address.strip() for address in os.getenv("SERVE_TRUSTED_PROXIES", "").split(",")
+            if address.strip()
+        ]
+        self.serve_client_token: str = os.getenv("SERVE_CLIENT_TOKEN", "")
         
-        # Configure LiteLLM globally
-        self.configure_litellm()
+        # LiteLLM itself is configured on first use (see sublang.utils.llm),
+        # so that importing the config stays cheap
     
+    def _load_stage_settings(self) -> Dict[str, Dict[str, Any]]:
+        """Collect the per-stage overrides from the settings file and environment.
+
+        Returns:
+            Mapping of stage name to its overridden settings
+        """
+        raw: Dict[str, Dict[str, Any]] = {stage: {} for stage in MODEL_STAGES}
+        if self.stage_config:
+            try:
+                sections = _read_stage_file(self.stage_config)
+            except Exception as e:
+                print(f"Warning: Failed to read STAGE_CONFIG {self.stage_config}: {e}")
+                sections = {}
+            for stage, values in sections.items():
+                if stage not in raw or not isinstance(values, dict):
+                    print(f"Warning: Ignoring unknown stage '{stage}' in {self.stage_config}")
+                    continue
+                raw[stage].update(values)
+        for stage in MODEL_STAGES:
+            for name in STAGE_SETTINGS:
+                value = os.getenv(f"{stage.upper()}_{name.upper()}")
+                if value:
+                    raw[stage][name] = value
+
+        settings: Dict[str, Dict[str, Any]] = {}
+        for stage, values in raw.items():
+            settings[stage] = {}
+            for name, value in values.items():
+                if name not in STAGE_SETTINGS:
+                    print(f"Warning: Ignoring unknown setting '{name}' of stage '{stage}'")
+                    continue
+                try:
+                    settings[stage][name] = STAGE_SETTINGS[name](value)
+                except (TypeError, ValueError):
+                    print(f"Warning: Invalid {name} '{value}' for stage '{stage}'")
+        return settings
+
+    def _load_rate_limits(self) -> Dict[str, Dict[str, float]]:
+        """Read the per-model and per-provider limits of the RATE_LIMITS file.
+
+        Returns:
+            Mapping of model or provider name to its rpm, tpm and concurrency
+        """
+        if not self.rate_limits_file:
+            return {}
+        try:
+            sections = _read_stage_file(self.rate_limits_file)
+        except Exception as e:
+            print(f"Warning: Failed to read RATE_LIMITS {self.rate_limits_file}: {e}")
+            return {}
+        limits: Dict[str, Dict[str, float]] = {}
+        for name, values in sections.items():
+            if not isinstance(values, dict):
+                print(f"Warning: Ignoring rate limits of '{name}' in {self.rate_limits_file}")
+                continue
+            limits[name] = {}
+            for key, value in values.items():
+                if key not in ("rpm", "tpm", "concurrency"):
+                    print(f"Warning: Ignoring unknown rate limit '{key}' of '{name}'")
+                    continue
+                try:
+                    limits[name][key] = float(value)
+                except (TypeError, ValueError):
+                    print(f"Warning: Invalid {key} '{value}' for '{name}'")
+        return limits
+
     @staticmethod
     def configure_litellm() -> None:
         """Configure LiteLLM settings globally."""
+        import litellm
+
         litellm.set_verbose = False  # Set to True for debugging
 
         # Setup LangFuse tracing if enabled
@@ -49,8 +257,17 @@ class ModelConfig:
             except Exception as e:
                 print(f"Warning: Failed to enable LangFuse tracing: {e}")
 
-    def get_model_params(self) -> dict:
-        """Get model parameters for LiteLLM."""
+    def get_model_params(self, stage: Optional[str] = None) -> dict:
+        """Get model parameters for LiteLLM.
+
+        Args:
+            stage: Pipeline stage (see MODEL_STAGES); its overrides are
+                applied on top of the global settings
+
+        Returns:
+            LiteLLM parameters (model, temperature and, when set, max_tokens
+            and timeout)
+        """
         params = {
             "model": self.model,
             "temperature": self.temperature,
@@ -58,9 +275,17 @@ class ModelConfig:
         
         if self.max_tokens:
             params["max_tokens"] = self.max_tokens
+        if self.timeout:
+            params["timeout"] = self.timeout
+        if stage:
+            params.update(self.stage_settings.get(stage, {}))
             
         return params
 
+    def stage_model(self, stage: str) -> str:
+        """Get the model a pipeline stage runs on."""
+        return self.stage_settings.get(stage, {}).get("model", self.model)
+
 
 def get_langfuse_config():
     """Get LangFuse configuration for LangGraph if tracing is enabled."""
@@ -0,0 +1,251 @@
+"""Timeline (Chrome trace-event JSON) and CPU profiles of single turns.
+
+Inside ``profiled(trace_path)`` every stage, LLM call and traced local step
+is recorded as a complete ("X") event; the file opens in chrome://tracing or
+https://ui.perfetto.dev. LLM calls show the time spent waiting for the rate
+limiter ("queue"), then either "ttft" and "generation" (streamed) or
+"response" per provider request. Gaps between stage spans are LangGraph
+and other glue time. Each thread or asyncio task gets its own lane.
+
+With a cProfile path, CPU time (``time.thread_time``, so network waits do
+not count) of the calling thread and of every stage is profiled as well and
+dumped in pstats format (``python -m pstats``, snakeviz).
+"""
+
+import asyncio
+import cProfile
+import functools
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class Trace:
+    """Trace events of one turn."""
+
+    def __init__(self) -> None:
+        self.origin = time.perf_counter()
+        self.events: List[Dict[str, Any]] = []
+        self._lanes: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _lane(self) -> int:
+        """Get the lane (trace thread id) of the current asyncio task or thread."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = id(task) if task is not None else threading.get_ident()
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = len(self._lanes) + 1
+            name = task.get_name() if task is not None else threading.current_thread().name
+            self.events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": lane, "args": {"name": name}})
+        return lane
+
+    def add(self, name: str, category: str, start: float, end: float, **args: Any) -> None:
+        """Add a complete event.
+
+        Args:
+            name: Span name
+            category: Span category (e.g. "stage", "llm", "local")
+            start: Start time (time.perf_counter)
+            end: End time (time.perf_counter)
+            **args: Details shown with the span
+        """
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self.origin) * 1e6, 1),
+            "dur": round(max(0.0, end - start) * 1e6, 1),
+            "pid": 1,
+            "args": args,
+        }
+        with self._lock:
+            event["tid"] = self._lane()
+            self.events.append(event)
+
+    def write(self, path: str) -> None:
+        """Write the events as Chrome trace-event JSON."""
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event.get("ts", -1))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+            f.write("\n")
+
+
+class CpuProfile:
+    """cProfile profiles of the threads that run a turn, merged when written."""
+
+    def __init__(self) -> None:
+        self.profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def section(self) -> Iterator[None]:
+        """Profile the block unless the current thread is already profiled."""
+        if getattr(self._local, "active", False):
+            yield
+            return
+        profile = cProfile.Profile(time.thread_time)
+        self._local.active = True
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._local.active = False
+            with self._lock:
+                self.profiles.append(profile)
+
+    def write(self, path: str) -> None:
+        """Dump the merged profiles in pstats format."""
+        with self._lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("sublang_trace", default=None)
+_cpu: ContextVar[Optional[CpuProfile]] = ContextVar("sublang_cpu_profile", default=None)
+
+
+def complete(name: str, start: float, end: float, category: str = "llm", **args: Any) -> None:
+    """Record a span whose start and end are already known (no-op unless profiling).
+
+    Args:
+        name: Span name
+        start: Start time (time.perf_counter)
+        end: End time (time.perf_counter)
+        category: Span category
+        **args: Details shown with the span
+    """
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, category, start, end, **args)
+
+
+def request(sent: float, first_token_at: Optional[float], model: str) -> None:
+    """Record one provider request: TTFT and generation when streamed.
+
+    Args:
+        sent: Time the request was sent (after the rate limiter)
+        first_token_at: Time of the first streamed token, if any
+        model: Model the request went to
+    """
+    trace = _trace.get()
+    if trace is None:
+        return
+    ended = time.perf_counter()
+    if first_token_at is None:
+        trace.add("response", "llm", sent, ended, model=model)
+    else:
+        trace.add("ttft", "llm", sent, first_token_at, model=model)
+        trace.add("generation", "llm", first_token_at, ended, model=model)
+
+
+@contextmanager
+def span(name: str, category: str = "local", **args: Any) -> Iterator[None]:
+    """Record the block as a span (no-op unless profiling).
+
+    Args:
+        name: Span name
+        category: Span category
+        **args: Details shown with the span
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, category, started, time.perf_counter(), **args)
+
+
+@contextmanager
+def stage_section(stage: str) -> Iterator[None]:
+    """Record a graph node as a stage span and profile its CPU time."""
+    cpu = _cpu.get()
+    with span(stage, "stage"):
+        if cpu is None:
+            yield
+        else:
+            with cpu.section():
+                yield
+
+
+def traced(name: str) -> Callable:
+    """Decorate a local (CPU-bound) step to appear as a span when profiling.
+
+    Args:
+        name: Span name
+
+    Returns:
+        Decorator for sync functions
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _trace.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profiled(trace_path: Optional[str] = None, cprofile_path: Optional[str] = None,
+             name: str = "turn") -> Iterator[Optional[Trace]]:
+    """Profile the block, writing a Chrome trace and/or a cProfile dump.
+
+    Inside an active trace (or CPU profile) the block adds to the outer one
+    instead of starting its own.
+
+    Args:
+        trace_path: Chrome trace-event JSON file to write
+        cprofile_path: pstats file to write
+        name: Name of the root span
+
+    Yields:
+        The active trace, or None if not tracing
+    """
+    trace = Trace() if trace_path and _trace.get() is None else None
+    cpu = CpuProfile() if cprofile_path and _cpu.get() is None else None
+    trace_token = _trace.set(trace) if trace is not None else None
+    cpu_token = _cpu.set(cpu) if cpu is not None else None
+    started = time.perf_counter()
+    try:
+        if cpu is None:
+            yield _trace.get()
+        else:
+            with cpu.section():
+                yield _trace.get()
+    finally:
+        if cpu_token is not None:
+            _cpu.reset(cpu_token)
+        if trace_token is not None:
+            _trace.reset(trace_token)
+        if trace is not None:
+            trace.add(name, "turn", started, time.perf_counter())
+            try:
+                trace.write(trace_path)
+            except OSError as e:
+                print(f"Warning: could not write trace to {trace_path}: {e}")
+        if cpu is not None:
+            try:
+                cpu.write(cprofile_path)
+            except OSError as e:
+                print(f"Warning: could not write CPU profile to {cprofile_path}: {e}")
@@ -1,25 +1,39 @@
 """Prompt loader for managing chatbot prompts from text files."""
 
+import threading
+import time
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, Optional, Tuple
 
 
 class PromptLoader:
-    """Load and manage prompts from text files."""
-    
+    """Load and manage prompts from text files.
+
+    Prompts and the README-substituted GENERAL prompt are computed once and
+    reused until a file's mtime changes. Files are checked for changes at
+    most once per ``check_interval`` seconds.
+    """
+
+    check_interval: float = 1.0
+
     def __init__(self, prompts_dir: str = "prompts") -> None:
         """Initialize prompt loader.
-        
+
         Args:
             prompts_dir: Directory containing prompt text files
         """
         self.prompts_dir = Path(prompts_dir)
         self.prompts: Dict[str, str] = {}
+        self.version = 0
+        self._derived: Dict[Tuple, str] = {}
+        self._mtimes: Dict[Path, int] = {}
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
         self.load_prompts()
-    
+
     def load_prompts(self) -> None:
         """Load all .md files from the prompts directory.
-        
+
         Raises:
             FileNotFoundError: If prompts directory doesn't exist
         """
@@ -27,42 +41,82 @@ class PromptLoader:
             raise FileNotFoundError(
                 f"Prompts directory '{self.prompts_dir}' not found"
             )
-        
-        for prompt_file in self.prompts_dir.glob("*.md"):
-            prompt_name = prompt_file.stem.upper()
-            with open(prompt_file, 'r', encoding='utf-8') as f:
-                self.prompts[prompt_name] = f.read().strip()
-    
+
+        with self._lock:
+            prompts = {}
+            for prompt_file in self.prompts_dir.glob("*.md"):
+                prompt_name = prompt_file.stem.upper()
+                with open(prompt_file, 'r', encoding='utf-8') as f:
+                    prompts[prompt_name] = f.read().strip()
+            self.prompts = prompts
+            self._derived.clear()
+            self._mtimes = self._snapshot()
+            self._checked_at = time.monotonic()
+            self.version += 1
+
+    def _snapshot(self) -> Dict[Path, int]:
+        """Get the mtimes of all prompt files and the README."""
+        mtimes = {}
+        for path in list(self.prompts_dir.glob("*.md")) + [Path("README.md")]:
+            try:
+                mtimes[path] = path.stat().st_mtime_ns
+            except OSError:
+                continue
+        return mtimes
+
+    def _refresh(self) -> None:
+        """Reload prompts if any file was added, removed or modified."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            if self._snapshot() != self._mtimes:
+                self.load_prompts()
+
+    def _memoize(self, key: Tuple, build: Callable[[], str]) -> str:
+        """Return a derived prompt, building it once per prompt version."""
+        value = self._derived.get(key)
+        if value is None:
+            value = build()
+            self._derived[key] = value
+        return value
+
     def get_prompt(self, intent: str) -> str:
         """Get prompt by intent with dynamic content substitution.
-        
+
         Args:
             intent: Intent name to get prompt for
-            
+
         Returns:
             Prompt text for the given intent
         """
+        self._refresh()
         base_prompt = self.prompts.get(intent, self.prompts.get('GENERAL', ''))
-        
+
         # For GENERAL intent, substitute README content
         if intent == 'GENERAL' and '{readme_section}' in base_prompt:
-            readme_content = self._load_readme()
-            if readme_content:
-                formatted_readme = f"""
+            return self._memoize(("GENERAL",), lambda: self._with_readme(base_prompt))
+
+        return base_prompt
+
+    def _with_readme(self, base_prompt: str) -> str:
+        """Substitute the README section into the GENERAL prompt."""
+        readme_content = self._load_readme()
+        if readme_content:
+            formatted_readme = f"""
 ## Project Information (Optional Reference)
 The following is information about this project. Use this as context when users ask about the project, but for general questions unrelated to this project, just respond normally.
 
 {readme_content}"""
-            else:
-                formatted_readme = ""
-            
-            return base_prompt.replace('{readme_section}', formatted_readme)
-        
-        return base_prompt
-    
+        else:
+            formatted_readme = ""
+
+        return base_prompt.replace('{readme_section}', formatted_readme)
+
     def _load_readme(self) -> str:
         """Load README.md content from project root.
-        
+
         Returns:
             README content or empty string if not found
         """
@@ -74,12 +128,35 @@ The following is information about this project. Use this as context when users
         except Exception as e:
             print(f"Warning: Could not load README.md: {e}")
         return ""
-    
+
     def reload_prompts(self) -> None:
         """Reload prompts from files (useful for development)."""
-        self.prompts.clear()
         self.load_prompts()
 
-# Note: Intent classification is now handled by LLM instead of keywords
-# The INTENT_KEYWORDS dictionary has been removed as classification is now 
-# performed by the LLM using the classify_intent.md prompt
+
+# Process-wide registry: one loader per prompts directory
+_registry: Dict[Path, PromptLoader] = {}
+_registry_lock = threading.Lock()
+
+
+def get_prompt_loader(prompts_dir: str) -> PromptLoader:
+    """Get the shared PromptLoader for a prompts directory.
+
+    Args:
+        prompts_dir: Directory containing prompt text files
+
+    Returns:
+        The process-wide loader for that directory
+    """
+    key = Path(prompts_dir).resolve()
+    loader: Optional[PromptLoader] = _registry.get(key)
+    if loader is None:
+        with _registry_lock:
+            loader = _registry.get(key)
+            if loader is None:
+                loader = PromptLoader(str(key))
+                _registry[key] = loader
+    return loader
+
+# Note: Intent classification is handled by the local model in
+# sublang.chatbot.intent, falling back to the LLM with the classify_intent.md prompt
@@ -0,0 +1,468 @@
+"""Durable session store: a compact SQLite-backed LangGraph checkpointer."""
+
+import asyncio
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+
+class SessionStore(BaseCheckpointSaver):
+    """Checkpointer keeping the latest state of each session in SQLite.
+
+    Checkpoints are stored whole and zlib-compressed; only the newest
+    ``keep`` checkpoints of each session are retained. When a session's
+    checkpoint exceeds ``max_session_bytes``, the oldest history messages are
+    dropped from the stored copy. Sessions idle for longer than ``max_idle``
+    seconds are evicted.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        keep: int = 2,
+        max_session_bytes: int = 512 * 1024,
+        max_idle: float = 30 * 24 * 3600,
+    ) -> None:
+        """Initialize the store.
+
+        Args:
+            path: SQLite file; None keeps sessions in memory
+            keep: Checkpoints retained per session and namespace
+            max_session_bytes: Maximum compressed size of a stored checkpoint
+            max_idle: Seconds without activity before a session is evicted
+        """
+        super().__init__()
+        self.path = Path(path).expanduser() if path else None
+        self.keep = max(1, keep)
+        self.max_session_bytes = max_session_bytes
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._evicted_at = 0.0
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.path) if self.path else ":memory:", check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            " thread_id TEXT NOT NULL,"
+            " checkpoint_ns TEXT NOT NULL,"
+            " checkpoint_id TEXT NOT NULL,"
+            " parent_id TEXT,"
+            " type TEXT NOT NULL,"
+            " checkpoint BLOB NOT NULL,"
+            " metadata_type TEXT NOT NULL,"
+            " metadata BLOB NOT NULL,"
+            " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id));"
+            "CREATE TABLE IF NOT EXISTS writes ("
+            " thread_id TEXT NOT NULL,"
+            " checkpoint_ns TEXT NOT NULL,"
+            " checkpoint_id TEXT NOT NULL,"
+            " task_id TEXT NOT NULL,"
+            " idx INTEGER NOT NULL,"
+            " channel TEXT NOT NULL,"
+            " type TEXT NOT NULL,"
+            " value BLOB NOT NULL,"
+            " task_path TEXT NOT NULL,"
+            " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx));"
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " thread_id TEXT PRIMARY KEY,"
+            " updated REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated);"
+        )
+        self._conn.commit()
+        self.evict_idle()
+
+    # Serialization
+
+    def _dump(self, value: Any) -> Tuple[str, bytes]:
+        kind, data = self.serde.dumps_typed(value)
+        return kind, zlib.compress(data)
+
+    def _load(self, kind: str, data: bytes) -> Any:
+        return self.serde.loads_typed((kind, zlib.decompress(data)))
+
+    def _dump_checkpoint(self, checkpoint: Checkpoint) -> Tuple[str, bytes]:
+        """Serialize a checkpoint, trimming history to fit max_session_bytes."""
+        kind, data = self._dump(checkpoint)
+        values = checkpoint.get("channel_values") or {}
+        history = values.get("history")
+        if len(data) <= self.max_session_bytes or not isinstance(history, list):
+            return kind, data
+
+        # Drop the oldest round (user + assistant message) until it fits
+        trimmed = list(history)
+        while len(data) > self.max_session_bytes and trimmed:
+            trimmed = trimmed[2:]
+            kind, data = self._dump({
+                **checkpoint, "channel_values": {**values, "history": trimmed}
+            })
+        print(f"Warning: Session history trimmed to {len(trimmed)} messages to fit the size cap")
+        return kind, data
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row: Sequence) -> CheckpointTuple:
+        checkpoint_id, parent_id, kind, checkpoint, metadata_kind, metadata = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?"
+            " ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint=self._load(kind, checkpoint),
+            metadata=self._load(metadata_kind, metadata),
+            parent_config=({"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": parent_id,
+            }} if parent_id else None),
+            pending_writes=[
+                (task_id, channel, self._load(value_kind, value))
+                for task_id, channel, value_kind, value in writes
+            ],
+        )
+
+    # BaseCheckpointSaver interface
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get the requested checkpoint, or the latest one of the session.
+
+        Args:
+            config: Config with thread_id and optionally checkpoint_id
+
+        Returns:
+            Checkpoint tuple, or None if the session has no checkpoint
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        query = ("SELECT checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata"
+                 " FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?")
+        params: Tuple = (thread_id, checkpoint_ns)
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+        query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+            return self._tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List stored checkpoints, newest first.
+
+        Args:
+            config: Config selecting the session (None lists all sessions)
+            filter: Metadata values the checkpoints must match
+            before: Only list checkpoints older than this one
+            limit: Maximum number of checkpoints
+
+        Yields:
+            Checkpoint tuples
+        """
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint,"
+                 " metadata_type, metadata FROM checkpoints WHERE 1 = 1")
+        params: Tuple = ()
+        if config:
+            query += " AND thread_id = ?"
+            params += (config["configurable"]["thread_id"],)
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params += (config["configurable"]["checkpoint_ns"],)
+            if get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params += (get_checkpoint_id(config),)
+        if before and get_checkpoint_id(before):
+            query += " AND checkpoint_id < ?"
+            params += (get_checkpoint_id(before),)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            tuples = []
+            for thread_id, checkpoint_ns, *row in rows:
+                item = self._tuple(thread_id, checkpoint_ns, row)
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                tuples.append(item)
+                if limit is not None and len(tuples) >= limit:
+                    break
+        yield from tuples
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Store a checkpoint and drop the session's older ones.
+
+        Args:
+            config: Config of the parent checkpoint
+            checkpoint: Checkpoint to store
+            metadata: Checkpoint metadata
+            new_versions: Channel versions written by this step (unused,
+                checkpoints are stored whole)
+
+        Returns:
+            Config pointing at the stored checkpoint
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        kind, data = self._dump_checkpoint(checkpoint)
+        metadata_kind, meta = self._dump(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"],
+                 config["configurable"].get("checkpoint_id"), kind, data, metadata_kind, meta),
+            )
+            self._prune(thread_id, checkpoint_ns)
+            self._touch(thread_id)
+            self._conn.commit()
+        self._maybe_evict()
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Store the pending writes of a task.
+
+        Args:
+            config: Config of the checkpoint the writes belong to
+            writes: (channel, value) pairs
+            task_id: Task producing the writes
+            task_path: Path of the task
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            kind, data = self._dump(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id,
+                         WRITES_IDX_MAP.get(channel, idx), channel, kind, data, task_path))
+        # Special writes (errors, interrupts) are replaced; regular ones are kept
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) \
+            else "INSERT OR IGNORE"
+        with self._lock:
+            self._conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete a session.
+
+        Args:
+            thread_id: Session to delete
+        """
+        with self._lock:
+            self._delete(thread_id)
+            self._conn.commit()
+
+    # The async variants run the SQLite work in a thread so that it does not
+    # block the event loop
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Async variant of get_tuple."""
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ):
+        """Async variant of list."""
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Async variant of put."""
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Async variant of put_writes."""
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Async variant of delete_thread."""
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # Housekeeping
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Keep only the newest checkpoints (and their writes) of a session."""
+        stale = [row[0] for row in self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+            " ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep),
+        )]
+        for checkpoint_id in stale:
+            for table in ("checkpoints", "writes"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                )
+
+    def _touch(self, thread_id: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?)", (thread_id, time.time())
+        )
+
+    def _delete(self, thread_id: str) -> None:
+        for table in ("checkpoints", "writes", "sessions"):
+            self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def _maybe_evict(self) -> None:
+        """Evict idle sessions at most once a minute."""
+        if time.monotonic() - self._evicted_at >= 60:
+            self.evict_idle()
+
+    def evict_idle(self) -> int:
+        """Delete the sessions idle for longer than max_idle.
+
+        Returns:
+            Number of evicted sessions
+        """
+        self._evicted_at = time.monotonic()
+        with self._lock:
+            idle = [row[0] for row in self._conn.execute(
+                "SELECT thread_id FROM sessions WHERE updated < ?",
+                (time.time() - self.max_idle,),
+            )]
+            for thread_id in idle:
+                self._delete(thread_id)
+            self._conn.commit()
+        return len(idle)
+
+    def sessions(self) -> Dict[str, float]:
+        """Get the stored sessions.
+
+        Returns:
+            Mapping of thread_id to the time of its last update
+        """
+        with self._lock:
+            return dict(self._conn.execute("SELECT thread_id, updated FROM sessions"))
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Get the process-wide session store configured by SESSION_* settings.
+
+    Returns:
+        Shared SessionStore instance
+    """
+    global _store
+    if _store is None:
+        # Imported here to keep this module importable without the config
+        from .model_config import config
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore(
+                    config.session_store,
+                    keep=config.session_keep,
+                    max_session_bytes=int(config.session_max_kb * 1024),
+                    max_idle=config.session_max_idle_days * 24 * 3600,
+                )
+    return _store
+
+
+def thread_config(run_config: Dict[str, Any], thread_id: Optional[str]) -> Dict[str, Any]:
+    """Add a session's thread_id to a run config.
+
+    Args:
+        run_config: Run config (e.g. LangFuse callbacks)
+        thread_id: Session identifier, or None for a stateless run
+
+    Returns:
+        Run config selecting the session's checkpoints
+    """
+    if not thread_id:
+        return run_config
+    run_config = dict(run_config)
+    run_config["configurable"] = {**run_config.get("configurable", {}), "thread_id": thread_id}
+    return run_config
+
+
+def stored_values(graph, thread_id: Optional[str]) -> Dict[str, Any]:
+    """Get the last stored state of a session.
+
+    Args:
+        graph: Graph compiled with a checkpointer
+        thread_id: Session identifier, or None
+
+    Returns:
+        State values of the session's latest checkpoint (empty if none)
+    """
+    if not thread_id:
+        return {}
+    return dict(graph.get_state({"configurable": {"thread_id": thread_id}}).values or {})
+
+
+async def astored_values(graph, thread_id: Optional[str]) -> Dict[str, Any]:
+    """Async variant of stored_values."""
+    if not thread_id:
+        return {}
+    return dict((await graph.aget_state({"configurable": {"thread_id": thread_id}})).values or {})
@@ -0,0 +1,283 @@
+"""Near-duplicate text cache using MinHash signatures and LSH banding.
+
+Texts are reduced to sets of word 3-gram shingles. A MinHash signature of
+NUM_PERM values estimates the Jaccard similarity of two shingle sets; it is
+cut into BANDS bands whose hashes are indexed, so candidates are the stored
+texts sharing at least one band bucket. Candidates are verified with the
+exact Jaccard similarity of their shingles. Everything runs locally.
+"""
+
+import hashlib
+import json
+import random
+import re
+import sqlite3
+import struct
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+NUM_PERM = 128
+BANDS = 16  # 16 bands of 8 rows: pairs at Jaccard 0.8 collide with ~95% probability
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)  # Fixed seed: signatures must be stable across processes
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+@lru_cache(maxsize=64)
+def shingles(text: str) -> FrozenSet[int]:
+    """Get the hashed word 3-gram shingles of a text (case and punctuation ignored).
+
+    Args:
+        text: Text to shingle
+
+    Returns:
+        Set of 64-bit shingle hashes
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return frozenset(_hash64(word.encode()) for word in words)
+    return frozenset(
+        _hash64(" ".join(words[i:i + SHINGLE_WORDS]).encode())
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    )
+
+
+@lru_cache(maxsize=64)
+def _buckets(text: str) -> Tuple[int, ...]:
+    """Get the LSH band bucket of each band of a text's MinHash signature."""
+    hashes = shingles(text)
+    if not hashes:
+        return ()
+    signature = [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(struct.pack(f">{ROWS}Q", *rows), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, "big", signed=True))
+    return tuple(buckets)
+
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    """Get the Jaccard similarity of two shingle sets."""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class SimilarityCache:
+    """SQLite-backed cache returning values stored for near-identical texts."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: float = 0.9,
+        max_entries: int = 1000,
+        max_age: float = 30 * 24 * 3600,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            path: SQLite file; None keeps the cache in memory only
+            threshold: Minimum Jaccard similarity of a hit
+            max_entries: Maximum number of stored texts (least recently used evicted)
+            max_age: Maximum age of an entry in seconds
+        """
+        self.path = Path(path) if path else None
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = self._open()
+
+    def _open(self) -> sqlite3.Connection:
+        """Open the SQLite database, falling back to memory on failure."""
+        target = ":memory:"
+        if self.path:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                target = str(self.path)
+            except OSError as e:
+                print(f"Warning: similarity cache kept in memory ({self.path}): {e}")
+        try:
+            conn = sqlite3.connect(target, check_same_thread=False)
+            self._create(conn)
+        except sqlite3.Error as e:
+            print(f"Warning: similarity cache kept in memory ({target}): {e}")
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+            self._create(conn)
+        return conn
+
+    @staticmethod
+    def _create(conn: sqlite3.Connection) -> None:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " id INTEGER PRIMARY KEY,"
+            " namespace TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS bands ("
+            " band INTEGER NOT NULL,"
+            " bucket INTEGER NOT NULL,"
+            " entry INTEGER NOT NULL,"
+            " PRIMARY KEY (band, bucket, entry)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_entry ON bands (entry)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed)")
+        conn.commit()
+
+    def _candidates(self, text: str, namespace: str) -> List[Tuple[int, str, str, float]]:
+        buckets = _buckets(text)
+        if not buckets:
+            return []
+        pairs = ",".join("(?, ?)" for _ in buckets)
+        params: List[Any] = [value for band, bucket in enumerate(buckets) for value in (band, bucket)]
+        return self._conn.execute(
+            "SELECT DISTINCT e.id, e.text, e.value, e.created FROM bands b"
+            " JOIN entries e ON e.id = b.entry"
+            f" WHERE (b.band, b.bucket) IN (VALUES {pairs}) AND e.namespace = ?",
+            params + [namespace]
+        ).fetchall()
+
+    def _match(self, text: str, namespace: str) -> Optional[Tuple[int, str, float]]:
+        """Get the (entry id, stored value, similarity) of the most similar text."""
+        now = time.time()
+        target = shingles(text)
+        best: Optional[Tuple[int, str, float]] = None
+        with self._lock:
+            try:
+                candidates = self._candidates(text, namespace)
+            except sqlite3.Error as e:
+                print(f"Warning: similarity cache read failed: {e}")
+                return None
+        for entry, stored_text, value, created in candidates:
+            if now - created > self.max_age:
+                continue
+            similarity = jaccard(target, shingles(stored_text))
+            if similarity >= self.threshold and (best is None or similarity > best[2]):
+                best = (entry, value, similarity)
+        return best
+
+    def find(self, text: str, namespace: str = "") -> Optional[Tuple[Any, float]]:
+        """Find the value stored for the most similar text, without counting a lookup.
+
+        Args:
+            text: Text to match
+            namespace: Partition of the cache (e.g. a model/prompt fingerprint)
+
+        Returns:
+            Tuple of (stored value, similarity), or None if no stored text
+            reaches the threshold
+        """
+        match = self._match(text, namespace)
+        return (json.loads(match[1]), match[2]) if match else None
+
+    def get(self, text: str, namespace: str = "") -> Optional[Tuple[Any, float]]:
+        """Like find, counting a hit or miss and refreshing the entry's recency.
+
+        Args:
+            text: Text to match
+            namespace: Partition of the cache
+
+        Returns:
+            Tuple of (stored value, similarity), or None on a miss
+        """
+        match = self._match(text, namespace)
+        with self._lock:
+            if match is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            try:
+                self._conn.execute("UPDATE entries SET accessed = ? WHERE id = ?", (time.time(), match[0]))
+                self._conn.commit()
+            except sqlite3.Error:
+                pass
+        return json.loads(match[1]), match[2]
+
+    def put(self, text: str, value: Any, namespace: str = "") -> None:
+        """Store a JSON-serializable value for a text and apply eviction.
+
+        Args:
+            text: Text the value belongs to
+            value: Value to return for near-identical texts
+            namespace: Partition of the cache
+        """
+        buckets = _buckets(text)
+        if not buckets:
+            return
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False, sort_keys=True)
+        with self._lock:
+            try:
+                cursor = self._conn.execute(
+                    "INSERT INTO entries (namespace, text, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (namespace, text, payload, now, now)
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO bands (band, bucket, entry) VALUES (?, ?, ?)",
+                    [(band, bucket, cursor.lastrowid) for band, bucket in enumerate(buckets)]
+                )
+                self._evict(now)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: similarity cache write failed: {e}")
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then least recently used ones over the entry limit."""
+        stale = [row[0] for row in self._conn.execute(
+            "SELECT id FROM entries WHERE created < ? UNION"
+            " SELECT id FROM (SELECT id FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (now - self.max_age, self.max_entries)
+        )]
+        for entry in stale:
+            self._conn.execute("DELETE FROM bands WHERE entry = ?", (entry,))
+            self._conn.execute("DELETE FROM entries WHERE id = ?", (entry,))
+
+    def record_miss(self) -> None:
+        """Count a lookup that found nothing (when find was used to route)."""
+        with self._lock:
+            self.misses += 1
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._conn.execute("DELETE FROM bands")
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and the number of stored texts.
+
+        Returns:
+            Dictionary of cache statistics
+        """
+        with self._lock:
+            try:
+                entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            except sqlite3.Error:
+                entries = 0
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
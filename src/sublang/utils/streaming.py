@@ -0,0 +1,71 @@
+"""Stage and token events emitted by nodes while a graph is being streamed."""
+
+from typing import Any, Dict, Optional
+from langgraph.config import get_config, get_stream_writer
+from .llm import TokenCallback
+
+# Human-readable labels for the stage events
+STAGE_LABELS: Dict[str, str] = {
+    "classify_and_route": "classifying intent",
+    "generate_response": "generating response",
+    "extend_scenarios": "extending scenarios",
+    "extract_terms": "extracting terms",
+    "add_features": "adding features",
+    "add_constraints": "adding constraints",
+    "refine_specs": "refining specs",
+    "reuse_specs": "reusing specs of a near-identical description",
+    "shard_specs": "extracting terms and features in parallel chunks",
+    "lint_specs": "checking spec formatting",
+}
+
+# Key in the graph's configurable dict that turns on token streaming
+STREAM_TOKENS_KEY = "stream_tokens"
+
+
+def _writer() -> Optional[Any]:
+    """Get the LangGraph stream writer, or None outside a graph run."""
+    try:
+        return get_stream_writer()
+    except (RuntimeError, KeyError):
+        return None
+
+
+def emit_stage(stage: str) -> None:
+    """Announce that a pipeline stage is starting.
+
+    Args:
+        stage: Node name (see STAGE_LABELS)
+    """
+    writer = _writer()
+    if writer is not None:
+        writer({
+            "type": "stage",
+            "stage": stage,
+            "label": STAGE_LABELS.get(stage, stage),
+        })
+
+
+def token_callback(stage: str) -> Optional[TokenCallback]:
+    """Get a callback that forwards LLM tokens to the stream.
+
+    Args:
+        stage: Node name producing the tokens
+
+    Returns:
+        A callback for llm.completion's on_token, or None when the current
+        run did not ask for token streaming
+    """
+    try:
+        if not get_config().get("configurable", {}).get(STREAM_TOKENS_KEY):
+            return None
+    except RuntimeError:
+        return None
+
+    writer = _writer()
+    if writer is None:
+        return None
+
+    def on_token(text: str) -> None:
+        writer({"type": "token", "stage": stage, "text": text})
+
+    return on_token
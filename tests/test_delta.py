@@ -0,0 +1,68 @@
+"""Tests for applying changes-only stage answers."""
+
+from sublang.design_specs.delta import apply_delta, parse_removals, split_removals
+from sublang.design_specs.spec_model import item_key, parse_spec, serialize_spec
+
+BASE = """## Terms
+
+1. **Term: `task`**
+   - **Represents**: a unit of work
+   - Attributes:
+     - _title_: what to do
+       (shown in lists)
+
+2. **Term: `list`**
+   - **Represents**: a group of tasks
+   - Attributes:
+     - _name_: unique per user
+
+## Features
+
+1. **Lists**:  users group tasks into lists
+   - a list can be archived
+
+2. **Reminders**: users get reminded of a task"""
+
+DELTA = """## Features
+
+1. **Reminders**: users get reminded of a task by email
+
+2. **Sharing**: users share lists
+
+## Removed
+
+- Term: list
+- Feature: Lists"""
+
+
+def test_item_key_ignores_case_and_punctuation():
+    spec = parse_spec(BASE)
+    assert item_key(spec.features[1]) == "reminders"
+
+
+def test_parse_removals():
+    removed = parse_removals("- Term: `draft`\n- **Feature**: Export to PDF\n- note")
+    assert removed == {"terms": ["draft"], "features": ["Export to PDF"], "constraints": []}
+
+
+def test_unchanged_items_keep_their_text():
+    base = parse_spec(BASE)
+    changes = parse_spec("## Features\n\n1. **Sharing**: users share lists")
+    patched = serialize_spec(apply_delta(base, changes, split_removals(changes)))
+    assert patched == BASE + "\n\n3. **Sharing**: users share lists"
+
+
+def test_changes_and_removals():
+    base = parse_spec(BASE)
+    changes = parse_spec(DELTA)
+    removed = split_removals(changes)
+    assert removed["terms"] == ["list"]
+    patched = apply_delta(base, changes, removed)
+    assert [t.name for t in patched.terms] == ["task"]
+    assert [f.title for f in patched.features] == ["Reminders", "Sharing"]
+    text = serialize_spec(patched)
+    # The untouched term is written back as it was, not re-rendered
+    assert "   - **Represents**: a unit of work\n" in text
+    assert "       (shown in lists)" in text
+    assert "1. **Reminders**: users get reminded of a task by email" in text
+    assert "## Removed" not in text
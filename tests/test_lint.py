@@ -0,0 +1,53 @@
+"""Tests for the spec formatting linter."""
+
+from pathlib import Path
+
+from sublang.design_specs.lint import ADVISORY_RULES, lint
+
+DEMO_SPECS = Path(__file__).parent.parent / "demo" / "tig" / "specs.md"
+
+
+def _fixed_demo() -> str:
+    fixed, _ = lint(DEMO_SPECS.read_text(encoding="utf-8"))
+    return fixed
+
+
+def test_fix_uses_rules_markup():
+    fixed = _fixed_demo()
+    assert "1. Chat\n" in fixed
+    assert "**participants**: the entities" in fixed
+    assert "_store_: save the Chat" in fixed
+
+
+def test_fix_marks_inflected_members_as_actions():
+    fixed = _fixed_demo()
+    for word in ("stored", "updated", "tracked", "recalls", "removed"):
+        assert f"**{word}**" not in fixed
+        assert f"_{word}_" in fixed
+
+
+def test_bare_words_are_reported_not_fixed():
+    text = DEMO_SPECS.read_text(encoding="utf-8")
+    fixed, violations = lint(text)
+    assert "relevant to code changes" in fixed
+    assert "to prevent broken links" in fixed
+    assert "iteration or revision number" in fixed
+    assert any(v.rule == "bare-term" for v in violations)
+
+
+def test_fixed_spec_is_clean():
+    fixed = _fixed_demo()
+    again, violations = lint(fixed)
+    assert again == fixed
+    assert all(v.rule in ADVISORY_RULES for v in violations)
+
+
+def test_report_only_keeps_text():
+    text = DEMO_SPECS.read_text(encoding="utf-8")
+    unchanged, violations = lint(text, fix=False)
+    assert unchanged == text
+    assert {"attribute-mark", "action-mark", "term-header"} <= {v.rule for v in violations}
+
+
+def test_text_without_terms_is_left_alone():
+    assert lint("Just a chat answer.") == ("Just a chat answer.", [])
@@ -0,0 +1,80 @@
+"""Tests for the completion cache and its use by the LLM layer."""
+
+from sublang.utils import config, llm
+from sublang.utils.llm_cache import LLMCache, make_cache_key
+
+MESSAGES = [
+    {"role": "system", "content": "You design software."},
+    {"role": "user", "content": "A task tracker with lists"},
+]
+
+
+def _key(content: str) -> str:
+    return make_cache_key("gpt-4o-mini", 0, None, [{"role": "user", "content": content}])
+
+
+def test_keys_ignore_insignificant_differences():
+    reformatted = [{**message, "content": message["content"] + "\r\n"} for message in MESSAGES]
+    assert make_cache_key("gpt-4o-mini", 0, None, MESSAGES) == make_cache_key("gpt-4o-mini", 0, None, reformatted)
+    assert make_cache_key("gpt-4o-mini", 0, None, MESSAGES) != make_cache_key("gpt-4o", 0, None, MESSAGES)
+
+
+def test_hit_and_miss():
+    cache = LLMCache()
+    cache.put(_key("a"), "answer")
+    assert cache.get(_key("a")) == "answer"
+    assert cache.get(_key("b")) is None
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 0, 1)
+
+
+def test_memory_tier_is_lru():
+    cache = LLMCache(memory_entries=2)
+    cache.put(_key("a"), "1")
+    cache.put(_key("b"), "2")
+    cache.get(_key("a"))
+    cache.put(_key("c"), "3")
+    assert list(cache.memory) == [_key("a"), _key("c")]
+
+
+def test_reload_from_sqlite(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite3")
+    LLMCache(path).put(_key("a"), "answer")
+    cache = LLMCache(path)
+    assert cache.get(_key("a")) == "answer"
+    assert cache.stats()["disk_hits"] == 1
+    # Promoted to the memory tier
+    assert cache.get(_key("a")) == "answer"
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_eviction_by_size(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite3"), memory_entries=0, max_bytes=10)
+    cache.put(_key("a"), "x" * 6)
+    cache.put(_key("b"), "y" * 6)
+    assert cache.get(_key("a")) is None
+    assert cache.get(_key("b")) == "y" * 6
+    assert cache.stats()["disk_bytes"] == 6
+
+
+def test_eviction_by_age(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite3")
+    cache = LLMCache(path, max_age=-1)
+    cache.put(_key("a"), "answer")
+    assert cache.get(_key("a")) is None
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_sampled_requests_bypass_the_cache(monkeypatch):
+    cache = LLMCache()
+    monkeypatch.setattr(config, "cache_enabled", True)
+    monkeypatch.setattr(llm, "_cache", cache)
+    params = {"model": "gpt-4o-mini", "temperature": 0}
+    key, cached = llm._cache_lookup(MESSAGES, params)
+    assert key is not None and cached is None
+    llm._cache_store(key, "answer")
+    assert llm._cache_lookup(MESSAGES, params) == (key, "answer")
+
+    for temperature in (0.7, None):
+        assert llm._cache_lookup(MESSAGES, {**params, "temperature": temperature}) == (None, None)
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,61 @@
+"""Tests for the rate limiter's token buckets and the limits shared across processes."""
+
+import pytest
+
+from sublang.utils.llm_scheduler import SharedLimits, TokenBucket
+
+BUDGETS = {"requests": 60.0, "tokens": 6000.0}
+
+
+def test_token_bucket_delay_and_refill():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    assert bucket.delay(60, now) == 0.0
+    bucket.take(60)
+    assert bucket.delay(1, now) == pytest.approx(1.0)
+    assert bucket.delay(1, now + 0.5) == pytest.approx(0.5)
+    assert bucket.delay(1, now + 1.0) == 0.0
+
+
+def test_token_bucket_caps_requests_larger_than_capacity():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    # More than a full bucket only waits for a full bucket
+    assert bucket.delay(600, now) == 0.0
+    bucket.take(90)
+    assert bucket.level == -30
+    assert bucket.delay(1, now) == pytest.approx(31.0)
+
+
+def test_shared_budget_is_spent_once(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    first, second = SharedLimits(path), SharedLimits(path)
+    assert first.take("openai", BUDGETS, {"requests": 1, "tokens": 5000}) == 0.0
+    # The other process sees what is left of the token budget
+    delay = second.take("openai", BUDGETS, {"requests": 1, "tokens": 2000})
+    assert delay == pytest.approx(10.0, abs=0.1)
+    assert second.take("openai", BUDGETS, {"requests": 1, "tokens": 500}) == 0.0
+    assert second.take("anthropic", BUDGETS, {"requests": 1, "tokens": 5000}) == 0.0
+
+
+def test_adjust_refunds_overestimates(tmp_path):
+    limits = SharedLimits(str(tmp_path / "limits.sqlite3"))
+    assert limits.take("openai", BUDGETS, {"requests": 1, "tokens": 6000}) == 0.0
+    assert limits.take("openai", BUDGETS, {"requests": 1, "tokens": 3000}) > 0
+    limits.adjust("openai", "tokens", -3000)
+    assert limits.take("openai", BUDGETS, {"requests": 1, "tokens": 3000}) == 0.0
+
+
+def test_pause_and_demand_are_shared(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    first, second = SharedLimits(path), SharedLimits(path)
+    second._pid = first._pid + 1  # stands in for another process
+    first.pause("openai", 30)
+    assert 29 < second.paused_for("openai") <= 30
+    assert second.paused_for("anthropic") == 0.0
+
+    first.report_demand("openai", 2)
+    assert second.demand_elsewhere("openai")
+    assert not first.demand_elsewhere("openai")
+    first.report_demand("openai", 0)
+    assert not second.demand_elsewhere("openai")
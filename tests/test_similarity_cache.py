@@ -0,0 +1,60 @@
+"""Tests for the near-duplicate text cache."""
+
+from sublang.utils.similarity_cache import SimilarityCache, jaccard, shingles
+
+DESCRIPTION = (
+    "A task tracker where users create tasks, group them into lists, assign "
+    "them to teammates, set due dates and get reminded by email before a task "
+    "is due. Lists can be shared with other users and archived when done."
+)
+REWORDED = DESCRIPTION.replace("archived when done", "archived once they are done")
+UNRELATED = (
+    "A recipe book that stores recipes with ingredients and steps, scales "
+    "portions, and builds a shopping list for the week from chosen meals."
+)
+
+
+def test_jaccard_of_shingles():
+    assert jaccard(shingles(DESCRIPTION), shingles(DESCRIPTION)) == 1.0
+    assert jaccard(shingles(DESCRIPTION), shingles(UNRELATED)) < 0.1
+    assert 0.8 < jaccard(shingles(DESCRIPTION), shingles(REWORDED)) < 1.0
+
+
+def test_near_duplicates_hit():
+    cache = SimilarityCache(threshold=0.8)
+    cache.put(DESCRIPTION, {"specs": "## Terms"})
+    value, similarity = cache.get(REWORDED)
+    assert value == {"specs": "## Terms"}
+    assert 0.8 <= similarity < 1.0
+    assert cache.get(UNRELATED) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+
+def test_threshold_and_namespaces():
+    cache = SimilarityCache(threshold=0.99)
+    cache.put(DESCRIPTION, "specs", namespace="model-a")
+    assert cache.find(REWORDED, namespace="model-a") is None
+    assert cache.find(DESCRIPTION, namespace="model-b") is None
+    assert cache.find(DESCRIPTION, namespace="model-a") == ("specs", 1.0)
+    # find does not count lookups
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+
+
+def test_least_recently_used_are_evicted():
+    cache = SimilarityCache(max_entries=1)
+    cache.put(DESCRIPTION, 1)
+    cache.put(UNRELATED, 2)
+    assert cache.find(DESCRIPTION) is None
+    assert cache.find(UNRELATED) == (2, 1.0)
+
+
+def test_expired_entries_are_ignored():
+    cache = SimilarityCache(max_age=-1)
+    cache.put(DESCRIPTION, 1)
+    assert cache.find(DESCRIPTION) is None
+
+
+def test_persists_to_file(tmp_path):
+    path = tmp_path / "similarity.sqlite3"
+    SimilarityCache(str(path)).put(DESCRIPTION, [1, 2])
+    assert SimilarityCache(str(path)).find(DESCRIPTION) == ([1, 2], 1.0)
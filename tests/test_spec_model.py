@@ -0,0 +1,74 @@
+"""Tests for the spec model: parsing, serialization, references and merging."""
+
+from pathlib import Path
+
+from sublang.design_specs.spec_model import Item, merge_specs, parse_spec, serialize_spec
+
+DEMO_SPECS = Path(__file__).parent.parent / "demo" / "tig" / "specs.md"
+
+NESTED = """## Terms
+
+1. **Term: `task`**
+   - Represents: a unit of work
+   - Attributes:
+     - _title_: what to do
+   - Actions:
+     - **complete**: mark the task done
+
+## Features
+
+1. **Lists**: users group tasks into lists
+   - a list has a name
+     - names are unique per user
+   - a list can be archived
+
+2. **Reminders**: users get reminded of a task
+   before it is completed
+
+## Constraints
+
+- **Offline**: tasks can be edited offline
+- **Sync**: edits sync within a minute"""
+
+
+def test_demo_round_trip():
+    text = DEMO_SPECS.read_text(encoding="utf-8")
+    assert serialize_spec(parse_spec(text)) == text.strip()
+
+
+def test_nested_bullets_round_trip():
+    assert serialize_spec(parse_spec(NESTED)) == NESTED
+
+
+def test_sections_keep_their_own_style():
+    spec = parse_spec(NESTED)
+    assert spec.style.features.numbered and spec.style.features.spaced
+    assert not spec.style.constraints.numbered and not spec.style.constraints.spaced
+
+
+def test_parse_terms_and_items():
+    spec = parse_spec(NESTED)
+    task = spec.term("Task")
+    assert task is not None
+    assert task.fields == {"Represents": "a unit of work"}
+    assert [m.name for m in task.attributes] == ["title"]
+    assert [m.name for m in task.actions] == ["complete"]
+    assert [f.title for f in spec.features] == ["Lists", "Reminders"]
+    assert spec.features[0].description.endswith("   - a list can be archived")
+    assert [c.title for c in spec.constraints] == ["Offline", "Sync"]
+
+
+def test_references_tolerate_inflections():
+    spec = parse_spec(NESTED)
+    assert spec.references("task") == {"terms": [0], "features": [0, 1], "constraints": [0]}
+    assert spec.references("complete") == {"terms": [], "features": [1], "constraints": []}
+
+
+def test_merge_deduplicates_by_title():
+    first = parse_spec(NESTED)
+    second = parse_spec(NESTED)
+    second.features.append(Item("Sharing", "users share lists"))
+    merged = merge_specs([first, second])
+    assert [t.name for t in merged.terms] == ["task"]
+    assert [f.title for f in merged.features] == ["Lists", "Reminders", "Sharing"]
+    assert len(merged.constraints) == 2